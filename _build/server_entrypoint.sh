@@ -5,4 +5,8 @@ exec poetry run gunicorn ksg_nett.wsgi \
          --error-logfile '-' \
          --log-level INFO \
          --bind=unix:/opt/python/wsgi.sock &
+if [ "$EMAIL_OUTBOX_ENABLED" = "True" ]; then
+  echo "Starting outbox worker"
+  poetry run python manage.py sendoutbox &
+fi
 exec nginx -g "pid /tmp/nginx.pid; daemon off;"
@@ -36,6 +36,8 @@ from admissions.utils import (
     get_applicant_offered_position,
     read_admission_csv,
     send_applicant_notice_email,
+    send_applicant_notice_emails,
+    mass_send_welcome_to_interview_email,
     send_new_interview_mail,
     send_interview_cancelled_email,
     notify_interviewers_cancelled_interview_email,
@@ -485,6 +487,12 @@ class ApplicantCSVData(graphene.ObjectType):
     phone = graphene.String()
 
 
+class EmailDeliveryStatus(graphene.ObjectType):
+    email = graphene.String()
+    sent = graphene.Boolean()
+    error = graphene.String()
+
+
 class ApplicantCSVDataInput(graphene.InputObjectType):
     full_name = graphene.String()
     first_name = graphene.String()
@@ -530,11 +538,12 @@ class CreateApplicantsFromCSVDataMutation(graphene.Mutation):
         applicants = graphene.List(ApplicantCSVDataInput)
 
     ok = graphene.Boolean()
+    delivery_statuses = graphene.List(EmailDeliveryStatus)
 
     @gql_has_permissions("admissions.add_applicant")
     def mutate(self, info, applicants, *args, **kwargs):
         admission = Admission.get_active_admission()
-        emails = []
+        created = []
         for applicant in applicants:
             try:
                 auth_token = token_urlsafe(32)
@@ -546,13 +555,16 @@ class CreateApplicantsFromCSVDataMutation(graphene.Mutation):
                     phone=applicant["phone"],
                     token=auth_token,
                 )
-                ok = resend_auth_token_email(applicant)
-                emails.append(applicant.email)
+                created.append(applicant)
             except Exception as e:
                 print("Failed to create applicant")
                 print(e)
 
-        return CreateApplicantsFromCSVDataMutation(ok=ok)
+        delivery_statuses = mass_send_welcome_to_interview_email(created)
+        return CreateApplicantsFromCSVDataMutation(
+            ok=all(status.sent for status in delivery_statuses),
+            delivery_statuses=delivery_statuses,
+        )
 
 
 class ApplicantQuery(graphene.ObjectType):
@@ -792,23 +804,24 @@ class CreateApplicationsMutation(graphene.Mutation):
     ok = graphene.Boolean()
     applications_created = graphene.Int()
     faulty_emails = graphene.List(graphene.String)
+    delivery_statuses = graphene.List(EmailDeliveryStatus)
 
     @gql_has_permissions("admissions.add_applicant")
     def mutate(self, info, emails):
         faulty_emails = []
-        registered_emails = []
+        applicants = []
         for email in emails:
             try:
-                applicant = Applicant.create_or_update_application(email)
-                resend_auth_token_email(applicant)
-                registered_emails.append(email)
+                applicants.append(Applicant.create_or_update_application(email))
             except IntegrityError:
                 faulty_emails.append(email)
 
+        delivery_statuses = mass_send_welcome_to_interview_email(applicants)
         return CreateApplicationsMutation(
             ok=True,
             applications_created=len(emails) - len(faulty_emails),
             faulty_emails=faulty_emails,
+            delivery_statuses=delivery_statuses,
         )
 
 
@@ -1435,6 +1448,38 @@ class SendApplicantNoticeEmailMutation(graphene.Mutation):
         return SendApplicantNoticeEmailMutation(ok=ok)
 
 
+class SendApplicantNoticeEmailsMutation(graphene.Mutation):
+    class Arguments:
+        applicant_ids = graphene.List(graphene.ID, required=True)
+
+    ok = graphene.Boolean()
+    delivery_statuses = graphene.List(EmailDeliveryStatus)
+
+    @gql_has_permissions("admissions.change_applicant")
+    def mutate(self, info, applicant_ids):
+        applicant_ids = [
+            disambiguate_id(applicant_id) for applicant_id in applicant_ids
+        ]
+        applicants = list(Applicant.objects.filter(id__in=applicant_ids))
+        delivery_statuses = send_applicant_notice_emails(applicants)
+
+        noticed = [
+            applicant
+            for applicant, status in zip(applicants, delivery_statuses)
+            if status.sent
+        ]
+        now = timezone.now()
+        for applicant in noticed:
+            applicant.notice_method = Applicant.NoticeMethod.EMAIL
+            applicant.last_notice = now
+        Applicant.objects.bulk_update(noticed, ["notice_method", "last_notice"])
+
+        return SendApplicantNoticeEmailsMutation(
+            ok=len(noticed) == len(applicants),
+            delivery_statuses=delivery_statuses,
+        )
+
+
 class ToggleApplicantWillBeAdmittedMutation(graphene.Mutation):
     class Arguments:
         id = graphene.ID(required=True)
@@ -2183,6 +2228,7 @@ class AdmissionsMutations(graphene.ObjectType):
         ApplicantUpdateInternalGroupPositionPriorityOrderMutation.Field()
     )
     send_applicant_notice = SendApplicantNoticeEmailMutation.Field()
+    send_applicant_notices = SendApplicantNoticeEmailsMutation.Field()
 
     create_applicant_comment = CreateApplicantCommentMutation.Field()
     create_applicant_recommendation = CreateApplicantRecommendationMutation.Field()
@@ -1,12 +1,21 @@
+import smtplib
+import threading
+import time
+
+import factory
 import pytz
 from django.conf import settings
-from django.test import TestCase
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.test import TestCase, override_settings
 
 from admissions.tests.factories import AdmissionFactory, ApplicantFactory
 from admissions.utils import (
     get_available_interview_locations,
     generate_interviews_from_schedule,
     obfuscate_admission,
+    mass_send_welcome_to_interview_email,
+    send_applicant_notice_emails,
 )
 from admissions.models import (
     Interview,
@@ -257,3 +266,82 @@ class TestCloseAdmission(TestCase):
         self,
     ):
         pass
+
+
+class SlowEmailBackend(EmailBackend):
+    """
+    Stands in for an SMTP server that takes a while to accept every email, and
+    refuses emails to bounce.* addresses.
+    """
+
+    delay = 0.1
+    opened = 0
+    lock = threading.Lock()
+
+    def open(self):
+        with SlowEmailBackend.lock:
+            SlowEmailBackend.opened += 1
+        return True
+
+    def send_messages(self, messages):
+        for message in messages:
+            time.sleep(self.delay)
+            if any(email.startswith("bounce.") for email in message.to):
+                raise smtplib.SMTPRecipientsRefused({message.to[0]: (550, b"No")})
+        return super().send_messages(messages)
+
+
+@override_settings(
+    EMAIL_BACKEND="admissions.tests.test_utils.SlowEmailBackend",
+    MAIL_MERGE_CONCURRENCY=4,
+    MAIL_MERGE_RATE_LIMIT=None,
+)
+class TestMailMerge(TestCase):
+    def setUp(self) -> None:
+        self.admission = AdmissionFactory.create()
+        self.applicants = ApplicantFactory.create_batch(
+            150,
+            admission=self.admission,
+            token=factory.Sequence(lambda n: f"token{n}"),
+        )
+        SlowEmailBackend.opened = 0
+
+    def test__mass_send_welcome_to_interview_email__sends_personalized_emails(self):
+        start = time.monotonic()
+        statuses = mass_send_welcome_to_interview_email(self.applicants)
+        elapsed = time.monotonic() - start
+
+        # Sending the emails one at a time would take 15 s
+        self.assertLess(elapsed, 10)
+        self.assertEqual(len(mail.outbox), 150)
+        self.assertTrue(all(status.sent for status in statuses))
+        self.assertEqual(
+            [status.email for status in statuses],
+            [applicant.email for applicant in self.applicants],
+        )
+        # Every thread keeps its connection open for all the emails it sends
+        self.assertLessEqual(SlowEmailBackend.opened, 4)
+
+        emails = {message.to[0]: message for message in mail.outbox}
+        for applicant in self.applicants:
+            message = emails[applicant.email]
+            self.assertIn(f"/applicant-portal/{applicant.token}", message.body)
+            self.assertIn(
+                f"/applicant-portal/{applicant.token}", message.alternatives[0][0]
+            )
+
+    def test__send_applicant_notice_emails__reports_failed_recipients(self):
+        bounced = self.applicants[3]
+        bounced.email = "bounce.applicant@applicant.com"
+        bounced.save()
+
+        statuses = send_applicant_notice_emails(self.applicants[:10])
+
+        self.assertEqual(len(mail.outbox), 9)
+        self.assertEqual(len(statuses), 10)
+        self.assertFalse(statuses[3].sent)
+        self.assertEqual(statuses[3].email, bounced.email)
+        self.assertIn("SMTPRecipientsRefused", statuses[3].error)
+        self.assertTrue(
+            all(status.sent for index, status in enumerate(statuses) if index != 3)
+        )
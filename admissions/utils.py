@@ -6,6 +6,7 @@ from django.utils import timezone
 from django.db import transaction
 from graphene_django_cud.util import disambiguate_id
 
+from common.mail import DeliveryStatus, MailMergeTemplate, send_mail_merge
 from common.util import send_email
 from django.utils.translation import gettext_lazy as _
 from django.conf import settings
@@ -169,111 +170,69 @@ def generate_interviews_from_schedule(schedule):
         )
 
 
-def send_applicant_notice_email(applicant):
-    content = _(
-        f"""
-                Hei!
-                
-                Vi ser at du har søkt KSG og det har gått litt tid siden vi sist
-                har hørt fra deg. 
-    
-                Lenke: {settings.APP_URL}/applicant-portal/{applicant.token}
-                """
-    )
+APPLICANT_NOTICE_EMAIL = MailMergeTemplate(
+    _("Intervju KSG"),
+    "admissions/emails/applicant_notice.txt",
+    "admissions/emails/applicant_notice.html",
+)
+WELCOME_TO_INTERVIEW_EMAIL = MailMergeTemplate(
+    _("Intervju KSG"),
+    "admissions/emails/welcome_to_interview.txt",
+    "admissions/emails/welcome_to_interview.html",
+)
 
-    html_content = _(
-        f"""
-            Hei!
-            <br />
-            <br />                
-            Vi ser at du har søkt KSG og det har gått litt tid siden vi sist har hørt fra deg.
-            <br /> 
-            Trykk på denne linken for å få tilsendt innloggingsinformasjon.
-            <br />
-            <span>{settings.APP_URL}/applicant-portal/{applicant.token}</span>
-            <br />
-        """
-    )
 
+def get_applicant_portal_url(auth_token: str) -> str:
+    return f"{settings.APP_URL}/applicant-portal/{auth_token}"
+
+
+def send_applicant_notice_email(applicant):
+    context = {"portal_url": get_applicant_portal_url(applicant.token)}
     return send_email(
-        _("Intervju KSG"),
-        message=content,
-        html_message=html_content,
+        str(APPLICANT_NOTICE_EMAIL.subject),
+        message=APPLICANT_NOTICE_EMAIL.text_template.render(context),
+        html_message=APPLICANT_NOTICE_EMAIL.html_template.render(context),
         recipients=[applicant.email],
     )
 
 
-def mass_send_welcome_to_interview_email(emails):
+def send_applicant_notice_emails(applicants) -> List[DeliveryStatus]:
     """
-    Accepts a list of emails and sends the same email ass bcc to all the recipients.
-    Main advantage here is that we do not need to batch together 150 emails which causes
-    timeouts and slow performance. The applicant can then instead request to be sent their
-    custom auth token from the portal itself.
+    Sends every applicant their own notice with a link to the applicant portal, and
+    returns the delivery status of each email.
     """
-    content = _(
-        f"""
-                            Hei og takk for at du søker KSG!
-            
-                            Trykk på denne linken for å få tilsendt innloggingsinformasjon.
-            
-                            Lenke: {settings.APP_URL}/applicant-portal
-                            """
+    return send_mail_merge(
+        APPLICANT_NOTICE_EMAIL,
+        [
+            (applicant.email, {"portal_url": get_applicant_portal_url(applicant.token)})
+            for applicant in applicants
+        ],
     )
 
-    html_content = _(
-        f"""
-            Hei og takk for at du søker KSG!
-            <br />
-            <br />
-            Trykk på denne linken for å få tilsendt innloggingsinformasjon.
-            <br />
-            {settings.APP_URL}/applicant-portal
-            <br />
-        """
-    )
 
-    return send_email(
-        _("Intervju KSG"),
-        message=content,
-        html_message=html_content,
-        recipients=[],
-        bcc=emails,
+def mass_send_welcome_to_interview_email(applicants) -> List[DeliveryStatus]:
+    """
+    Sends every applicant a welcome email with the link to their own applicant portal,
+    so they do not have to request their auth token from the portal first. The emails
+    are rendered up front and sent over a few pooled connections, as sending them one
+    connection at a time made batches of 150 applicants time out. Returns the delivery
+    status of each email.
+    """
+    return send_mail_merge(
+        WELCOME_TO_INTERVIEW_EMAIL,
+        [
+            (applicant.email, {"portal_url": get_applicant_portal_url(applicant.token)})
+            for applicant in applicants
+        ],
     )
 
 
 def send_welcome_to_interview_email(email: str, auth_token: str):
-    content = _(
-        f"""
-            Hei og velkommen til intervju hos KSG!
-            
-            Du får nå silsendt en lenke som lar deg registrere personlige opplysninger,
-            hvilket verv du er interessert i hos oss og velge et intervjutidspunkt som passer
-            deg.
-        
-            Trykk på denne linken for å registrere søknaden videre
-        
-            Lenke: {settings.APP_URL}/applicant-portal/{auth_token}
-            """
-    )
-
-    html_content = _(
-        f"""
-            Hei og velkommen til intervju hos KSG! 
-            <br />
-            <br />
-            Du får nå silsendt en lenke som lar deg registrere personlige opplysninger,
-            hvilket verv du er interessert i hos oss og velge et intervjutidspunkt som passer
-            deg.
-            <br />
-            {settings.APP_URL}/applicant-portal/{auth_token}
-            <br />
-            """
-    )
-
+    context = {"portal_url": get_applicant_portal_url(auth_token)}
     return send_email(
-        _("Intervju KSG"),
-        message=content,
-        html_message=html_content,
+        str(WELCOME_TO_INTERVIEW_EMAIL.subject),
+        message=WELCOME_TO_INTERVIEW_EMAIL.text_template.render(context),
+        html_message=WELCOME_TO_INTERVIEW_EMAIL.html_template.render(context),
         recipients=[email],
     )
 
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0002_blacklistedsong"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="purchasetransactionlogentry",
+            name="idempotency_key",
+            field=models.CharField(
+                blank=True,
+                help_text="Client generated key used to deduplicate replayed offline purchases",
+                max_length=64,
+                null=True,
+                unique=True,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="purchasetransactionlogentry",
+            name="transaction_source",
+            field=models.CharField(
+                choices=[("API", "API"), ("BULK_API", "Bulk API")], max_length=10
+            ),
+        ),
+    ]
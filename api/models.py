@@ -26,6 +26,7 @@ class PurchaseTransactionLogEntry(models.Model):
 
     class TransactionSourceOptions(models.TextChoices):
         API = ("API", "API")
+        BULK_API = ("BULK_API", "Bulk API")
 
     user = models.ForeignKey(
         "users.User",
@@ -37,6 +38,13 @@ class PurchaseTransactionLogEntry(models.Model):
     transaction_source = models.CharField(
         max_length=10, choices=TransactionSourceOptions.choices
     )
+    idempotency_key = models.CharField(
+        max_length=64,
+        unique=True,
+        null=True,
+        blank=True,
+        help_text="Client generated key used to deduplicate replayed offline purchases",
+    )
 
     def __str__(self):
         return f"{self.user} - {self.amount} - {self.transaction_source} - {self.timestamp}"
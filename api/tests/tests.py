@@ -1,14 +1,24 @@
 import json
+import threading
 from datetime import timedelta
 from random import randint
+from unittest import skipIf
+from unittest.mock import patch
 
+from django.core.cache import caches
+from django.db import connection
+from django.db.models import F
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 from rest_framework import status
+from django.test import TransactionTestCase
 from rest_framework.test import APITestCase, APIClient
 from rest_framework_simplejwt.tokens import SlidingToken
 
-from economy.models import SociSession
+from api.models import PurchaseTransactionLogEntry
+from economy.card_lookup import get_card_lookup_stats, reset_card_lookup_stats
+from economy.models import SociSession, SociBankAccount, ProductOrder
 from economy.tests.factories import (
     SociProductFactory,
     SociBankAccountFactory,
@@ -401,3 +411,318 @@ class ChargeAccountStockMarketDisabled(APITestCase):
         expected_total_cost = expected_tuborg_cost + expected_ice_cost
 
         self.assertEqual(account_charge, expected_total_cost)
+
+
+class ChargeBankAccountViewTest(APITestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.client = APIClient()
+
+    def setUp(self):
+        self.user_account = SociBankAccountFactory(user__is_staff=True)
+        self.products = SociProductFactory.create_batch(5, price=30)
+        self.client.force_authenticate(self.user_account.user)
+        self.url = reverse("api:charge")
+
+        SociSessionFactory.create()
+        self.user_account.add_funds(100)
+
+    def charge(self, products, order_size=1):
+        return self.client.post(
+            self.url,
+            {
+                "bank_account_id": f"{self.user_account.id}",
+                "products": [
+                    {"sku": product.sku_number, "order_size": order_size}
+                    for product in products
+                ],
+            },
+            format="json",
+        )
+
+    def test_charge__insufficient_funds__bad_request_and_nothing_charged(self):
+        response = self.charge(self.products[:4])
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.user_account.refresh_from_db()
+        self.assertEqual(100, self.user_account.balance)
+        self.assertFalse(ProductOrder.objects.exists())
+
+    def test_charge__invalid_sku__bad_request(self):
+        response = self.client.post(
+            self.url,
+            {
+                "bank_account_id": f"{self.user_account.id}",
+                "products": [{"sku": "NOT-A-SKU", "order_size": 1}],
+            },
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_charge__repeated_charges__balance_never_below_zero(self):
+        responses = [self.charge(self.products[:1]) for _ in range(5)]
+
+        self.assertEqual(
+            3, [r.status_code for r in responses].count(status.HTTP_200_OK)
+        )
+        self.user_account.refresh_from_db()
+        self.assertEqual(10, self.user_account.balance)
+        self.assertEqual(3, ProductOrder.objects.count())
+
+    def test_charge__larger_basket__constant_query_count(self):
+        self.user_account.add_funds(1000)
+        # Warms up the feature flags and card lookups cached in the process
+        self.charge(self.products[:1])
+
+        # Session, account, products, savepoint, balance update, orders, ledger
+        # entries, ranked season, transaction log and savepoint release
+        with self.assertNumQueries(10):
+            self.charge(self.products[:1])
+        with self.assertNumQueries(10):
+            self.charge(self.products)
+
+        self.assertEqual(7, ProductOrder.objects.count())
+
+    def test_charge__balance_spent_after_it_was_read__not_overdrawn(self):
+        try_remove_funds = SociBankAccount.try_remove_funds
+
+        def charge_elsewhere_first(account, amount, *args, **kwargs):
+            # Another tap of the card is charged after this request read the balance,
+            # leaving the balance of the account in memory stale
+            SociBankAccount.objects.filter(pk=account.pk).update(
+                balance=F("balance") - 90
+            )
+            return try_remove_funds(account, amount, *args, **kwargs)
+
+        with patch.object(SociBankAccount, "try_remove_funds", charge_elsewhere_first):
+            response = self.charge(self.products[:2])
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.user_account.refresh_from_db()
+        self.assertEqual(10, self.user_account.balance)
+        self.assertFalse(ProductOrder.objects.exists())
+
+    def test_charge__writes_ledger_entries(self):
+        self.charge(self.products[:2])
+
+        entries = self.user_account.ledger_entries.all()
+        self.assertEqual(2, entries.count())
+        self.assertEqual(-60, sum(entry.amount for entry in entries))
+
+
+@skipIf(connection.vendor == "sqlite", "SQLite does not support concurrent writers")
+class ChargeBankAccountViewConcurrencyTest(TransactionTestCase):
+    def setUp(self):
+        self.user_account = SociBankAccountFactory(user__is_staff=True)
+        self.product = SociProductFactory(price=10)
+        SociSessionFactory.create()
+        self.user_account.add_funds(500)
+
+    def test_charge__concurrent_card_taps__no_lost_updates(self):
+        url = reverse("api:charge")
+        data = {
+            "bank_account_id": f"{self.user_account.id}",
+            "products": [{"sku": self.product.sku_number, "order_size": 1}],
+        }
+
+        def charge():
+            client = APIClient()
+            client.force_authenticate(self.user_account.user)
+            client.post(url, data, format="json")
+            connection.close()
+
+        threads = [threading.Thread(target=charge) for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(
+            300, SociBankAccount.objects.get(pk=self.user_account.pk).balance
+        )
+        self.assertEqual(20, ProductOrder.objects.count())
+
+
+class CardLookupCacheTest(APITestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.client = APIClient()
+
+    def setUp(self):
+        caches[settings.CARD_LOOKUP_CACHE_ALIAS].clear()
+        reset_card_lookup_stats()
+        self.user_account = SociBankAccountFactory(user__is_staff=True)
+        self.client.force_authenticate(self.user_account.user)
+        self.url = reverse("api:balance")
+
+    def test_get_balance__repeated_taps__served_from_cache_with_fresh_balance(self):
+        self.client.get(self.url, {"card_uuid": self.user_account.card_uuid})
+        self.user_account.add_funds(200)
+
+        response = self.client.get(self.url, {"card_uuid": self.user_account.card_uuid})
+
+        self.assertEqual(200, response.data["balance"])
+        self.assertEqual({"hits": 1, "misses": 1}, get_card_lookup_stats())
+
+    def test_get_balance__user_renamed__snapshot_invalidated(self):
+        self.client.get(self.url, {"card_uuid": self.user_account.card_uuid})
+        user = self.user_account.user
+        user.first_name = "Renamed"
+        user.save()
+
+        response = self.client.get(self.url, {"card_uuid": self.user_account.card_uuid})
+
+        self.assertEqual(user.get_full_name(), response.data["user"])
+
+    def test_get_balance__card_changed__old_card_not_found(self):
+        old_card_uuid = self.user_account.card_uuid
+        self.client.get(self.url, {"card_uuid": old_card_uuid})
+        self.user_account.card_uuid = "1234567890"
+        self.user_account.save()
+
+        response = self.client.get(self.url, {"card_uuid": old_card_uuid})
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_obtain_token__card_moved_in_other_worker__new_owner_authenticated(self):
+        card_uuid = self.user_account.card_uuid
+        self.client.get(self.url, {"card_uuid": card_uuid})
+        new_owner = SociBankAccountFactory()
+        # An update sends no signals, like a save in another worker's process
+        SociBankAccount.objects.filter(pk=self.user_account.pk).update(card_uuid=None)
+        SociBankAccount.objects.filter(pk=new_owner.pk).update(card_uuid=card_uuid)
+        self.client.force_authenticate(None)
+
+        response = self.client.post(
+            reverse("api:obtain-token"), {"card_uuid": card_uuid}
+        )
+
+        self.assertEqual(200, response.status_code)
+        token = SlidingToken(response.data["token"])
+        self.assertEqual(new_owner.user_id, token["user_id"])
+
+
+class BulkChargeBankAccountViewTest(APITestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.client = APIClient()
+
+    def setUp(self):
+        self.user_account = SociBankAccountFactory(user__is_staff=True)
+        self.other_account = SociBankAccountFactory()
+        self.product = SociProductFactory(price=30)
+        self.client.force_authenticate(self.user_account.user)
+        self.url = reverse("api:bulk-charge")
+
+        SociSessionFactory.create()
+        self.user_account.add_funds(100)
+        self.other_account.add_funds(1000)
+
+    def basket(self, key, account, sku=None, order_size=1):
+        return {
+            "idempotency_key": key,
+            "bank_account_id": account.id,
+            "products": [
+                {"sku": sku or self.product.sku_number, "order_size": order_size}
+            ],
+        }
+
+    def test_bulk_charge__mixed_baskets__per_basket_results(self):
+        baskets = [
+            self.basket("a", self.user_account, order_size=2),
+            self.basket("b", self.user_account, order_size=2),
+            self.basket("c", self.other_account, sku="NOT-A-SKU"),
+            self.basket("d", self.other_account),
+        ]
+
+        response = self.client.post(self.url, {"baskets": baskets}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            ["ok", "insufficient_funds", "unknown_sku", "ok"],
+            [result["status"] for result in response.data["results"]],
+        )
+        self.user_account.refresh_from_db()
+        self.other_account.refresh_from_db()
+        self.assertEqual(40, self.user_account.balance)
+        self.assertEqual(970, self.other_account.balance)
+        self.assertEqual(2, PurchaseTransactionLogEntry.objects.count())
+
+    def test_bulk_charge__malformed_baskets__invalid_without_charging(self):
+        no_products = self.basket("c", self.other_account)
+        no_products["products"] = []
+        missing_sku = self.basket("d", self.other_account)
+        del missing_sku["products"][0]["sku"]
+        baskets = [
+            {"bank_account_id": self.other_account.id, "products": []},
+            {**self.basket("a", self.other_account), "bank_account_id": "abc"},
+            {"idempotency_key": "b", "bank_account_id": self.other_account.id},
+            no_products,
+            missing_sku,
+            self.basket("e", self.other_account, order_size="many"),
+            "not a basket",
+            self.basket("f", self.other_account),
+        ]
+
+        response = self.client.post(self.url, {"baskets": baskets}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data["results"]
+        self.assertEqual(
+            ["invalid"] * 7 + ["ok"], [result["status"] for result in results]
+        )
+        self.assertTrue(all(result["message"] for result in results[:7]))
+        self.other_account.refresh_from_db()
+        self.assertEqual(970, self.other_account.balance)
+        self.assertEqual(1, ProductOrder.objects.count())
+
+    def test_bulk_charge__negative_order_size__invalid_without_crediting(self):
+        baskets = [
+            self.basket("a", self.user_account, order_size=-5),
+            self.basket("b", self.user_account, order_size=0),
+        ]
+
+        response = self.client.post(self.url, {"baskets": baskets}, format="json")
+
+        self.assertEqual(
+            ["invalid", "invalid"],
+            [result["status"] for result in response.data["results"]],
+        )
+        self.assertEqual(
+            "Order size must be at least 1", response.data["results"][0]["message"]
+        )
+        self.user_account.refresh_from_db()
+        self.assertEqual(100, self.user_account.balance)
+        self.assertFalse(ProductOrder.objects.exists())
+        self.assertFalse(PurchaseTransactionLogEntry.objects.exists())
+
+    def test_bulk_charge__replayed_keys__charged_once(self):
+        baskets = [self.basket("a", self.other_account)]
+
+        self.client.post(self.url, {"baskets": baskets}, format="json")
+        response = self.client.post(self.url, {"baskets": baskets}, format="json")
+
+        self.assertEqual("duplicate", response.data["results"][0]["status"])
+        self.other_account.refresh_from_db()
+        self.assertEqual(970, self.other_account.balance)
+        self.assertEqual(1, ProductOrder.objects.count())
+
+    def test_bulk_charge__1000_baskets__bounded_query_count(self):
+        accounts = SociBankAccountFactory.create_batch(50, balance=10000)
+        baskets = [
+            self.basket(f"key-{index}", accounts[index % len(accounts)])
+            for index in range(1000)
+        ]
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(self.url, {"baskets": baskets}, format="json")
+
+        self.assertTrue(
+            all(result["status"] == "ok" for result in response.data["results"])
+        )
+        self.assertEqual(1000, ProductOrder.objects.count())
+        self.assertLess(len(context.captured_queries), 100)
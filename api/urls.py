@@ -10,6 +10,7 @@ from api.views import (
     SensorMeasurementView,
     BlacklistedSongsListView,
     ChargeBankAccountView,
+    BulkChargeBankAccountView,
 )
 
 urlpatterns = [
@@ -39,6 +40,11 @@ urlpatterns = [
             [
                 path("products", SociProductListView.as_view(), name="products"),
                 path("charge", ChargeBankAccountView.as_view(), name="charge"),
+                path(
+                    "charge/bulk",
+                    BulkChargeBankAccountView.as_view(),
+                    name="bulk-charge",
+                ),
                 path(
                     "bank-accounts/",
                     include(
@@ -0,0 +1,240 @@
+from collections import defaultdict
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, Value, When
+
+from api.models import PurchaseTransactionLogEntry
+from common.util import check_feature_flag
+from economy.leaderboard import record_season_spend
+from economy.ledger import write_product_order_entries
+from economy.models import ProductOrder, SociBankAccount, SociProduct
+from economy.price_strategies import calculate_stock_prices_for_products
+from economy.price_ticker import record_product_orders
+
+
+class BulkChargeStatus:
+    OK = "ok"
+    DUPLICATE = "duplicate"
+    INSUFFICIENT_FUNDS = "insufficient_funds"
+    UNKNOWN_SKU = "unknown_sku"
+    UNKNOWN_ACCOUNT = "unknown_account"
+    CONFLICT = "conflict"
+    INVALID = "invalid"
+
+
+def _chunks(items, size):
+    for index in range(0, len(items), size):
+        yield items[index : index + size]
+
+
+def _debit_accounts(debits: dict):
+    """
+    Removes funds from several accounts in a single UPDATE statement.
+    `debits` maps account id to the amount that should be removed.
+    """
+    if not debits:
+        return
+
+    SociBankAccount.objects.filter(pk__in=debits.keys()).update(
+        balance=F("balance")
+        - Case(
+            *[When(pk=pk, then=Value(amount)) for pk, amount in debits.items()],
+            default=Value(0),
+        )
+    )
+
+
+def _clean_basket(basket) -> Tuple[Optional[dict], Optional[str]]:
+    """
+    Checks the shape of a basket before anything is charged. Returns the basket with
+    its ids and order sizes as integers, or the reason it is invalid.
+    """
+    if not isinstance(basket, dict):
+        return None, "Basket must be an object"
+
+    key = basket.get("idempotency_key")
+    if not isinstance(key, str) or not key:
+        return None, "Basket needs an idempotency key"
+
+    try:
+        bank_account_id = int(basket.get("bank_account_id"))
+    except (TypeError, ValueError):
+        return None, "Bank account id must be an integer"
+
+    product_orders = basket.get("products")
+    if not isinstance(product_orders, list) or not product_orders:
+        return None, "Basket has no products"
+
+    cleaned_product_orders = []
+    for product_order in product_orders:
+        if not isinstance(product_order, dict) or not product_order.get("sku"):
+            return None, "Every product needs a sku"
+        try:
+            order_size = int(product_order.get("order_size"))
+        except (TypeError, ValueError):
+            return None, "Order size must be an integer"
+        if order_size < 1:
+            return None, "Order size must be at least 1"
+        cleaned_product_orders.append(
+            {"sku": product_order["sku"], "order_size": order_size}
+        )
+
+    return {
+        "idempotency_key": key,
+        "bank_account_id": bank_account_id,
+        "products": cleaned_product_orders,
+    }, None
+
+
+def process_bulk_charge(baskets, session):
+    """
+    Charges a list of baskets queued by the X-App while it was offline. Each basket is a
+    dict with `idempotency_key`, `bank_account_id` and `products`, where products has the
+    same format as the ordinary charge endpoint.
+
+    Products, accounts and already processed keys are resolved up front in a few queries.
+    Baskets are then charged in chunks of `BULK_CHARGE_CHUNK_SIZE`, each in its own
+    transaction with locked account rows, grouped debits and bulk inserts.
+
+    Malformed baskets get the `invalid` status with a message, and are not charged.
+    Returns a list of per-basket results in the same order as the input.
+    """
+    results = [
+        {
+            "idempotency_key": (
+                basket.get("idempotency_key") if isinstance(basket, dict) else None
+            ),
+            "status": None,
+        }
+        for basket in baskets
+    ]
+
+    cleaned_baskets = {}
+    for index, basket in enumerate(baskets):
+        cleaned_basket, error = _clean_basket(basket)
+        if error is not None:
+            results[index]["status"] = BulkChargeStatus.INVALID
+            results[index]["message"] = error
+        else:
+            cleaned_baskets[index] = cleaned_basket
+    baskets = cleaned_baskets
+
+    keys = [basket["idempotency_key"] for basket in baskets.values()]
+    processed_keys = set(
+        PurchaseTransactionLogEntry.objects.filter(
+            idempotency_key__in=keys
+        ).values_list("idempotency_key", flat=True)
+    )
+
+    sku_numbers = {
+        product_order["sku"]
+        for basket in baskets.values()
+        for product_order in basket["products"]
+    }
+    products = SociProduct.objects.in_bulk(sku_numbers, field_name="sku_number")
+    accounts = SociBankAccount.objects.select_related("user").in_bulk(
+        {basket["bank_account_id"] for basket in baskets.values()}
+    )
+
+    stock_market_products = [
+        product for product in products.values() if product.purchase_price
+    ]
+    if stock_market_products and check_feature_flag(
+        settings.X_APP_STOCK_MARKET_MODE, fail_silently=True
+    ):
+        stock_prices = calculate_stock_prices_for_products(stock_market_products)
+    else:
+        stock_prices = {}
+
+    # Validate everything that does not depend on balances
+    pending = []
+    for index, basket in baskets.items():
+        key = basket["idempotency_key"]
+        if key in processed_keys:
+            results[index]["status"] = BulkChargeStatus.DUPLICATE
+            continue
+        processed_keys.add(key)
+
+        account = accounts.get(basket["bank_account_id"])
+        if account is None:
+            results[index]["status"] = BulkChargeStatus.UNKNOWN_ACCOUNT
+            continue
+
+        unknown_skus = [
+            product_order["sku"]
+            for product_order in basket["products"]
+            if product_order["sku"] not in products
+        ]
+        if unknown_skus:
+            results[index]["status"] = BulkChargeStatus.UNKNOWN_SKU
+            results[index]["unknown_skus"] = unknown_skus
+            continue
+
+        orders = []
+        for product_order in basket["products"]:
+            product = products[product_order["sku"]]
+            order_size = product_order["order_size"]
+            product_price = stock_prices.get(product.id, product.price)
+            orders.append(
+                ProductOrder(
+                    product=product,
+                    order_size=order_size,
+                    cost=order_size * product_price,
+                    source=account,
+                    session=session,
+                )
+            )
+        pending.append((index, key, account, orders))
+
+    for chunk in _chunks(pending, settings.BULK_CHARGE_CHUNK_SIZE):
+        try:
+            _charge_chunk(chunk, results)
+        except IntegrityError:
+            # Another request processed one of the keys in the meantime, the whole
+            # chunk was rolled back and can safely be replayed.
+            for index, *_ in chunk:
+                results[index]["status"] = BulkChargeStatus.CONFLICT
+
+    return results
+
+
+def _charge_chunk(chunk, results):
+    with transaction.atomic():
+        account_ids = {account.id for _, _, account, _ in chunk}
+        balances = dict(
+            SociBankAccount.objects.select_for_update()
+            .filter(pk__in=account_ids)
+            .values_list("pk", "balance")
+        )
+
+        debits = defaultdict(int)
+        charged_orders = []
+        log_entries = []
+        for index, key, account, orders in chunk:
+            total_cost = sum(order.cost for order in orders)
+            remaining_balance = balances[account.id] - debits[account.id] - total_cost
+            if remaining_balance < 0 and not account.is_gold:
+                results[index]["status"] = BulkChargeStatus.INSUFFICIENT_FUNDS
+                continue
+
+            debits[account.id] += total_cost
+            charged_orders.extend(orders)
+            log_entries.append(
+                PurchaseTransactionLogEntry(
+                    user=account.user,
+                    amount=total_cost,
+                    transaction_source=PurchaseTransactionLogEntry.TransactionSourceOptions.BULK_API,
+                    idempotency_key=key,
+                )
+            )
+            results[index]["status"] = BulkChargeStatus.OK
+            results[index]["amount"] = total_cost
+
+        _debit_accounts(debits)
+        ProductOrder.objects.bulk_create(charged_orders)
+        write_product_order_entries(charged_orders)
+        record_season_spend(charged_orders)
+        PurchaseTransactionLogEntry.objects.bulk_create(log_entries)
+        transaction.on_commit(lambda: record_product_orders(charged_orders))
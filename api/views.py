@@ -4,7 +4,7 @@ from django.utils import timezone
 from drf_yasg.openapi import Parameter, IN_QUERY, TYPE_STRING
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework import status, permissions, generics
-from rest_framework.exceptions import ValidationError
+from rest_framework.exceptions import ValidationError, NotFound
 from rest_framework.generics import (
     ListAPIView,
     RetrieveAPIView,
@@ -22,6 +22,7 @@ from rest_framework_simplejwt.views import (
 
 from api.models import PurchaseTransactionLogEntry, BlacklistedSong
 from api.permissions import SensorTokenPermission
+from api.utils import process_bulk_charge
 from api.serializers import (
     CheckBalanceSerializer,
     SociProductSerializer,
@@ -29,7 +30,11 @@ from api.serializers import (
     CustomTokenObtainSlidingSerializer,
     BlacklistedSongSerializer,
 )
-from economy.price_strategies import calculate_stock_price_for_product
+from economy.price_strategies import calculate_stock_prices_for_products
+from economy.price_ticker import record_product_orders
+from economy.card_lookup import get_card_account_snapshot
+from economy.leaderboard import record_season_spend
+from economy.ledger import write_product_order_entries
 
 from sensors.consts import MEASUREMENT_TYPE_TEMPERATURE, MEASUREMENT_TYPE_CHOICES
 from sensors.models import SensorMeasurement
@@ -141,20 +146,29 @@ class SociBankAccountBalanceDetailView(RetrieveAPIView):
         },
     )
     def get(self, request, *args, **kwargs):
-        soci_bank_account = self.get_object()
-        serializer = self.get_serializer(soci_bank_account)
-        data = serializer.data
-
-        return Response(data, status=status.HTTP_200_OK)
-
-    def get_object(self) -> SociBankAccount:
         card_uuid = self.request.query_params.get("card_uuid", None)
         if card_uuid is None:
             raise ValidationError(
                 "You need to provide a card uuid as a query parameter."
             )
 
-        return get_object_or_404(queryset=self.get_queryset(), card_uuid=card_uuid)
+        snapshot = get_card_account_snapshot(card_uuid)
+        if snapshot is None:
+            raise NotFound()
+
+        # The balance is never cached
+        balance = get_object_or_404(
+            self.get_queryset().values_list("balance", flat=True),
+            pk=snapshot["account_id"],
+        )
+        data = {
+            "id": snapshot["account_id"],
+            "user": snapshot["full_name"],
+            "balance": balance,
+            "soci_gold": snapshot["is_gold"],
+        }
+
+        return Response(data, status=status.HTTP_200_OK)
 
 
 class SensorMeasurementView(CustomCreateAPIView, generics.ListAPIView):
@@ -240,30 +254,36 @@ class ChargeBankAccountView(APIView):
                 {"message": "No active SociSession"}, status=status.HTTP_400_BAD_REQUEST
             )
 
-        account = SociBankAccount.objects.get(id=bank_account_id)
-        orders = []
-        for product_order in order["products"]:
-            sku_number = product_order["sku"]
-            product = SociProduct.objects.filter(sku_number=sku_number).first()
-            if product is None:
+        account = SociBankAccount.objects.select_related("user").get(id=bank_account_id)
+
+        sku_numbers = [product_order["sku"] for product_order in order["products"]]
+        products = SociProduct.objects.in_bulk(sku_numbers, field_name="sku_number")
+        for sku_number in sku_numbers:
+            if sku_number not in products:
                 return Response(
                     {"message": f"Invalid product sku '{sku_number}' in order"},
                     status=status.HTTP_400_BAD_REQUEST,
                 )
-            order_size = product_order["order_size"]
 
-            if (
-                check_feature_flag(settings.X_APP_STOCK_MARKET_MODE, fail_silently=True)
-                and product.purchase_price
-            ):  # Stock mode is enabled and the product has a registered purchase price
-                product_price = calculate_stock_price_for_product(product.id)
-            else:
-                product_price = product.price
+        stock_market_products = [
+            product for product in products.values() if product.purchase_price
+        ]
+        if stock_market_products and check_feature_flag(
+            settings.X_APP_STOCK_MARKET_MODE, fail_silently=True
+        ):  # Stock mode is enabled and the products have a registered purchase price
+            stock_prices = calculate_stock_prices_for_products(stock_market_products)
+        else:
+            stock_prices = {}
 
+        orders = []
+        for product_order in order["products"]:
+            product = products[product_order["sku"]]
+            order_size = product_order["order_size"]
+            product_price = stock_prices.get(product.id, product.price)
             orders.append(
                 ProductOrder(
                     product=product,
-                    order_size=product_order["order_size"],
+                    order_size=order_size,
                     cost=order_size * product_price,
                     source=account,
                     session=session,
@@ -275,25 +295,61 @@ class ChargeBankAccountView(APIView):
         if not total_cost:
             raise RuntimeError("Could not determine purchase cost")
 
-        if account.balance < total_cost and not account.is_gold:
-            return Response(
-                {"message": "Insufficient funds"}, status=status.HTTP_400_BAD_REQUEST
-            )
-
         with transaction.atomic():
-            account.remove_funds(total_cost)
-            for order in orders:
-                order.save()
+            if account.is_gold:
+                account.remove_funds(total_cost)
+            elif not account.try_remove_funds(total_cost):
+                return Response(
+                    {"message": "Insufficient funds"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+            ProductOrder.objects.bulk_create(orders)
+            write_product_order_entries(orders)
+            record_season_spend(orders)
 
             PurchaseTransactionLogEntry.objects.create(
                 user=account.user,
                 amount=total_cost,
                 transaction_source=PurchaseTransactionLogEntry.TransactionSourceOptions.API,
             )
+            transaction.on_commit(lambda: record_product_orders(orders))
 
         return Response(status=status.HTTP_200_OK)
 
 
+class BulkChargeBankAccountView(APIView):
+    """
+    Charges baskets that were queued by the X-App while it was offline. Every basket
+    carries a client generated idempotency key, so replaying a sync is safe.
+    """
+
+    def post(self, request, *args, **kwargs):
+        baskets = request.data.get("baskets")
+        if not isinstance(baskets, list):
+            return Response(
+                {"message": "Expected a list of baskets"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if len(baskets) > settings.BULK_CHARGE_MAX_BASKETS:
+            return Response(
+                {
+                    "message": f"Cannot charge more than {settings.BULK_CHARGE_MAX_BASKETS} baskets at once"
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        session = SociSession.get_active_session()
+        if session is None:
+            return Response(
+                {"message": "No active SociSession"}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        results = process_bulk_charge(baskets, session)
+        return Response({"results": results}, status=status.HTTP_200_OK)
+
+
 class BlacklistedSongsListView(ListAPIView):
     """
     Retrieves a list of ids that are blacklisted from the Soci jukebox.
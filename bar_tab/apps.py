@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class BarTabConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "bar_tab"
+
+    def ready(self):
+        # noinspection PyUnresolvedReferences
+        import bar_tab.signals
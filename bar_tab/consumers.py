@@ -0,0 +1,32 @@
+import json
+
+from channels.generic.websocket import AsyncWebsocketConsumer
+
+from bar_tab.utils import INVOICE_PDF_GROUP_NAME
+
+
+class InvoicePDFProgressConsumer(AsyncWebsocketConsumer):
+    """
+    Pushes the progress of invoice PDF generation to the bar tab admin page.
+    """
+
+    async def connect(self):
+        await self.channel_layer.group_add(INVOICE_PDF_GROUP_NAME, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, code):
+        await self.channel_layer.group_discard(
+            INVOICE_PDF_GROUP_NAME, self.channel_name
+        )
+
+    async def invoice_pdf_progress(self, event):
+        await self.send(
+            text_data=json.dumps(
+                {
+                    "type": "progress",
+                    "invoice_id": event["invoice_id"],
+                    "done": event["done"],
+                    "total": event["total"],
+                }
+            )
+        )
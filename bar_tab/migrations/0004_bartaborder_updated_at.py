@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("bar_tab", "0003_bartabcustomer_webhook_url"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="bartaborder",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
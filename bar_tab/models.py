@@ -103,6 +103,7 @@ class BarTabOrder(models.Model):
         LIST = ("LIST", "List")
 
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     type = models.CharField(max_length=4, choices=Type.choices)
     name = models.CharField(max_length=100, default="", null=False, blank=True)
     product = models.ForeignKey(
@@ -0,0 +1,7 @@
+from django.urls import path
+
+from bar_tab import consumers
+
+websocket_urlpatterns = [
+    path("ws/bar-tab/invoice-pdfs/", consumers.InvoicePDFProgressConsumer.as_asgi()),
+]
@@ -117,6 +117,9 @@ class BarTabCustomerData(graphene.ObjectType):
     we_owe = graphene.Int()
     debt = graphene.Int()
 
+    def resolve_orders(self, info):
+        return self.bar_tab.orders.filter(customer=self.customer).order_by("name")
+
 
 class BarTabQuery(graphene.ObjectType):
     bar_tab = graphene.Node.Field(BarTabNode)
@@ -165,12 +168,7 @@ class BarTabQuery(graphene.ObjectType):
         """
 
         active_bar_tab = BarTab.get_active_bar_tab()
-        customers = BarTabCustomer.objects.filter(
-            orders__bar_tab=active_bar_tab
-        ).distinct()
-        data = normalize_customer_bar_tab_data(active_bar_tab, customers)
-
-        return data
+        return normalize_customer_bar_tab_data(active_bar_tab)
 
 
 class CreateBarTabMutation(DjangoCreateMutation):
@@ -190,10 +188,8 @@ class CreateInvoicesMutation(graphene.Mutation):
     def mutate(self, info):
         active_bar_tab = BarTab.get_active_bar_tab()
         active_bar_tab.invoices.all().delete()
-        customers = BarTabCustomer.objects.filter(
-            orders__bar_tab=active_bar_tab
-        ).distinct()
-        data = normalize_customer_bar_tab_data(active_bar_tab, customers)
+        # Invoices are billed, so they are never built from cached summaries
+        data = normalize_customer_bar_tab_data(active_bar_tab, use_cache=False)
 
         invoices = create_invoices_from_bar_tab_data(data, user=info.context.user)
         active_bar_tab.status = active_bar_tab.Status.UNDER_REVIEW
@@ -203,13 +199,14 @@ class CreateInvoicesMutation(graphene.Mutation):
 
 class GenerateInvoicePDFsMutation(graphene.Mutation):
     ok = graphene.Boolean()
+    generated = graphene.Int()
 
     @gql_has_permissions("bar_tab.change_bartabinvoice")
     def mutate(self, info):
         active_bar_tab = BarTab.get_active_bar_tab()
         invoices = active_bar_tab.invoices.filter(datetime_sent__isnull=True)
-        create_pdfs_from_invoices(invoices)
-        return GenerateInvoicePDFsMutation(ok=True)
+        invoices = create_pdfs_from_invoices(invoices)
+        return GenerateInvoicePDFsMutation(ok=True, generated=len(invoices))
 
 
 class DeleteActiveBarTabPDFsMutation(graphene.Mutation):
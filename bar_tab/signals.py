@@ -0,0 +1,11 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from bar_tab.models import BarTabOrder
+from bar_tab.utils import invalidate_customer_bar_tab_summaries
+
+
+@receiver(post_save, sender=BarTabOrder)
+@receiver(post_delete, sender=BarTabOrder)
+def invalidate_customer_summaries_on_order_change(sender, instance, **kwargs):
+    invalidate_customer_bar_tab_summaries(instance.bar_tab_id)
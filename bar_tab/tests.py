@@ -1,3 +1,315 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest.mock import patch
 
-# Create your tests here.
+from addict import Dict
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from graphene.test import Client
+from graphql_relay import to_global_id
+
+from bar_tab.models import (
+    BarTab,
+    BarTabCustomer,
+    BarTabInvoice,
+    BarTabOrder,
+    BarTabProduct,
+)
+from bar_tab.utils import (
+    _summary_cache_key,
+    create_pdfs_from_invoices,
+    get_orders_by_invoice,
+)
+from ksg_nett.schema import schema
+from users.tests.factories import UserWithPermissionsFactory
+
+
+class TestCreatePdfsFromInvoices(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.bar_tab = BarTab.objects.create()
+        self.beer = BarTabProduct.objects.create(name="Øl", price=30)
+        self.customers = [
+            BarTabCustomer.objects.create(
+                name=f"Gjeng {i}", short_name=f"G{i}", email=f"g{i}@example.com"
+            )
+            for i in range(5)
+        ]
+        for customer in self.customers:
+            self.order(customer, BarTabOrder.Type.BONG, quantity=2)
+            self.order(customer, BarTabOrder.Type.LIST, name="Ola", quantity=1)
+            self.order(customer, BarTabOrder.Type.LIST, name="Ola", quantity=3)
+            self.order(customer, BarTabOrder.Type.LIST, name="Kari", away=True)
+            BarTabInvoice.objects.create(
+                bar_tab=self.bar_tab,
+                customer=customer,
+                we_owe=30,
+                they_owe=180,
+                amount=150,
+            )
+
+    def order(self, customer, type, name="", quantity=1, away=False):
+        return BarTabOrder.objects.create(
+            bar_tab=self.bar_tab,
+            customer=customer,
+            product=self.beer,
+            type=type,
+            name=name,
+            quantity=quantity,
+            cost=quantity * self.beer.price,
+            away=away,
+        )
+
+    def test__get_orders_by_invoice__groups_orders_of_each_invoice(self):
+        other_bar_tab = BarTab.objects.create()
+        BarTabOrder.objects.create(
+            bar_tab=other_bar_tab,
+            customer=self.customers[0],
+            product=self.beer,
+            type=BarTabOrder.Type.BONG,
+            quantity=1,
+            cost=30,
+        )
+        invoices = list(self.bar_tab.invoices.all())
+
+        with self.assertNumQueries(1):
+            orders_by_invoice = get_orders_by_invoice(invoices)
+            orders = orders_by_invoice[(self.bar_tab.id, self.customers[0].id)]
+            products = [order.product.name for order in orders]
+
+        self.assertEqual(4, len(orders))
+        self.assertEqual(["Øl"] * 4, products)
+
+    def test__create_pdfs_from_invoices__constant_number_of_queries(self):
+        with override_settings(MEDIA_ROOT=self.media_root):
+            with CaptureQueriesContext(connection) as context:
+                invoices = create_pdfs_from_invoices(self.bar_tab.invoices.all())
+
+        self.assertEqual(5, len(invoices))
+        self.assertTrue(all(invoice.pdf for invoice in self.bar_tab.invoices.all()))
+        # Loading the invoices and their orders, and saving each PDF
+        self.assertEqual(2 + len(invoices), len(context.captured_queries))
+
+    def test__create_pdfs_from_invoices__summarizes_orders_by_name(self):
+        with patch("bar_tab.utils.render_to_string", return_value="") as render:
+            with override_settings(MEDIA_ROOT=self.media_root):
+                create_pdfs_from_invoices(self.bar_tab.invoices.all()[:1])
+
+        context = render.call_args.kwargs["context"]
+        self.assertEqual(
+            {"Bong": 60, "Ola": 120}, context["home_orders_summarized_by_name"]
+        )
+        self.assertEqual({"Kari": 30}, context["away_orders_summarized_by_name"])
+        self.assertEqual(180, context["home_sum"])
+        self.assertEqual(30, context["away_sum"])
+
+    def test__create_pdfs_from_invoices__broadcasts_progress(self):
+        with patch("bar_tab.utils.broadcast_invoice_pdf_progress") as broadcast:
+            with override_settings(MEDIA_ROOT=self.media_root):
+                create_pdfs_from_invoices(self.bar_tab.invoices.all())
+
+        progress = [call.args[1:] for call in broadcast.call_args_list]
+        self.assertEqual([(done, 5) for done in range(1, 6)], progress)
+
+
+class TestBarTabCustomerDataQuery(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.graphql_client = Client(schema)
+        self.user = UserWithPermissionsFactory(
+            permissions=[
+                "bar_tab.view_bartabcustomer",
+                "bar_tab.add_bartaborder",
+                "bar_tab.delete_bartaborder",
+                "bar_tab.add_bartabinvoice",
+            ]
+        )
+        self.bar_tab = BarTab.objects.create()
+        self.beer = BarTabProduct.objects.create(name="Øl", price=30)
+        self.query = """
+            query BarTabCustomerData {
+              barTabCustomerData {
+                customer {
+                  name
+                }
+                summaryData {
+                  identifyingName
+                  total
+                }
+                total
+                weOwe
+                debt
+              }
+            }
+          """
+
+    def create_customer(self):
+        customer = BarTabCustomer.objects.create(
+            name=f"Gjeng {BarTabCustomer.objects.count()}",
+            short_name="G",
+            email="gjeng@example.com",
+        )
+        self.order(customer, BarTabOrder.Type.BONG, name="Ola", quantity=1)
+        self.order(customer, BarTabOrder.Type.BONG, name="Kari", quantity=2)
+        self.order(customer, BarTabOrder.Type.LIST, name="Ola", quantity=3)
+        self.order(customer, BarTabOrder.Type.LIST, name="Kari", away=True)
+        return customer
+
+    def order(self, customer, type, name="", quantity=1, away=False):
+        return BarTabOrder.objects.create(
+            bar_tab=self.bar_tab,
+            customer=customer,
+            product=self.beer,
+            type=type,
+            name=name,
+            quantity=quantity,
+            cost=quantity * self.beer.price,
+            away=away,
+        )
+
+    def customer_data(self):
+        with CaptureQueriesContext(connection) as queries:
+            executed = self.graphql_client.execute(
+                self.query, context=Dict(user=self.user)
+            )
+        self.assertNotIn("errors", executed)
+        return Dict(executed).data.barTabCustomerData, len(queries)
+
+    def test__customer_data__summarized_by_name(self):
+        self.create_customer()
+
+        data, _ = self.customer_data()
+
+        self.assertEqual(1, len(data))
+        summary = {item.identifyingName: item.total for item in data[0].summaryData}
+        self.assertEqual({"Bong": 90, "Ola": 90}, summary)
+        self.assertEqual(180, data[0].total)
+        self.assertEqual(30, data[0].weOwe)
+        self.assertEqual(150, data[0].debt)
+
+    def test__many_customers__constant_number_of_queries(self):
+        self.create_customer()
+        # Warms up the permission cache of the user
+        self.customer_data()
+        cache.clear()
+        _, few_customers_queries = self.customer_data()
+
+        for _ in range(5):
+            self.create_customer()
+        cache.clear()
+        data, many_customers_queries = self.customer_data()
+
+        self.assertEqual(6, len(data))
+        self.assertEqual(few_customers_queries, many_customers_queries)
+
+    def test__order_mutations__invalidate_cached_summaries(self):
+        customer = self.create_customer()
+        # Warms up the permission cache of the user
+        self.customer_data()
+        cache.clear()
+        _, cold_queries = self.customer_data()
+        _, warm_queries = self.customer_data()
+        self.assertEqual(cold_queries - 1, warm_queries)
+
+        create_mutation = """
+            mutation CreateBarTabOrder($input: CreateBarTabOrderInput!) {
+              createBarTabOrder(input: $input) {
+                barTabOrder {
+                  id
+                }
+              }
+            }
+          """
+        executed = self.graphql_client.execute(
+            create_mutation,
+            variables={
+                "input": {
+                    "type": "LIST",
+                    "name": "ola",
+                    "quantity": 1,
+                    "product": to_global_id("BarTabProductNode", self.beer.id),
+                    "customer": to_global_id("BarTabCustomerNode", customer.id),
+                    "barTab": to_global_id("BarTabNode", self.bar_tab.id),
+                }
+            },
+            context=Dict(user=self.user),
+        )
+        self.assertNotIn("errors", executed)
+        data, _ = self.customer_data()
+        self.assertEqual(210, data[0].total)
+
+        order_id = Dict(executed).data.createBarTabOrder.barTabOrder.id
+        delete_mutation = """
+            mutation DeleteBarTabOrder($id: ID!) {
+              deleteBarTabOrder(id: $id) {
+                found
+              }
+            }
+          """
+        executed = self.graphql_client.execute(
+            delete_mutation, variables={"id": order_id}, context=Dict(user=self.user)
+        )
+        self.assertNotIn("errors", executed)
+        data, _ = self.customer_data()
+        self.assertEqual(180, data[0].total)
+
+    def test__order_saved_outside_the_api__invalidates_cached_summaries(self):
+        customer = self.create_customer()
+        self.customer_data()
+
+        order = customer.orders.get(type=BarTabOrder.Type.LIST, away=False)
+        order.cost = 120
+        order.save()
+
+        data, _ = self.customer_data()
+        self.assertEqual(210, data[0].total)
+
+    def test__order_changed_by_another_process__cached_summaries_not_used(self):
+        customer = self.create_customer()
+        self.customer_data()
+
+        # Updates bypass the signals, like a change made by another worker whose
+        # cache is not shared with this one
+        customer.orders.filter(type=BarTabOrder.Type.LIST, away=False).update(
+            cost=120, updated_at=timezone.now() + timedelta(seconds=1)
+        )
+
+        data, _ = self.customer_data()
+        self.assertEqual(210, data[0].total)
+
+    def test__create_invoices__built_from_the_orders_not_the_cache(self):
+        customer = self.create_customer()
+        self.customer_data()
+        key = _summary_cache_key(self.bar_tab.id)
+        cached = cache.get(key)
+        cached["summaries"][0]["total"] = 0
+        cache.set(key, cached)
+
+        mutation = """
+            mutation CreateInvoices {
+              createInvoices {
+                invoices {
+                  id
+                }
+              }
+            }
+          """
+        executed = self.graphql_client.execute(mutation, context=Dict(user=self.user))
+
+        self.assertNotIn("errors", executed)
+        invoice = BarTabInvoice.objects.get(customer=customer)
+        self.assertEqual(180, invoice.they_owe)
+        self.assertEqual(150, invoice.amount)
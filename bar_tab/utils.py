@@ -1,54 +1,129 @@
-from common.util import send_email
-from django.db.models import Sum
-from bar_tab.models import BarTab, BarTabOrder
-from tempfile import NamedTemporaryFile
+import logging
+from collections import defaultdict
 
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from common.util import send_email
 from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max, Sum
+from bar_tab.models import BarTab, BarTabCustomer, BarTabOrder
+from common.pdf import iter_html_to_pdfs
+from django.core.files.base import ContentFile
 from django.template.loader import render_to_string
-from weasyprint import CSS, HTML
-from weasyprint.text.fonts import FontConfiguration
 
+logger = logging.getLogger(__name__)
 
-def normalize_customer_orders(orders):
-    from .schema import CustomerBarTabSummaryItem
+INVOICE_PDF_GROUP_NAME = "bar-tab-invoice-pdfs"
+CUSTOMER_SUMMARY_KEY_PREFIX = "bar-tab:customer-summaries:"
 
-    summary_dict = {}
-    for order in orders:
-        dict_key = order.get_name_display
-        existing_total = summary_dict.get(dict_key, 0)
-        summary_dict[dict_key] = existing_total + order.cost
-
-    parsed_orders = []
-    for key, value in summary_dict.items():
-        parsed_orders.append(
-            CustomerBarTabSummaryItem(identifying_name=key, total=value)
+
+def _summary_cache_key(bar_tab_id):
+    return f"{CUSTOMER_SUMMARY_KEY_PREFIX}{bar_tab_id}"
+
+
+def _get_orders_stamp(bar_tab: BarTab):
+    """
+    Changes whenever an order of the bar tab is created, edited or deleted, so cached
+    summaries can be checked against the database with one cheap query, whichever
+    process changed the orders.
+    """
+    stamp = BarTabOrder.objects.filter(bar_tab=bar_tab).aggregate(
+        count=Count("id"), updated_at=Max("updated_at")
+    )
+    return stamp["count"], stamp["updated_at"]
+
+
+def _summarize_customer_orders(bar_tab: BarTab):
+    rows = (
+        BarTabOrder.objects.filter(bar_tab=bar_tab)
+        .values("customer_id", "away", "type", "name")
+        .annotate(total=Sum("cost"))
+        .order_by("customer_id", "name", "type")
+    )
+    by_customer = {}
+    for row in rows:
+        summary = by_customer.setdefault(
+            row["customer_id"], {"summary_data": {}, "we_owe": 0}
         )
-    return parsed_orders
+        if row["away"]:
+            summary["we_owe"] += row["total"]
+            continue
 
+        # Mirrors BarTabOrder.get_name_display
+        if row["type"] == BarTabOrder.Type.BONG:
+            name = BarTabOrder.Type.BONG.label
+        else:
+            name = row["name"]
+        summary_data = summary["summary_data"]
+        summary_data[name] = summary_data.get(name, 0) + row["total"]
+
+    return [
+        {
+            "customer_id": customer_id,
+            "summary_data": list(summary["summary_data"].items()),
+            "total": sum(summary["summary_data"].values()),
+            "we_owe": summary["we_owe"],
+        }
+        for customer_id, summary in by_customer.items()
+    ]
+
+
+def get_customer_bar_tab_summaries(bar_tab: BarTab, use_cache=True):
+    """
+    Sums up the orders of every customer of a bar tab with one grouped query. Home
+    orders are summed by their display name, and away orders make up what we owe.
+    Cached summaries are only used while the orders of the bar tab are unchanged.
+    Pass use_cache=False when the summaries are billed, to always read the orders.
+
+    Summary keys: customer_id, summary_data (list of (name, total)), total, we_owe
+    """
+    if not use_cache:
+        return _summarize_customer_orders(bar_tab)
+
+    key = _summary_cache_key(bar_tab.id)
+    stamp = _get_orders_stamp(bar_tab)
+    cached = cache.get(key)
+    if cached is not None and cached["stamp"] == stamp:
+        return cached["summaries"]
+
+    summaries = _summarize_customer_orders(bar_tab)
+    cache.set(
+        key,
+        {"stamp": stamp, "summaries": summaries},
+        settings.BAR_TAB_SUMMARY_CACHE_TIMEOUT,
+    )
+    return summaries
 
-def normalize_customer_bar_tab_data(bar_tab: BarTab, customers):
-    from .schema import BarTabCustomerData
 
-    data = []
-    for customer in customers:
-        orders = customer.orders.filter(bar_tab=bar_tab).order_by("name")
-        away_orders = orders.filter(away=True)
-        home_orders = orders.filter(away=False)
-        normalized_orders = normalize_customer_orders(home_orders)
+def invalidate_customer_bar_tab_summaries(bar_tab_id):
+    cache.delete(_summary_cache_key(bar_tab_id))
+
+
+def normalize_customer_bar_tab_data(bar_tab: BarTab, use_cache=True):
+    from .schema import BarTabCustomerData, CustomerBarTabSummaryItem
 
-        we_owe = away_orders.aggregate(Sum("cost"))["cost__sum"] or 0
-        total_cost = sum([customer_tab.total for customer_tab in normalized_orders])
-        debt = total_cost - we_owe
+    if bar_tab is None:
+        return []
 
+    summaries = get_customer_bar_tab_summaries(bar_tab, use_cache=use_cache)
+    customers = BarTabCustomer.objects.in_bulk(
+        [summary["customer_id"] for summary in summaries]
+    )
+
+    data = []
+    for summary in summaries:
         data.append(
             BarTabCustomerData(
-                customer=customer,
+                customer=customers[summary["customer_id"]],
                 bar_tab=bar_tab,
-                orders=orders,
-                summary_data=normalized_orders,
-                total=total_cost,
-                we_owe=we_owe,
-                debt=debt,
+                summary_data=[
+                    CustomerBarTabSummaryItem(identifying_name=name, total=total)
+                    for name, total in summary["summary_data"]
+                ],
+                total=summary["total"],
+                we_owe=summary["we_owe"],
+                debt=summary["total"] - summary["we_owe"],
             )
         )
 
@@ -69,72 +144,92 @@ def create_invoices_from_bar_tab_data(data, user=None):
         )
 
 
-def create_pdfs_from_invoices(invoices):
-    for invoice in invoices:
-        file = create_pdf_file(invoice)
-        invoice.pdf.save(
-            f"BSF Faktura KSG {invoice.id} - {invoice.customer.name} .pdf", file
+def _summarize_orders_by_name(orders):
+    summary = {}
+    for order in orders:
+        name = "Bong" if order.type == BarTabOrder.Type.BONG else order.name
+        summary[name] = summary.get(name, 0) + order.cost
+    return summary
+
+
+def get_orders_by_invoice(invoices):
+    """
+    Loads the orders of all the invoices with one query, grouped by the bar tab and
+    customer of the invoice they belong to.
+    """
+    orders = (
+        BarTabOrder.objects.filter(
+            bar_tab_id__in={invoice.bar_tab_id for invoice in invoices},
+            customer_id__in={invoice.customer_id for invoice in invoices},
         )
+        .select_related("product")
+        .order_by("id")
+    )
+    orders_by_invoice = defaultdict(list)
+    for order in orders:
+        orders_by_invoice[(order.bar_tab_id, order.customer_id)].append(order)
+    return orders_by_invoice
 
 
-def create_pdf_file(invoice):
-    orders = invoice.bar_tab.orders.filter(customer=invoice.customer)
-    away, home = orders.filter(away=True), orders.filter(away=False)
-
-    away_orders_summarized_by_name = {}
-    home_orders_summarized_by_name = {}
-
-    for order in home:
-        if order.type == BarTabOrder.Type.BONG:
-            name = "Bong"
-        else:
-            name = order.name
-
-        cost = home_orders_summarized_by_name.get(name, None)
-        if cost:
-            home_orders_summarized_by_name[name] += order.cost
-        else:
-            home_orders_summarized_by_name.update({name: order.cost})
-
-    for order in away:
-        if order.type == BarTabOrder.Type.BONG:
-            name = "Bong"
-        else:
-            name = order.name
-
-        cost = away_orders_summarized_by_name.get(name, None)
-        if cost:
-            away_orders_summarized_by_name[name] += order.cost
-        else:
-            away_orders_summarized_by_name.update({name: order.cost})
-
+def render_invoice_html(invoice, orders):
+    away = [order for order in orders if order.away]
+    home = [order for order in orders if not order.away]
     context = {
         "invoice": invoice,
         "away_orders": away,
-        "away_sum": sum([order.cost for order in away]),
+        "away_sum": sum(order.cost for order in away),
         "home_orders": home,
-        "away_orders_summarized_by_name": away_orders_summarized_by_name,
-        "home_orders_summarized_by_name": home_orders_summarized_by_name,
-        "home_sum": sum([order.cost for order in home]),
+        "away_orders_summarized_by_name": _summarize_orders_by_name(away),
+        "home_orders_summarized_by_name": _summarize_orders_by_name(home),
+        "home_sum": sum(order.cost for order in home),
     }
+    return render_to_string(template_name="bar_tab/invoice.html", context=context)
 
-    html_content = render_to_string(
-        template_name="bar_tab/invoice.html", context=context
-    )
 
-    font_config = FontConfiguration()
-    css = CSS(
-        string="""
-        @import url('https://fonts.googleapis.com/css?family=Work+Sans:300,400,600,700&display=swap');
-    """,
-        font_config=font_config,
-    )
+def _invoice_pdf_name(invoice):
+    return f"BSF Faktura KSG {invoice.id} - {invoice.customer.name} .pdf"
 
-    file = NamedTemporaryFile(delete=True)
-    HTML(string=html_content, base_url=settings.BASE_URL).write_pdf(
-        file, stylesheets=[css], font_config=font_config
-    )
-    return file
+
+def create_pdfs_from_invoices(invoices):
+    """
+    Renders the PDFs of a queryset of invoices in parallel, saving each one as soon as
+    it is done and broadcasting the progress to INVOICE_PDF_GROUP_NAME.
+    """
+    invoices = list(invoices.select_related("customer", "created_by"))
+    orders_by_invoice = get_orders_by_invoice(invoices)
+    html_contents = [
+        render_invoice_html(
+            invoice, orders_by_invoice[(invoice.bar_tab_id, invoice.customer_id)]
+        )
+        for invoice in invoices
+    ]
+
+    for done, (index, pdf) in enumerate(iter_html_to_pdfs(html_contents), start=1):
+        invoice = invoices[index]
+        invoice.pdf.save(_invoice_pdf_name(invoice), ContentFile(pdf))
+        broadcast_invoice_pdf_progress(invoice, done, len(invoices))
+
+    return invoices
+
+
+def broadcast_invoice_pdf_progress(invoice, done, total):
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+
+    try:
+        async_to_sync(channel_layer.group_send)(
+            INVOICE_PDF_GROUP_NAME,
+            {
+                "type": "invoice_pdf_progress",
+                "invoice_id": invoice.id,
+                "done": done,
+                "total": total,
+            },
+        )
+    except Exception as e:
+        # Progress is only informational, the PDFs are saved regardless
+        logger.warning(f"Unable to push invoice PDF progress. Failed with {e}.")
 
 
 def send_invoice_email(invoice, user):
@@ -1,4 +1,47 @@
 from django.contrib import admin
-from .models import FeatureFlag
+from django.utils import timezone
+
+from .models import FeatureFlag, Job, OutboxEmail, PeriodicJob
 
 admin.site.register(FeatureFlag)
+
+
+@admin.register(OutboxEmail)
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ["subject", "status", "attempts", "created_at", "sent_at"]
+    list_filter = ["status"]
+    search_fields = ["subject", "recipients"]
+    readonly_fields = ["attachments"]
+    actions = ["retry_emails"]
+
+    @admin.action(description="Retry selected emails")
+    def retry_emails(self, request, queryset):
+        retried = queryset.exclude(status=OutboxEmail.Status.SENT).update(
+            status=OutboxEmail.Status.PENDING,
+            attempts=0,
+            next_attempt_at=timezone.now(),
+        )
+        self.message_user(request, f"Retrying {retried} emails")
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ["name", "status", "priority", "attempts", "created_at", "run_at"]
+    list_filter = ["status", "name"]
+    search_fields = ["name"]
+    actions = ["retry_jobs"]
+
+    @admin.action(description="Retry selected jobs")
+    def retry_jobs(self, request, queryset):
+        retried = queryset.filter(status=Job.Status.FAILED).update(
+            status=Job.Status.PENDING,
+            attempts=0,
+            run_at=timezone.now(),
+        )
+        self.message_user(request, f"Retrying {retried} jobs")
+
+
+@admin.register(PeriodicJob)
+class PeriodicJobAdmin(admin.ModelAdmin):
+    list_display = ["name", "interval", "enabled", "next_run_at", "last_run_at"]
+    list_filter = ["enabled"]
@@ -3,7 +3,7 @@ from typing import Callable
 from django.core.exceptions import PermissionDenied
 from common.exceptions import IllegalOperation
 
-from .models import FeatureFlag
+from .feature_flags import is_feature_flag_enabled
 
 
 def _handle_not_permitted(
@@ -112,8 +112,7 @@ def view_feature_flag_required(
     def decorator(func):
         @wraps(func)
         def wrapper(request, *args, **kwargs):
-            feature_flag, _ = FeatureFlag.objects.get_or_create(name=feature_flag_name)
-            if not feature_flag.enabled:
+            if not is_feature_flag_enabled(feature_flag_name):
                 if fail_to_none:
                     return None
                 else:
@@ -133,8 +132,7 @@ def gql_feature_flag_required(
     def decorator(func):
         @wraps(func)
         def wrapper(cls, info, *args, **kwargs):
-            feature_flag, _ = FeatureFlag.objects.get_or_create(name=feature_flag_name)
-            if not feature_flag.enabled:
+            if not is_feature_flag_enabled(feature_flag_name):
                 if fail_to_none:
                     return None
                 else:
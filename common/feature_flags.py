@@ -0,0 +1,83 @@
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+from django.db.models import Count, Max
+
+from common.models import FeatureFlag
+
+_lock = threading.Lock()
+_flags: Optional[Dict[str, bool]] = None
+_stamp: Optional[Tuple] = None
+_checked_at = 0.0
+
+
+def _get_stamp() -> Tuple:
+    """
+    Changes whenever a flag is saved or deleted, so a process can tell whether its
+    cached flags are current with one cheap query.
+    """
+    stamp = FeatureFlag.objects.aggregate(
+        count=Count("id"), updated_at=Max("updated_at")
+    )
+    return stamp["count"], stamp["updated_at"]
+
+
+def _get_flags() -> Dict[str, bool]:
+    global _flags, _stamp, _checked_at
+
+    now = time.monotonic()
+    if (
+        _flags is not None
+        and now < _checked_at + settings.FEATURE_FLAG_REFRESH_INTERVAL
+    ):
+        return _flags
+
+    with _lock:
+        # Read before the flags, so a flag saved in between only causes another reload
+        stamp = _get_stamp()
+        if _flags is None or stamp != _stamp:
+            _flags = dict(FeatureFlag.objects.values_list("name", "enabled"))
+            _stamp = stamp
+        _checked_at = now
+        return _flags
+
+
+def is_feature_flag_enabled(name: str) -> bool:
+    """
+    Returns whether a feature flag is enabled, creating it as disabled the first time
+    it is asked for. The flags are cached in each process and checked against a
+    version stamp at most every FEATURE_FLAG_REFRESH_INTERVAL seconds, so a toggle
+    reaches every worker within that time.
+    """
+    flags = _get_flags()
+    enabled = flags.get(name)
+    if enabled is None:
+        flag, _ = FeatureFlag.objects.get_or_create(name=name)
+        # Reloads the flags, so the new flag is cached with the stamp it changed
+        expire_feature_flags()
+        _get_flags()
+        enabled = flag.enabled
+    return enabled
+
+
+def expire_feature_flags():
+    """
+    Makes the next read in this process check the version stamp. Flags are saved
+    without touching the cached values, so a save that is rolled back leaves them
+    as they were, while a committed one changes the stamp and is reloaded.
+    """
+    global _checked_at
+    with _lock:
+        _checked_at = 0.0
+
+
+def clear_feature_flags():
+    """
+    Drops the flags cached in this process
+    """
+    global _flags, _stamp
+    with _lock:
+        _flags = None
+        _stamp = None
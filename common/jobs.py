@@ -0,0 +1,275 @@
+import json
+import logging
+import os
+import socket
+import time
+from typing import Callable, Dict, List, Optional, Sequence
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import autodiscover_modules
+
+from common.models import Job, PeriodicJob
+
+logger = logging.getLogger(__name__)
+
+# Number of due jobs a worker tries to claim on databases without SKIP LOCKED, in
+# case other workers claim the first ones before it
+CLAIM_CANDIDATES = 10
+
+_registry: Dict[str, Callable] = {}
+
+
+def job(name=None, priority=0, max_attempts=None):
+    """
+    Registers a function as a job, so it can be queued with `function.delay(...)` and
+    run by the runworkers command instead of inline in a request. Jobs are registered
+    as `module.function` unless given a name, and their arguments and return values
+    have to be JSON serializable. Jobs are found by the workers when they are put in
+    a `jobs.py` module of an app.
+
+        @job(priority=10)
+        def send_receipt(deposit_id):
+            ...
+
+        send_receipt.delay(deposit.id)
+    """
+
+    def decorator(func):
+        job_name = name or f"{func.__module__}.{func.__name__}"
+        _registry[job_name] = func
+
+        def delay(*args, **kwargs) -> Job:
+            return enqueue_job(
+                job_name, args, kwargs, priority=priority, max_attempts=max_attempts
+            )
+
+        func.job_name = job_name
+        func.delay = delay
+        return func
+
+    if callable(name):
+        func, name = name, None
+        return decorator(func)
+    return decorator
+
+
+def load_jobs():
+    autodiscover_modules("jobs")
+
+
+def get_job_function(name: str) -> Callable:
+    if name not in _registry:
+        load_jobs()
+    try:
+        return _registry[name]
+    except KeyError:
+        raise LookupError(f"No job is registered as {name}")
+
+
+def enqueue_job(
+    name: str,
+    args: Sequence = (),
+    kwargs: Optional[dict] = None,
+    priority: int = 0,
+    run_at=None,
+    max_attempts: Optional[int] = None,
+) -> Job:
+    """
+    Queues a registered job. It is queued in the current transaction, so it is never
+    run if the transaction is rolled back, and never before it is committed.
+    """
+    return Job.objects.create(
+        name=name,
+        args=list(args),
+        kwargs=kwargs or {},
+        priority=priority,
+        run_at=run_at or timezone.now(),
+        max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS,
+    )
+
+
+def claim_job(worker: str) -> Optional[Job]:
+    """
+    Takes the due job with the highest priority, along with running jobs whose worker
+    has not finished them within the lease. Postgres skips the rows other workers have
+    locked. Databases without SKIP LOCKED, like SQLite, fall back to only claiming a job
+    if its status and attempts are unchanged since it was read, so two workers never
+    claim the same job.
+    """
+    now = timezone.now()
+    due = Job.objects.filter(
+        Q(status=Job.Status.PENDING)
+        | Q(status=Job.Status.RUNNING, locked_until__lt=now),
+        run_at__lte=now,
+    ).order_by("-priority", "run_at", "id")
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            candidates = list(due.select_for_update(skip_locked=True)[:1])
+            return _claim_first(candidates, worker, now)
+
+    # Reading and claiming in one transaction would make SQLite fail with "database
+    # is locked" when it cannot upgrade the read lock, instead of waiting for it
+    return _claim_first(list(due[:CLAIM_CANDIDATES]), worker, now)
+
+
+def _claim_first(candidates: List[Job], worker: str, now) -> Optional[Job]:
+    for candidate in candidates:
+        claimed = Job.objects.filter(
+            pk=candidate.pk, status=candidate.status, attempts=candidate.attempts
+        ).update(
+            status=Job.Status.RUNNING,
+            attempts=F("attempts") + 1,
+            worker=worker,
+            started_at=now,
+            locked_until=now + settings.JOB_LEASE,
+        )
+        if claimed:
+            candidate.status = Job.Status.RUNNING
+            candidate.attempts += 1
+            candidate.worker = worker
+            candidate.started_at = now
+            return candidate
+    return None
+
+
+def get_retry_delay(attempts: int):
+    delay = settings.JOB_RETRY_DELAY * 2 ** (attempts - 1)
+    return min(delay, settings.JOB_MAX_RETRY_DELAY)
+
+
+def _to_json(value):
+    try:
+        return json.loads(json.dumps(value, cls=DjangoJSONEncoder))
+    except (TypeError, ValueError):
+        return None
+
+
+def run_job(job: Job) -> Job:
+    """
+    Runs a claimed job and stores its result. A failed job is queued again with a
+    delay that doubles for every attempt, until it runs out of attempts.
+    """
+    try:
+        if job.attempts > job.max_attempts:
+            # The job was claimed again after its last attempt lost its worker
+            raise RuntimeError("The worker running the last attempt was lost")
+        func = get_job_function(job.name)
+        result = func(*job.args, **job.kwargs)
+    except Exception as e:
+        logger.exception(f"Job {job.pk} {job.name} failed")
+        job.last_error = f"{type(e).__name__}: {e}"
+        if job.attempts >= job.max_attempts:
+            job.status = Job.Status.FAILED
+            job.finished_at = timezone.now()
+        else:
+            job.status = Job.Status.PENDING
+            job.run_at = timezone.now() + get_retry_delay(job.attempts)
+    else:
+        job.status = Job.Status.SUCCEEDED
+        job.result = _to_json(result)
+        job.last_error = ""
+        job.finished_at = timezone.now()
+
+    job.locked_until = None
+    job.save(
+        update_fields=[
+            "status",
+            "result",
+            "last_error",
+            "run_at",
+            "locked_until",
+            "finished_at",
+        ]
+    )
+    return job
+
+
+def queue_periodic_jobs() -> int:
+    """
+    Queues the periodic jobs that are due, and returns how many were queued. Runs
+    missed while no workers were running are skipped. Only the worker that moves the
+    next run of a periodic job forward queues it, so it is queued once per run however
+    many workers are checking.
+    """
+    now = timezone.now()
+    queued = 0
+    for periodic_job in PeriodicJob.objects.filter(enabled=True, next_run_at__lte=now):
+        missed = (now - periodic_job.next_run_at) // periodic_job.interval
+        next_run_at = periodic_job.next_run_at + (missed + 1) * periodic_job.interval
+        with transaction.atomic():
+            moved = PeriodicJob.objects.filter(
+                pk=periodic_job.pk, next_run_at=periodic_job.next_run_at
+            ).update(next_run_at=next_run_at, last_run_at=now)
+            if moved:
+                enqueue_job(
+                    periodic_job.name,
+                    periodic_job.args,
+                    periodic_job.kwargs,
+                    priority=periodic_job.priority,
+                )
+                queued += 1
+    return queued
+
+
+def _close_old_connections():
+    # Closing a connection inside a transaction would break it, as in the tests
+    if not connection.in_atomic_block:
+        close_old_connections()
+
+
+def run_worker(name: Optional[str] = None, once=False, interval: float = 1) -> int:
+    """
+    Runs jobs until interrupted, checking for due periodic jobs at most every
+    `interval` seconds and waiting that long when there is nothing to do. With `once`
+    the worker returns once there are no due jobs left. Returns the number of jobs
+    run.
+
+    Broken database connections are replaced before every job, and a worker that
+    fails to claim or store a job logs the error and waits before trying again, so it
+    outlives a database restart. With `once` the error is raised instead.
+    """
+    load_jobs()
+    name = name or f"{socket.gethostname()}:{os.getpid()}"
+    ran = 0
+    errors = 0
+    next_periodic_check = 0
+    while True:
+        _close_old_connections()
+        try:
+            if time.monotonic() >= next_periodic_check:
+                queue_periodic_jobs()
+                next_periodic_check = time.monotonic() + interval
+
+            job = claim_job(name)
+            if job is not None:
+                run_job(job)
+                ran += 1
+            errors = 0
+        except Exception:
+            if once:
+                raise
+            errors += 1
+            delay = min(
+                interval * 2 ** (errors - 1),
+                settings.JOB_WORKER_MAX_ERROR_DELAY.total_seconds(),
+            )
+            logger.exception(f"Worker {name} failed, trying again in {delay:.0f} s")
+            time.sleep(delay)
+            continue
+
+        if job is None:
+            if once:
+                return ran
+            time.sleep(interval)
+
+
+@job(name="common.noop")
+def noop():
+    """
+    Does nothing, for measuring the overhead of running a job
+    """
@@ -0,0 +1,148 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.template.loader import get_template
+from django.utils.functional import cached_property
+
+from common.util import build_email
+
+
+class RateLimiter:
+    """
+    Spaces out calls to `wait` so they happen at most `rate` times per second, across
+    all the threads sharing the limiter. A rate of None does not limit anything.
+    """
+
+    def __init__(self, rate: Optional[float]):
+        self.interval = 1 / rate if rate else 0
+        self.next_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+
+        with self.lock:
+            now = time.monotonic()
+            at = max(self.next_at, now)
+            self.next_at = at + self.interval
+
+        if at > now:
+            time.sleep(at - now)
+
+
+def send_email_messages(
+    messages: Sequence[EmailMessage],
+    concurrency: int = 1,
+    rate_limit: Optional[float] = None,
+) -> Iterator[Tuple[int, Optional[Exception]]]:
+    """
+    Sends already built emails, yielding (index, error) for each one as soon as it has
+    been sent, where error is None if sending succeeded. The emails are spread over
+    `concurrency` threads that each keep one connection to the mail server open for
+    all the emails they send, and at most `rate_limit` emails are sent per second.
+    """
+    limiter = RateLimiter(rate_limit)
+    local = threading.local()
+    connections = []
+    connections_lock = threading.Lock()
+
+    def get_thread_connection():
+        connection = getattr(local, "connection", None)
+        if connection is None:
+            connection = get_connection(fail_silently=False)
+            connection.open()
+            local.connection = connection
+            with connections_lock:
+                connections.append(connection)
+        return connection
+
+    def send(message: EmailMessage):
+        limiter.wait()
+        message.connection = get_thread_connection()
+        message.send(fail_silently=False)
+
+    executor = ThreadPoolExecutor(max_workers=max(concurrency, 1))
+    try:
+        futures = {
+            executor.submit(send, message): index
+            for index, message in enumerate(messages)
+        }
+        for future in as_completed(futures):
+            yield futures[future], future.exception()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        for connection in connections:
+            connection.close()
+
+
+class DeliveryStatus(NamedTuple):
+    email: str
+    sent: bool
+    error: str
+
+
+class MailMergeTemplate:
+    """
+    An email personalized for each recipient from a text and an optional HTML
+    template. The templates are compiled once, the first time they are rendered.
+    """
+
+    def __init__(
+        self, subject, text_template_name: str, html_template_name: str = None
+    ):
+        self.subject = subject
+        self.text_template_name = text_template_name
+        self.html_template_name = html_template_name
+
+    @cached_property
+    def text_template(self):
+        return get_template(self.text_template_name)
+
+    @cached_property
+    def html_template(self):
+        if self.html_template_name is None:
+            return None
+        return get_template(self.html_template_name)
+
+    def render(self, email: str, context: dict) -> EmailMessage:
+        return build_email(
+            subject=str(self.subject),
+            message=self.text_template.render(context),
+            html_message=(
+                self.html_template.render(context) if self.html_template else ""
+            ),
+            recipients=[email],
+        )
+
+
+def send_mail_merge(
+    template: MailMergeTemplate,
+    recipients: Sequence[Tuple[str, dict]],
+    concurrency: Optional[int] = None,
+    rate_limit: Optional[float] = None,
+) -> List[DeliveryStatus]:
+    """
+    Renders a personalized email for each (email, context) pair up front, and sends
+    them over MAIL_MERGE_CONCURRENCY pooled connections. Returns the delivery status
+    of every recipient, in the order they were given.
+    """
+    messages = [template.render(email, context) for email, context in recipients]
+    statuses = [None] * len(messages)
+    for index, error in send_email_messages(
+        messages,
+        concurrency or settings.MAIL_MERGE_CONCURRENCY,
+        rate_limit or settings.MAIL_MERGE_RATE_LIMIT,
+    ):
+        email = recipients[index][0]
+        if error is None:
+            statuses[index] = DeliveryStatus(email, True, "")
+        else:
+            statuses[index] = DeliveryStatus(
+                email, False, f"{type(error).__name__}: {error}"
+            )
+    return statuses
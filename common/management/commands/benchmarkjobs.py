@@ -0,0 +1,69 @@
+import multiprocessing
+import time
+
+from django import db
+from django.core.management.base import BaseCommand, CommandError
+
+from common.jobs import noop
+from common.management.commands.runworkers import work
+from common.models import Job
+
+
+class Command(BaseCommand):
+    help = "Measures how many jobs per second the job workers run"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--jobs", type=int, default=1000, help="Number of jobs to queue"
+        )
+        parser.add_argument(
+            "--workers", type=int, default=1, help="Number of worker processes"
+        )
+
+    def handle(self, *args, **options):
+        try:
+            self.benchmark(*args, **options)
+
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f"{e}"))
+            raise CommandError(e)
+
+    def benchmark(self, *args, **options):
+        if Job.objects.filter(status=Job.Status.PENDING).exists():
+            raise CommandError(
+                "There are pending jobs the benchmark would run. Run it against an "
+                "empty queue"
+            )
+
+        jobs = options["jobs"]
+        workers = max(options["workers"], 1)
+        queued = Job.objects.bulk_create(
+            [Job(name=noop.job_name, max_attempts=1) for _ in range(jobs)]
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f"Running {jobs} empty jobs with {workers} workers")
+        )
+
+        db.connections.close_all()
+        processes = [
+            multiprocessing.Process(target=work, args=(True, 1)) for _ in range(workers)
+        ]
+        start = time.perf_counter()
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - start
+
+        ran = Job.objects.filter(
+            name=noop.job_name, status=Job.Status.SUCCEEDED
+        ).count()
+        Job.objects.filter(name=noop.job_name).delete()
+        if ran < len(queued):
+            raise CommandError(f"Only {ran} of {jobs} jobs ran")
+
+        self.stdout.write(
+            f"{ran} jobs in {elapsed:.2f} s   "
+            f"{ran / elapsed:8.1f} jobs/s   "
+            f"{ran / elapsed / workers:8.1f} jobs/s per worker"
+        )
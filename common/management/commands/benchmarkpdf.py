@@ -0,0 +1,65 @@
+import time
+import uuid
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from common.pdf import render_pdf
+
+
+class Command(BaseCommand):
+    help = "Measures cold and warm render times of the PDF rendering service"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--template",
+            default="common/pdf_render_test.html",
+            help="Template to render, given a unique `variable` in its context",
+        )
+        parser.add_argument(
+            "--runs", type=int, default=5, help="Number of renders of each kind"
+        )
+
+    def handle(self, *args, **options):
+        try:
+            self.benchmark(*args, **options)
+
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f"{e}"))
+            raise CommandError(e)
+
+    def time_renders(self, template, contexts):
+        timings = []
+        for context in contexts:
+            start = time.perf_counter()
+            render_pdf(template, context)
+            timings.append((time.perf_counter() - start) * 1000)
+        return timings
+
+    def report(self, name, timings):
+        self.stdout.write(
+            f"{name:<8} min {min(timings):8.1f} ms   "
+            f"mean {sum(timings) / len(timings):8.1f} ms   "
+            f"max {max(timings):8.1f} ms"
+        )
+
+    def benchmark(self, *args, **options):
+        template = options["template"]
+        runs = options["runs"]
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rendering {template} {runs} times each with "
+                f"{settings.PDF_RENDER_WORKERS} render workers"
+            )
+        )
+
+        # Unique content is never in the output cache, so each of these is a full
+        # render. The first one also pays for starting the pool and loading fonts
+        contexts = [{"variable": uuid.uuid4().hex} for _ in range(runs)]
+        cold = self.time_renders(template, contexts)
+        warm = self.time_renders(template, contexts)
+
+        self.report("First", cold[:1])
+        if runs > 1:
+            self.report("Uncached", cold[1:])
+        self.report("Cached", warm)
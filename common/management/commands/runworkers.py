@@ -0,0 +1,112 @@
+import multiprocessing
+import time
+
+import django
+from django import db
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from common.jobs import run_worker
+
+
+def work(once, interval):
+    # Spawned processes start without Django, and forked ones must not share the
+    # database connections of the parent
+    django.setup()
+    db.connections.close_all()
+    try:
+        run_worker(once=once, interval=interval)
+    except KeyboardInterrupt:
+        pass
+
+
+class Command(BaseCommand):
+    help = "Runs the jobs queued with the @job decorator, in a number of processes"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=settings.JOB_WORKERS,
+            help="Number of worker processes. Defaults to JOB_WORKERS",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            default=False,
+            help="Run the jobs that are due and exit, instead of waiting for new jobs",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=1,
+            help="Seconds to wait before checking again when there are no due jobs",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            self.run_workers(*args, **options)
+
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.SUCCESS("Stopped"))
+
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f"{e}"))
+            raise CommandError(e)
+
+    def log(self, message):
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{timezone.now().strftime('%Y-%d-%m, %H:%M:%S')} {message}"
+            )
+        )
+
+    def run_workers(self, *args, **options):
+        workers = max(options["workers"], 1)
+        self.log(f"Starting {workers} workers")
+
+        if workers == 1:
+            ran = run_worker(once=options["once"], interval=options["interval"])
+            self.log(f"Ran {ran} jobs")
+            return
+
+        db.connections.close_all()
+        processes = [
+            self.start_worker(options["once"], options["interval"])
+            for _ in range(workers)
+        ]
+        try:
+            if options["once"]:
+                for process in processes:
+                    process.join()
+            else:
+                self.restart_dead_workers(processes, options["interval"])
+        finally:
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+
+        failed = [process for process in processes if process.exitcode]
+        if failed:
+            raise CommandError(f"{len(failed)} workers exited with an error")
+        self.log("Workers stopped")
+
+    @staticmethod
+    def start_worker(once, interval):
+        process = multiprocessing.Process(target=work, args=(once, interval))
+        process.start()
+        return process
+
+    def restart_dead_workers(self, processes, interval):
+        # Workers only stop on errors they cannot recover from, so they are started
+        # again instead of leaving fewer workers running until the next deploy
+        while True:
+            time.sleep(interval)
+            for index, process in enumerate(processes):
+                if not process.is_alive():
+                    self.log(
+                        f"Worker {process.pid} exited with code {process.exitcode}, "
+                        f"starting a new one"
+                    )
+                    processes[index] = self.start_worker(False, interval)
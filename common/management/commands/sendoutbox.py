@@ -0,0 +1,91 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from common.outbox import get_outbox_metrics, send_outbox_batch
+
+
+class Command(BaseCommand):
+    help = "Sends the emails queued in the outbox, in batches over one connection"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=None,
+            help="Number of emails sent per connection. Defaults to "
+            "EMAIL_OUTBOX_BATCH_SIZE",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            default=False,
+            help="Send what is due and exit, instead of waiting for new emails",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=5,
+            help="Seconds to wait before checking again when the outbox is empty",
+        )
+        parser.add_argument(
+            "--metrics",
+            action="store_true",
+            default=False,
+            help="Only print the queue depth and latency of the outbox",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            if options["metrics"]:
+                self.report_metrics()
+                return
+
+            self.send_outbox(*args, **options)
+
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.SUCCESS("Stopped"))
+
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f"{e}"))
+            raise CommandError(e)
+
+    def report_metrics(self):
+        metrics = get_outbox_metrics()
+        oldest = (
+            f"{metrics.oldest_pending_age:.0f}s"
+            if metrics.oldest_pending_age is not None
+            else "-"
+        )
+        latency = (
+            f"{metrics.average_latency:.1f}s"
+            if metrics.average_latency is not None
+            else "-"
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{timezone.now().strftime('%Y-%d-%m, %H:%M:%S')} "
+                f"{metrics.pending} pending (oldest {oldest}), {metrics.dead} dead, "
+                f"average latency {latency}"
+            )
+        )
+
+    def send_outbox(self, *args, **options):
+        while True:
+            result = send_outbox_batch(options["batch_size"])
+            if result.sent or result.failed:
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f"{timezone.now().strftime('%Y-%d-%m, %H:%M:%S')} "
+                        f"Sent {result.sent} emails, {result.failed} failed "
+                        f"of which {result.dead} are dead"
+                    )
+                )
+                self.report_metrics()
+                continue
+
+            if options["once"]:
+                return
+
+            time.sleep(options["interval"])
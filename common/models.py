@@ -15,6 +15,117 @@ class FeatureFlag(models.Model):
     name = models.CharField(max_length=255, unique=True)
     description = models.TextField(default="", blank=True)
     enabled = models.BooleanField(default=False)
+    # Part of the version stamp processes check their cached flags against
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.name}: {self.enabled}"
+
+
+class OutboxEmail(models.Model):
+    """
+    An email waiting to be sent by the sendoutbox worker, so requests do not wait for
+    the mail server. Failed emails are retried with a growing delay, and given up on
+    as dead after EMAIL_OUTBOX_MAX_ATTEMPTS attempts.
+    """
+
+    class Meta:
+        verbose_name = "Outbox email"
+        verbose_name_plural = "Outbox emails"
+        indexes = [models.Index(fields=["status", "next_attempt_at", "id"])]
+
+    class Status(models.TextChoices):
+        PENDING = "PENDING", "Pending"
+        SENT = "SENT", "Sent"
+        DEAD = "DEAD", "Dead"
+
+    subject = models.CharField(max_length=998)
+    message = models.TextField(blank=True, default="")
+    html_message = models.TextField(blank=True, default="")
+    sender = models.CharField(max_length=254)
+    recipients = models.JSONField(default=list)
+    cc = models.JSONField(default=list)
+    bcc = models.JSONField(default=list)
+    reply_to = models.JSONField(default=list)
+    # Name, base64 encoded content and mimetype of each attachment
+    attachments = models.JSONField(default=list)
+
+    status = models.CharField(
+        max_length=16, choices=Status.choices, default=Status.PENDING
+    )
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(default=timezone.now)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.subject} to {', '.join(self.recipients)} ({self.status})"
+
+
+class Job(models.Model):
+    """
+    A call to a function registered with the @job decorator, run by the runworkers
+    command outside the request cycle. Jobs with a higher priority run first, and
+    failed jobs are retried with a growing delay until they run out of attempts.
+    """
+
+    class Meta:
+        verbose_name = "Job"
+        verbose_name_plural = "Jobs"
+        indexes = [models.Index(fields=["status", "run_at", "priority", "id"])]
+
+    class Status(models.TextChoices):
+        PENDING = "PENDING", "Pending"
+        RUNNING = "RUNNING", "Running"
+        SUCCEEDED = "SUCCEEDED", "Succeeded"
+        FAILED = "FAILED", "Failed"
+
+    name = models.CharField(max_length=255)
+    args = models.JSONField(default=list)
+    kwargs = models.JSONField(default=dict)
+    priority = models.IntegerField(default=0)
+
+    status = models.CharField(
+        max_length=16, choices=Status.choices, default=Status.PENDING
+    )
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=1)
+    # The return value of the job, if it could be stored as JSON
+    result = models.JSONField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default="")
+    worker = models.CharField(max_length=255, blank=True, default="")
+
+    created_at = models.DateTimeField(default=timezone.now)
+    run_at = models.DateTimeField(default=timezone.now)
+    # A running job not finished by then is assumed lost with its worker, and run again
+    locked_until = models.DateTimeField(null=True, blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.status})"
+
+
+class PeriodicJob(models.Model):
+    """
+    Queues a job every `interval`, like a cron entry. The runworkers command checks
+    for due periodic jobs between the jobs it runs.
+    """
+
+    class Meta:
+        verbose_name = "Periodic job"
+        verbose_name_plural = "Periodic jobs"
+
+    name = models.CharField(max_length=255)
+    args = models.JSONField(default=list, blank=True)
+    kwargs = models.JSONField(default=dict, blank=True)
+    priority = models.IntegerField(default=0)
+    interval = models.DurationField()
+    enabled = models.BooleanField(default=True)
+
+    next_run_at = models.DateTimeField(default=timezone.now)
+    last_run_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.name} every {self.interval}"
@@ -0,0 +1,200 @@
+import base64
+from typing import List, NamedTuple, Optional
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.db.models import Avg, Count, F, Min, Q
+from django.utils import timezone
+
+from common.models import OutboxEmail
+
+
+class OutboxResult(NamedTuple):
+    sent: int
+    failed: int
+    dead: int
+
+
+class OutboxMetrics(NamedTuple):
+    # Emails waiting to be sent, including the ones waiting for a retry
+    pending: int
+    dead: int
+    # Seconds the oldest pending email has been waiting, or None if none are pending
+    oldest_pending_age: Optional[float]
+    # Average seconds from queueing to sending of the emails sent in the last hour
+    average_latency: Optional[float]
+
+
+def _encode_attachments(attachments) -> List[dict]:
+    return [
+        {
+            "name": attachment.name,
+            "content": base64.b64encode(attachment.read()).decode(),
+            "mimetype": "application/pdf",
+        }
+        for attachment in attachments or []
+    ]
+
+
+def enqueue_email(
+    subject="KSG-nett",
+    message="",
+    html_message="",
+    sender="ksg-nett-no-reply@samfundet.no",
+    reply_to=[],
+    recipients=[],
+    attachments=None,
+    cc=[],
+    bcc=[],
+) -> OutboxEmail:
+    """
+    Queues an email in the outbox. Takes the same arguments as send_email.
+    """
+    return OutboxEmail.objects.create(
+        subject=subject,
+        message=message,
+        html_message=html_message,
+        sender=sender,
+        reply_to=list(reply_to),
+        recipients=list(recipients),
+        cc=list(cc),
+        bcc=list(bcc),
+        attachments=_encode_attachments(attachments),
+    )
+
+
+def _build_message(outbox_email: OutboxEmail, connection) -> EmailMultiAlternatives:
+    from common.util import build_email
+
+    email = build_email(
+        subject=outbox_email.subject,
+        message=outbox_email.message,
+        html_message=outbox_email.html_message,
+        sender=outbox_email.sender,
+        reply_to=outbox_email.reply_to,
+        recipients=outbox_email.recipients,
+        cc=outbox_email.cc,
+        bcc=outbox_email.bcc,
+        connection=connection,
+    )
+    for attachment in outbox_email.attachments:
+        email.attach(
+            attachment["name"],
+            base64.b64decode(attachment["content"]),
+            attachment["mimetype"],
+        )
+    return email
+
+
+def get_retry_delay(attempts: int):
+    delay = settings.EMAIL_OUTBOX_RETRY_DELAY * 2 ** (attempts - 1)
+    return min(delay, settings.EMAIL_OUTBOX_MAX_RETRY_DELAY)
+
+
+def claim_outbox_batch(batch_size: int) -> List[OutboxEmail]:
+    """
+    Takes the next due emails for sending by pushing their next attempt a lease into
+    the future, so other workers skip them until this worker has had time to send
+    them. Emails are claimed in the order they were queued.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        emails = list(
+            OutboxEmail.objects.select_for_update(skip_locked=True)
+            .filter(status=OutboxEmail.Status.PENDING, next_attempt_at__lte=now)
+            .order_by("id")[:batch_size]
+        )
+        OutboxEmail.objects.filter(pk__in=[email.pk for email in emails]).update(
+            next_attempt_at=now + settings.EMAIL_OUTBOX_LEASE
+        )
+    return emails
+
+
+def _record_failure(outbox_email: OutboxEmail, error: Exception):
+    outbox_email.attempts += 1
+    outbox_email.last_error = f"{type(error).__name__}: {error}"
+    if outbox_email.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+        outbox_email.status = OutboxEmail.Status.DEAD
+    else:
+        outbox_email.next_attempt_at = timezone.now() + get_retry_delay(
+            outbox_email.attempts
+        )
+
+
+def send_outbox_batch(batch_size: Optional[int] = None) -> OutboxResult:
+    """
+    Sends the next batch of due emails over one connection to the mail server. Failed
+    emails are retried with a delay that doubles for every attempt, and marked as dead
+    once they run out of attempts.
+    """
+    emails = claim_outbox_batch(batch_size or settings.EMAIL_OUTBOX_BATCH_SIZE)
+    if not emails:
+        return OutboxResult(0, 0, 0)
+
+    sent = []
+    failed = []
+    try:
+        with get_connection(fail_silently=False) as connection:
+            for outbox_email in emails:
+                try:
+                    _build_message(outbox_email, connection).send(fail_silently=False)
+                except Exception as e:
+                    _record_failure(outbox_email, e)
+                    failed.append(outbox_email)
+                else:
+                    sent.append(outbox_email)
+    except Exception as e:
+        # The connection could not be opened, or broke while sending. The emails not
+        # sent yet are retried like any other failure
+        done = {outbox_email.pk for outbox_email in sent + failed}
+        for outbox_email in emails:
+            if outbox_email.pk not in done:
+                _record_failure(outbox_email, e)
+                failed.append(outbox_email)
+
+    now = timezone.now()
+    OutboxEmail.objects.filter(
+        pk__in=[outbox_email.pk for outbox_email in sent]
+    ).update(
+        status=OutboxEmail.Status.SENT,
+        sent_at=now,
+        attempts=F("attempts") + 1,
+        last_error="",
+    )
+    OutboxEmail.objects.bulk_update(
+        failed, ["attempts", "last_error", "status", "next_attempt_at"]
+    )
+
+    dead = sum(
+        1 for outbox_email in failed if outbox_email.status == OutboxEmail.Status.DEAD
+    )
+    return OutboxResult(len(sent), len(failed), dead)
+
+
+def get_outbox_metrics() -> OutboxMetrics:
+    now = timezone.now()
+    totals = OutboxEmail.objects.aggregate(
+        pending=Count("id", filter=Q(status=OutboxEmail.Status.PENDING)),
+        dead=Count("id", filter=Q(status=OutboxEmail.Status.DEAD)),
+        oldest_pending=Min("created_at", filter=Q(status=OutboxEmail.Status.PENDING)),
+        average_latency=Avg(
+            F("sent_at") - F("created_at"),
+            filter=Q(
+                status=OutboxEmail.Status.SENT,
+                sent_at__gte=now - timezone.timedelta(hours=1),
+            ),
+        ),
+    )
+    oldest_pending = totals["oldest_pending"]
+    average_latency = totals["average_latency"]
+    return OutboxMetrics(
+        pending=totals["pending"],
+        dead=totals["dead"],
+        oldest_pending_age=(
+            (now - oldest_pending).total_seconds() if oldest_pending else None
+        ),
+        average_latency=(
+            average_latency.total_seconds() if average_latency is not None else None
+        ),
+    )
@@ -0,0 +1,149 @@
+import hashlib
+import threading
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.template.loader import render_to_string
+from weasyprint import CSS, HTML
+from weasyprint.text.fonts import FontConfiguration
+
+PDF_KEY_PREFIX = "pdf:"
+
+# Parsed once per process. In the render pool every worker process has its own copy
+_font_config: Optional[FontConfiguration] = None
+_stylesheets = {}
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_font_config() -> FontConfiguration:
+    global _font_config
+    if _font_config is None:
+        _font_config = FontConfiguration()
+    return _font_config
+
+
+def _get_stylesheet(css: str) -> CSS:
+    stylesheet = _stylesheets.get(css)
+    if stylesheet is None:
+        stylesheet = CSS(string=css, font_config=_get_font_config())
+        _stylesheets[css] = stylesheet
+    return stylesheet
+
+
+def _write_pdf(html_content: str, stylesheets: Sequence[str], base_url: str) -> bytes:
+    return HTML(string=html_content, base_url=base_url).write_pdf(
+        stylesheets=[_get_stylesheet(css) for css in stylesheets],
+        font_config=_get_font_config(),
+    )
+
+
+def _get_executor() -> Optional[ProcessPoolExecutor]:
+    global _executor
+    if settings.PDF_RENDER_WORKERS <= 0:
+        return None
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.PDF_RENDER_WORKERS,
+                initializer=_get_font_config,
+            )
+        return _executor
+
+
+def _reset_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+        _executor = None
+
+
+def _render_as_completed(jobs: Dict[str, tuple]) -> Iterator[Tuple[str, bytes]]:
+    """
+    Renders jobs keyed by their cache key, yielding each PDF as soon as it is done
+    """
+    remaining = dict(jobs)
+    executor = _get_executor()
+    if executor is not None:
+        futures = {executor.submit(_write_pdf, *job): key for key, job in jobs.items()}
+        try:
+            for future in as_completed(futures):
+                key = futures[future]
+                pdf = future.result()
+                del remaining[key]
+                yield key, pdf
+        except BrokenProcessPool:
+            # A worker died, most likely killed for using too much memory. The pool
+            # is replaced on the next render, and the rest is done in process
+            _reset_executor()
+
+    for key, job in remaining.items():
+        yield key, _write_pdf(*job)
+
+
+def _cache_key(html_content: str, stylesheets: Sequence[str], base_url: str) -> str:
+    content = "\0".join([base_url, html_content, *stylesheets])
+    return PDF_KEY_PREFIX + hashlib.sha256(content.encode()).hexdigest()
+
+
+def iter_html_to_pdfs(
+    html_contents: Iterable[str], stylesheets: Sequence[str] = ()
+) -> Iterator[Tuple[int, bytes]]:
+    """
+    Renders HTML documents to PDFs in the render pool, yielding (index, pdf) for each
+    document as soon as it is ready. Documents are rendered in parallel, so a batch
+    takes about as long as its slowest document. Rendered PDFs are cached by a hash of
+    their content, so rendering an unchanged document again only costs the cache
+    lookup, and cached documents are yielded first.
+    """
+    base_url = settings.BASE_URL
+    stylesheets = tuple(stylesheets)
+    indexes = defaultdict(list)
+    jobs = {}
+    for index, html_content in enumerate(html_contents):
+        key = _cache_key(html_content, stylesheets, base_url)
+        indexes[key].append(index)
+        jobs[key] = (html_content, stylesheets, base_url)
+
+    cache = caches[settings.PDF_CACHE_ALIAS]
+    cached = cache.get_many(list(jobs))
+    for key, pdf in cached.items():
+        for index in indexes[key]:
+            yield index, pdf
+
+    missing = {key: job for key, job in jobs.items() if key not in cached}
+    for key, pdf in _render_as_completed(missing):
+        cache.set(key, pdf)
+        for index in indexes[key]:
+            yield index, pdf
+
+
+def html_to_pdfs(
+    html_contents: Sequence[str], stylesheets: Sequence[str] = ()
+) -> List[bytes]:
+    pdfs = [None] * len(html_contents)
+    for index, pdf in iter_html_to_pdfs(html_contents, stylesheets):
+        pdfs[index] = pdf
+    return pdfs
+
+
+def html_to_pdf(html_content: str, stylesheets: Sequence[str] = ()) -> bytes:
+    return html_to_pdfs([html_content], stylesheets)[0]
+
+
+def render_pdf(
+    template_name: str, context: dict, stylesheets: Sequence[str] = ()
+) -> bytes:
+    """
+    Renders a template to a PDF. The template is rendered in this process, while the
+    layout of the PDF is done in the render pool.
+    """
+    html_content = render_to_string(template_name=template_name, context=context)
+    return html_to_pdf(html_content, stylesheets)
@@ -0,0 +1,11 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from common.feature_flags import expire_feature_flags
+from common.models import FeatureFlag
+
+
+@receiver(post_save, sender=FeatureFlag)
+@receiver(post_delete, sender=FeatureFlag)
+def expire_feature_flags_on_change(sender, instance, **kwargs):
+    expire_feature_flags()
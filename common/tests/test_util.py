@@ -1,5 +1,22 @@
-from django.test import TestCase
-from common.util import compress_image
+from io import StringIO
+from unittest.mock import patch
+
+from django.core import mail
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.db import DatabaseError, OperationalError, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from common import pdf
+from common.feature_flags import clear_feature_flags
+from common.jobs import claim_job, job, queue_periodic_jobs, run_job, run_worker
+from common.models import FeatureFlag, Job, OutboxEmail, PeriodicJob
+from common.outbox import get_outbox_metrics, send_outbox_batch
+from common.pdf import html_to_pdf, html_to_pdfs, render_pdf
+from common.util import check_feature_flag, compress_image, send_email
+from economy.tests.factories import DepositFactory
+from economy.utils import send_deposit_approved_emails
 from PIL import Image
 from django.core.files.base import File
 import random
@@ -36,3 +53,312 @@ def random_datetime(interval_start, interval_end):
     int_delta = (delta.days * 24 * 60 * 60) + delta.seconds
     random_second = random.randrange(int_delta)
     return interval_start + timezone.timedelta(seconds=random_second)
+
+
+@override_settings(PDF_RENDER_WORKERS=0, PDF_CACHE_ALIAS="default")
+class TestPdfRendering(TestCase):
+    def setUp(self):
+        caches["default"].clear()
+
+    def test__render_pdf__unchanged_content_served_from_cache(self):
+        with patch("common.pdf.HTML", wraps=pdf.HTML) as html:
+            first = render_pdf("common/pdf_render_test.html", {"variable": "a"})
+            second = render_pdf("common/pdf_render_test.html", {"variable": "a"})
+            render_pdf("common/pdf_render_test.html", {"variable": "b"})
+
+        self.assertTrue(first.startswith(b"%PDF"))
+        self.assertEqual(first, second)
+        self.assertEqual(2, html.call_count)
+
+    def test__html_to_pdfs__results_in_input_order(self):
+        pdfs = html_to_pdfs(["<p>a</p>", "<p>b</p>", "<p>a</p>"])
+
+        self.assertEqual(3, len(pdfs))
+        self.assertEqual(pdfs[0], pdfs[2])
+        self.assertNotEqual(pdfs[0], pdfs[1])
+
+    def test__stylesheets__parsed_once_per_process(self):
+        css = "body { color: darkslategray; }"
+        with patch("common.pdf.CSS", wraps=pdf.CSS) as parse_css:
+            html_to_pdfs(["<p>a</p>", "<p>b</p>"], stylesheets=[css])
+            html_to_pdf("<p>c</p>", stylesheets=[css])
+
+        self.assertEqual(1, parse_css.call_count)
+
+    @override_settings(PDF_RENDER_WORKERS=1)
+    def test__render_pool__renders_in_worker_process(self):
+        try:
+            pdfs = html_to_pdfs(["<p>a</p>", "<p>b</p>"])
+        finally:
+            pdf._reset_executor()
+
+        self.assertEqual(2, len(pdfs))
+        self.assertTrue(all(content.startswith(b"%PDF") for content in pdfs))
+
+    def test__benchmark_command__reports_cold_and_warm_renders(self):
+        out = StringIO()
+        call_command("benchmarkpdf", "--runs", "2", stdout=out)
+
+        self.assertIn("Uncached", out.getvalue())
+        self.assertIn("Cached", out.getvalue())
+
+
+@override_settings(EMAIL_OUTBOX_ENABLED=True)
+class TestEmailOutbox(TestCase):
+    def send(self, **kwargs):
+        return send_email(
+            subject="Vakt",
+            message="Du har fått en vakt",
+            recipients=["a@ksg.no"],
+            **kwargs
+        )
+
+    def test__send_email__queued_until_worker_sends_it(self):
+        attachment = ContentFile(b"%PDF-1.7", name="faktura.pdf")
+        self.send(attachments=[attachment])
+        self.send()
+
+        self.assertEqual(0, len(mail.outbox))
+        self.assertEqual(2, get_outbox_metrics().pending)
+
+        call_command("sendoutbox", "--once", stdout=StringIO())
+
+        self.assertEqual(2, len(mail.outbox))
+        self.assertEqual(
+            [("faktura.pdf", b"%PDF-1.7", "application/pdf")],
+            mail.outbox[0].attachments,
+        )
+        metrics = get_outbox_metrics()
+        self.assertEqual(0, metrics.pending)
+        self.assertIsNotNone(metrics.average_latency)
+
+    def test__send_email_on_commit__queued_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.send(on_commit=True)
+            self.assertFalse(OutboxEmail.objects.exists())
+
+        self.assertEqual(1, OutboxEmail.objects.count())
+
+    def test__failed_email__retried_later_then_dead(self):
+        self.send()
+
+        with override_settings(EMAIL_OUTBOX_MAX_ATTEMPTS=2):
+            with patch.object(
+                EmailBackend, "send_messages", side_effect=ConnectionError("Refused")
+            ):
+                result = send_outbox_batch()
+                outbox_email = OutboxEmail.objects.get()
+                self.assertEqual((0, 1, 0), tuple(result))
+                self.assertEqual(OutboxEmail.Status.PENDING, outbox_email.status)
+                self.assertGreater(outbox_email.next_attempt_at, timezone.now())
+                # Not due before the retry delay has passed
+                self.assertEqual((0, 0, 0), tuple(send_outbox_batch()))
+
+                OutboxEmail.objects.update(next_attempt_at=timezone.now())
+                result = send_outbox_batch()
+
+        outbox_email.refresh_from_db()
+        self.assertEqual((0, 1, 1), tuple(result))
+        self.assertEqual(OutboxEmail.Status.DEAD, outbox_email.status)
+        self.assertEqual(2, outbox_email.attempts)
+        self.assertIn("Refused", outbox_email.last_error)
+        self.assertEqual(0, len(mail.outbox))
+
+    def test__send_deposit_approved_emails__queued_instead_of_sent(self):
+        deposits = DepositFactory.create_batch(3, approved=True)
+
+        send_deposit_approved_emails(deposits)
+
+        self.assertEqual(0, len(mail.outbox))
+        self.assertEqual(3, OutboxEmail.objects.count())
+
+
+@job(name="common.tests.add")
+def add(a, b):
+    return a + b
+
+
+@job(name="common.tests.fail", max_attempts=2)
+def fail():
+    raise ValueError("Nope")
+
+
+class TestJobQueue(TestCase):
+    def test__delay__queues_job_run_by_worker_with_result(self):
+        queued = add.delay(2, 3)
+        self.assertEqual(queued.status, Job.Status.PENDING)
+
+        self.assertEqual(run_worker(once=True), 1)
+
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, Job.Status.SUCCEEDED)
+        self.assertEqual(queued.result, 5)
+        self.assertEqual(queued.attempts, 1)
+        self.assertIsNotNone(queued.finished_at)
+
+    def test__claim_job__takes_highest_priority_and_never_the_same_job_twice(self):
+        low = Job.objects.create(name=add.job_name, args=[1, 1])
+        high = Job.objects.create(name=add.job_name, args=[1, 1], priority=10)
+        Job.objects.create(
+            name=add.job_name,
+            args=[1, 1],
+            priority=20,
+            run_at=timezone.now() + timezone.timedelta(hours=1),
+        )
+
+        self.assertEqual(claim_job("worker-1"), high)
+        self.assertEqual(claim_job("worker-2"), low)
+        self.assertIsNone(claim_job("worker-3"))
+
+    def test__claim_job__reclaims_job_of_lost_worker(self):
+        lost = Job.objects.create(
+            name=add.job_name,
+            args=[1, 1],
+            status=Job.Status.RUNNING,
+            attempts=1,
+            max_attempts=3,
+            locked_until=timezone.now() - timezone.timedelta(seconds=1),
+        )
+
+        claimed = claim_job("worker-2")
+
+        self.assertEqual(claimed, lost)
+        self.assertEqual(claimed.attempts, 2)
+
+    def test__run_job__retries_failed_job_until_out_of_attempts(self):
+        queued = fail.delay()
+
+        run_job(claim_job("worker"))
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, Job.Status.PENDING)
+        self.assertEqual(queued.last_error, "ValueError: Nope")
+        self.assertGreater(queued.run_at, timezone.now())
+
+        Job.objects.filter(pk=queued.pk).update(run_at=timezone.now())
+        run_job(claim_job("worker"))
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, Job.Status.FAILED)
+        self.assertEqual(queued.attempts, 2)
+
+    def test__queue_periodic_jobs__queues_due_jobs_once_per_run(self):
+        interval = timezone.timedelta(minutes=10)
+        periodic_job = PeriodicJob.objects.create(
+            name=add.job_name,
+            args=[1, 2],
+            interval=interval,
+            next_run_at=timezone.now() - timezone.timedelta(minutes=25),
+        )
+
+        self.assertEqual(queue_periodic_jobs(), 1)
+        self.assertEqual(queue_periodic_jobs(), 0)
+
+        periodic_job.refresh_from_db()
+        self.assertGreater(periodic_job.next_run_at, timezone.now())
+        self.assertLessEqual(periodic_job.next_run_at, timezone.now() + interval)
+        self.assertEqual(Job.objects.get().args, [1, 2])
+
+    def test__runworkers__runs_due_jobs_and_exits_with_once(self):
+        queued = [add.delay(index, index) for index in range(5)]
+
+        call_command("runworkers", "--workers=1", "--once", stdout=StringIO())
+
+        self.assertEqual(
+            sorted(Job.objects.values_list("result", flat=True)),
+            [index * 2 for index in range(len(queued))],
+        )
+
+
+class TestJobWorker(TransactionTestCase):
+    def test__run_worker__survives_database_errors_with_backoff(self):
+        queued = add.delay(2, 3)
+        claims = [OperationalError("server closed the connection"), None]
+
+        def claim_job_or_fail(worker):
+            if claims:
+                error = claims.pop(0)
+                if error:
+                    raise error
+                return claim_job(worker)
+            raise KeyboardInterrupt
+
+        with patch("common.jobs.claim_job", side_effect=claim_job_or_fail):
+            with patch("common.jobs.time.sleep") as sleep:
+                with patch("common.jobs.close_old_connections") as close_connections:
+                    with self.assertRaises(KeyboardInterrupt):
+                        run_worker(interval=2)
+
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, Job.Status.SUCCEEDED)
+        sleep.assert_called_once_with(2)
+        self.assertEqual(3, close_connections.call_count)
+
+    def test__run_worker_once__raises_database_errors(self):
+        with patch(
+            "common.jobs.claim_job", side_effect=OperationalError("database is down")
+        ):
+            with self.assertRaises(OperationalError):
+                run_worker(once=True)
+
+
+class TestFeatureFlagCache(TestCase):
+    def setUp(self):
+        clear_feature_flags()
+        self.flag = FeatureFlag.objects.create(name="some-flag", enabled=False)
+
+    def test__check_feature_flag__reads_cached_flags_without_queries(self):
+        self.assertFalse(check_feature_flag("some-flag", fail_silently=True))
+
+        with self.assertNumQueries(0):
+            for _ in range(100):
+                check_feature_flag("some-flag", fail_silently=True)
+
+    def test__check_feature_flag__creates_unknown_flag_once(self):
+        self.assertFalse(check_feature_flag("new-flag", fail_silently=True))
+        self.assertTrue(FeatureFlag.objects.filter(name="new-flag").exists())
+
+        with self.assertNumQueries(0):
+            self.assertFalse(check_feature_flag("new-flag", fail_silently=True))
+
+    def test__saving_flag__updates_cache_in_this_process(self):
+        self.assertFalse(check_feature_flag("some-flag", fail_silently=True))
+
+        self.flag.enabled = True
+        self.flag.save()
+
+        self.assertTrue(check_feature_flag("some-flag", fail_silently=True))
+
+    def test__flag_changed_by_other_process__seen_after_refresh_interval(self):
+        self.assertFalse(check_feature_flag("some-flag", fail_silently=True))
+
+        # A queryset update sends no signals, like a toggle in another worker
+        FeatureFlag.objects.filter(pk=self.flag.pk).update(
+            enabled=True, updated_at=timezone.now()
+        )
+        self.assertFalse(check_feature_flag("some-flag", fail_silently=True))
+
+        with override_settings(FEATURE_FLAG_REFRESH_INTERVAL=0):
+            self.assertTrue(check_feature_flag("some-flag", fail_silently=True))
+
+    def test__rolled_back_save__not_kept_in_cache(self):
+        self.assertFalse(check_feature_flag("some-flag", fail_silently=True))
+
+        with self.assertRaises(DatabaseError):
+            with transaction.atomic():
+                self.flag.enabled = True
+                self.flag.save()
+                raise DatabaseError("Rolled back")
+
+        self.assertFalse(check_feature_flag("some-flag", fail_silently=True))
+
+    def test__flag_read_before_rollback__reloaded_after_it(self):
+        self.assertFalse(check_feature_flag("some-flag", fail_silently=True))
+
+        with self.assertRaises(DatabaseError):
+            with transaction.atomic():
+                self.flag.enabled = True
+                self.flag.save()
+                self.assertTrue(check_feature_flag("some-flag", fail_silently=True))
+                raise DatabaseError("Rolled back")
+
+        with override_settings(FEATURE_FLAG_REFRESH_INTERVAL=0):
+            self.assertFalse(check_feature_flag("some-flag", fail_silently=True))
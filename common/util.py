@@ -12,10 +12,11 @@ from django.core.mail import EmailMultiAlternatives
 from django.conf import settings
 from django.core.files.uploadedfile import InMemoryUploadedFile
 from django.utils import timezone
+from django.db import transaction
 from django.db.models import QuerySet
 from common.exceptions import IllegalOperation
 
-from common.models import FeatureFlag
+from common.feature_flags import is_feature_flag_enabled
 
 
 def get_semester_year_shorthand(timestamp: Union[datetime, date]) -> str:
@@ -243,7 +244,7 @@ def compress_image(image, image_name, file_type):
     return compressed_file
 
 
-def send_email(
+def build_email(
     subject="KSG-nett",
     message="",
     html_message="",
@@ -253,16 +254,20 @@ def send_email(
     attachments=None,
     cc=[],
     bcc=[],
-    fail_silently=True,
-) -> bool:
-    if len(recipients) + len(bcc) + len(cc) == 0:
-        return False
-
+    connection=None,
+) -> EmailMultiAlternatives:
     if not message and html_message:
         message = strip_tags(html_message)
 
     email = EmailMultiAlternatives(
-        subject, message, sender, recipients, cc=cc, bcc=bcc, reply_to=reply_to
+        subject,
+        message,
+        sender,
+        recipients,
+        cc=cc,
+        bcc=bcc,
+        reply_to=reply_to,
+        connection=connection,
     )
 
     if html_message:
@@ -272,6 +277,77 @@ def send_email(
         for attachment in attachments:
             email.attach(attachment.name, attachment.read(), "application/pdf")
 
+    return email
+
+
+def send_email(
+    subject="KSG-nett",
+    message="",
+    html_message="",
+    sender="ksg-nett-no-reply@samfundet.no",
+    reply_to=[],
+    recipients=[],
+    attachments=None,
+    cc=[],
+    bcc=[],
+    fail_silently=True,
+    connection=None,
+    on_commit=False,
+) -> bool:
+    """
+    Sends an email, or queues it in the outbox when EMAIL_OUTBOX_ENABLED is set. With
+    `on_commit` the email is only sent or queued once the current transaction has
+    been committed. Emails given a connection are always sent right away over it.
+    """
+    if len(recipients) + len(bcc) + len(cc) == 0:
+        return False
+
+    if on_commit:
+        transaction.on_commit(
+            lambda: send_email(
+                subject=subject,
+                message=message,
+                html_message=html_message,
+                sender=sender,
+                reply_to=reply_to,
+                recipients=recipients,
+                attachments=attachments,
+                cc=cc,
+                bcc=bcc,
+                fail_silently=fail_silently,
+                connection=connection,
+            )
+        )
+        return True
+
+    if connection is None and settings.EMAIL_OUTBOX_ENABLED:
+        from common.outbox import enqueue_email
+
+        enqueue_email(
+            subject=subject,
+            message=message,
+            html_message=html_message,
+            sender=sender,
+            reply_to=reply_to,
+            recipients=recipients,
+            attachments=attachments,
+            cc=cc,
+            bcc=bcc,
+        )
+        return True
+
+    email = build_email(
+        subject=subject,
+        message=message,
+        html_message=html_message,
+        sender=sender,
+        reply_to=reply_to,
+        recipients=recipients,
+        attachments=attachments,
+        cc=cc,
+        bcc=bcc,
+        connection=connection,
+    )
     return email.send(fail_silently=fail_silently)
 
 
@@ -355,10 +431,10 @@ def midnight_timestamps_from_date(date):
 
 
 def check_feature_flag(feature_flag_key, fail_silently=False):
-    flag, _ = FeatureFlag.objects.get_or_create(name=feature_flag_key)
+    enabled = is_feature_flag_enabled(feature_flag_key)
 
     if fail_silently:
-        return flag.enabled
+        return enabled
 
-    if not flag.enabled:
+    if not enabled:
         raise IllegalOperation(f"Feature flag {feature_flag_key} is not enabled")
@@ -1,5 +1,6 @@
 from django.contrib import admin
 
+from economy.deposits import approve_deposits
 from economy.models import (
     Deposit,
     SociBankAccount,
@@ -12,6 +13,9 @@ from economy.models import (
     ExternalCharge,
     ProductGhostOrder,
     SociRankedSeason,
+    StripeWebhookEvent,
+    DebtCollectionRun,
+    DebtCollectionNotice,
 )
 
 
@@ -39,6 +43,7 @@ class TransferAdmin(admin.ModelAdmin):
 @admin.register(Deposit)
 class DepositAdmin(admin.ModelAdmin):
     list_display = ["id", "user", "amount", "has_receipt", "approved"]
+    actions = ["approve_selected_deposits"]
 
     @staticmethod
     def user(deposit: Deposit):
@@ -54,6 +59,16 @@ class DepositAdmin(admin.ModelAdmin):
 
     approved.boolean = True
 
+    @admin.action(description="Approve selected deposits", permissions=["approve"])
+    def approve_selected_deposits(self, request, queryset):
+        deposits = approve_deposits(
+            list(queryset.values_list("pk", flat=True)), approved_by=request.user
+        )
+        self.message_user(request, f"Approved {len(deposits)} deposits")
+
+    def has_approve_permission(self, request):
+        return request.user.has_perm("economy.approve_deposit")
+
 
 @admin.register(SociSession)
 class SociSessionAdmin(admin.ModelAdmin):
@@ -103,3 +118,24 @@ class SociRankedSeasonAdmin(admin.ModelAdmin):
     @staticmethod
     def participants(soci_ranked_season: SociRankedSeason):
         return soci_ranked_season.participants.all().count()
+
+
+@admin.register(StripeWebhookEvent)
+class StripeWebhookEventAdmin(admin.ModelAdmin):
+    list_display = ["stripe_event_id", "type", "status", "attempts", "received_at"]
+    list_filter = ["status", "type"]
+    search_fields = ["stripe_event_id", "payment_intent_id"]
+    readonly_fields = ["payload"]
+
+
+class DebtCollectionNoticeInline(admin.TabularInline):
+    model = DebtCollectionNotice
+    extra = 0
+    fields = ["user", "balance", "sent_at", "attempts", "last_error"]
+    readonly_fields = fields
+
+
+@admin.register(DebtCollectionRun)
+class DebtCollectionRunAdmin(admin.ModelAdmin):
+    list_display = ["started_at", "finished_at", "all_users"]
+    inlines = [DebtCollectionNoticeInline]
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class EconomyConfig(AppConfig):
     name = 'economy'
+
+    def ready(self):
+        # noinspection PyUnresolvedReferences
+        import economy.signals
@@ -0,0 +1,256 @@
+import csv
+import datetime
+import difflib
+import itertools
+import re
+import unicodedata
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+
+from django.conf import settings
+
+from economy.models import Deposit
+
+
+class BankStatementLine(NamedTuple):
+    line_number: int
+    date: Optional[datetime.date]
+    text: str
+    amount: Optional[int]
+
+
+class BankStatementMatch(NamedTuple):
+    line: BankStatementLine
+    deposit: Deposit
+    match_type: str
+
+
+class BankStatementMatchType:
+    # The line text is the name of the account holder
+    EXACT = "exact"
+    # Every part of the name of the account holder is in the line text
+    PARTIAL = "partial"
+    # Every part of the name of the account holder is close to a word in the line text
+    FUZZY = "fuzzy"
+
+
+_TRANSLITERATIONS = str.maketrans({"æ": "ae", "ø": "o", "å": "a", "ß": "ss"})
+
+
+def normalize_name(name: str) -> Tuple[str, ...]:
+    """
+    Splits a name into lowercase words without accents or punctuation, sorted so that
+    "Nordmann, Ola" and "Ola Nordmann" are normalized the same.
+    """
+    name = name.casefold().translate(_TRANSLITERATIONS)
+    name = "".join(
+        char
+        for char in unicodedata.normalize("NFKD", name)
+        if not unicodedata.combining(char)
+    )
+    return tuple(sorted(re.findall(r"[a-z0-9]+", name)))
+
+
+def _parse_amount(value: str) -> Optional[int]:
+    value = re.sub(r"\s", "", value)
+    if "," in value and "." in value:
+        # Whichever comes last separates the decimals, the other one thousands
+        thousands = "." if value.rfind(",") > value.rfind(".") else ","
+        value = value.replace(thousands, "").replace(",", ".")
+    elif "," in value:
+        value = value.replace(",", ".")
+    elif re.fullmatch(r"-?\d{1,3}(\.\d{3})+", value):
+        # Amounts have at most two decimals, so "1.500" is one thousand five hundred
+        value = value.replace(".", "")
+    try:
+        amount = Decimal(value)
+    except InvalidOperation:
+        return None
+
+    # Deposits are made in whole kroner, so other amounts cannot match one
+    if amount <= 0 or amount != amount.to_integral_value():
+        return None
+    return int(amount)
+
+
+def _parse_date(value: str) -> Optional[datetime.date]:
+    for date_format in settings.BANK_STATEMENT_DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(value.strip(), date_format).date()
+        except ValueError:
+            continue
+    return None
+
+
+def _decode_lines(file) -> Iterator[str]:
+    """
+    Decodes the lines of a file as UTF-8, switching to Windows-1252 from the first line
+    that is not UTF-8, since that is what many Norwegian banks export in.
+    """
+    encoding = "utf-8-sig"
+    for line_number, line in enumerate(file, start=1):
+        try:
+            yield line.decode(encoding)
+            continue
+        except UnicodeDecodeError:
+            encoding = "cp1252"
+        try:
+            yield line.decode(encoding)
+        except UnicodeDecodeError:
+            raise ValueError(
+                f"Bank statement line {line_number} is neither UTF-8 nor Windows-1252"
+            )
+
+
+def read_bank_statement(file) -> Iterator[BankStatementLine]:
+    """
+    Reads a bank statement CSV export line by line. The columns are looked up by the
+    headers in BANK_STATEMENT_CSV_COLUMNS, and the delimiter is detected from the
+    header. Lines with an outgoing or empty amount are given an amount of None.
+    """
+    lines = _decode_lines(file)
+    header = next(lines, "")
+    delimiter = max(";,\t", key=header.count)
+    reader = csv.DictReader(itertools.chain([header], lines), delimiter=delimiter)
+
+    columns = settings.BANK_STATEMENT_CSV_COLUMNS
+    missing = set(columns.values()) - set(reader.fieldnames or [])
+    if missing:
+        raise ValueError(f"Bank statement is missing columns {', '.join(missing)}")
+
+    for row in reader:
+        yield BankStatementLine(
+            line_number=reader.line_num,
+            date=_parse_date(row[columns["date"]] or ""),
+            text=(row[columns["text"]] or "").strip(),
+            amount=_parse_amount(row[columns["amount"]] or ""),
+        )
+
+
+class PendingDepositIndex:
+    """
+    Pending bank transfer deposits indexed by amount and the normalized name of the
+    account holder. Built with a single query, after which matching a line is a
+    dictionary lookup among the few deposits of the same amount.
+    """
+
+    def __init__(self, deposits):
+        self.by_amount = defaultdict(lambda: defaultdict(list))
+        for deposit in deposits:
+            name = normalize_name(deposit.account.user.get_full_name())
+            self.by_amount[deposit.amount][name].append(deposit)
+
+    @classmethod
+    def from_pending_deposits(cls):
+        return cls(
+            Deposit.objects.filter(
+                approved=False,
+                deposit_method=Deposit.DepositMethod.BANK_TRANSFER,
+                account__isnull=False,
+            )
+            .select_related("account__user")
+            .order_by("created_at")
+        )
+
+    def _take(self, deposits_by_name, name):
+        deposits = deposits_by_name[name]
+        deposit = deposits.pop(0)
+        if not deposits:
+            del deposits_by_name[name]
+        return deposit
+
+    @staticmethod
+    def _similarity(part: str, words) -> float:
+        matcher = difflib.SequenceMatcher(b=part)
+        best = 0.0
+        for word in words:
+            matcher.set_seq1(word)
+            if matcher.real_quick_ratio() > best and matcher.quick_ratio() > best:
+                best = max(best, matcher.ratio())
+        return best
+
+    def _score(self, words, name, match_type: str) -> Optional[float]:
+        """
+        How well a name matches the words of a line, or None if it does not match
+        """
+        if not name:
+            return None
+        if match_type == BankStatementMatchType.EXACT:
+            return 1.0 if words == name else None
+        if match_type == BankStatementMatchType.PARTIAL:
+            # The more of the line the name covers, the better
+            return len(name) / len(words) if set(words).issuperset(name) else None
+
+        score = min(self._similarity(part, words) for part in name)
+        return score if score >= settings.BANK_STATEMENT_NAME_MATCH_CUTOFF else None
+
+    def match(
+        self, lines: List[BankStatementLine], match_type: str
+    ) -> List[BankStatementMatch]:
+        """
+        Matches lines with pending deposits of the same amount by one type of match,
+        and removes the matched deposits. The best scoring pairs across all the lines
+        are matched first, the oldest deposit first for the same name.
+        """
+        candidates = []
+        for line in lines:
+            deposits_by_name = self.by_amount.get(line.amount)
+            if not deposits_by_name:
+                continue
+
+            words = normalize_name(line.text)
+            if match_type == BankStatementMatchType.EXACT:
+                names = [words] if words in deposits_by_name else []
+            else:
+                names = list(deposits_by_name)
+            for name in names:
+                score = self._score(words, name, match_type)
+                if score is not None:
+                    candidates.append((score, line, name))
+        candidates.sort(key=lambda candidate: (-candidate[0], candidate[1].line_number))
+
+        matches = []
+        matched_lines = set()
+        for _, line, name in candidates:
+            deposits_by_name = self.by_amount[line.amount]
+            if line.line_number in matched_lines or name not in deposits_by_name:
+                continue
+            deposit = self._take(deposits_by_name, name)
+            matched_lines.add(line.line_number)
+            matches.append(BankStatementMatch(line, deposit, match_type))
+        return matches
+
+
+def match_bank_statement(
+    file,
+) -> Tuple[List[BankStatementMatch], List[BankStatementLine]]:
+    """
+    Matches the incoming payments of a bank statement CSV export with pending bank
+    transfer deposits. Every deposit is matched at most once. Exact name matches are
+    made across the whole statement before partial matches, and partial matches before
+    fuzzy ones, so a near-miss line can not take a deposit another line names exactly.
+    Returns the matches for review in statement order, and the lines with an incoming
+    payment that matched no deposit.
+    """
+    index = PendingDepositIndex.from_pending_deposits()
+    lines = [line for line in read_bank_statement(file) if line.amount is not None]
+
+    matches = []
+    for match_type in [
+        BankStatementMatchType.EXACT,
+        BankStatementMatchType.PARTIAL,
+        BankStatementMatchType.FUZZY,
+    ]:
+        matched_lines = {match.line.line_number for match in matches}
+        matches.extend(
+            index.match(
+                [line for line in lines if line.line_number not in matched_lines],
+                match_type,
+            )
+        )
+
+    matches.sort(key=lambda match: match.line.line_number)
+    matched_lines = {match.line.line_number for match in matches}
+    unmatched = [line for line in lines if line.line_number not in matched_lines]
+    return matches, unmatched
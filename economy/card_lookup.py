@@ -0,0 +1,92 @@
+import threading
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import caches
+
+from economy.models import SociBankAccount
+
+CARD_KEY_PREFIX = "card-lookup:card:"
+USER_KEY_PREFIX = "card-lookup:user:"
+
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0}
+
+
+def _cache():
+    return caches[settings.CARD_LOOKUP_CACHE_ALIAS]
+
+
+def _record(stat: str):
+    with _stats_lock:
+        _stats[stat] += 1
+
+
+def get_card_lookup_stats() -> dict:
+    """
+    Hit and miss counters for the card lookup cache in this process
+    """
+    with _stats_lock:
+        return dict(_stats)
+
+
+def reset_card_lookup_stats():
+    with _stats_lock:
+        _stats["hits"] = 0
+        _stats["misses"] = 0
+
+
+def get_card_account_snapshot(card_uuid) -> Optional[dict]:
+    """
+    Returns a snapshot of the account and user a card belongs to, or None if the card
+    is unknown. The snapshot never contains the balance, which must always be read fresh.
+
+    Snapshot keys: account_id, user_id, full_name, is_active, is_gold
+    """
+    if card_uuid is None:
+        return None
+
+    card_uuid = str(card_uuid)
+    cache = _cache()
+    snapshot = cache.get(CARD_KEY_PREFIX + card_uuid)
+    if snapshot is not None:
+        _record("hits")
+        return snapshot
+
+    _record("misses")
+    account = (
+        SociBankAccount.objects.filter(card_uuid=card_uuid)
+        .select_related("user")
+        .first()
+    )
+    if account is None:
+        return None
+
+    snapshot = {
+        "account_id": account.id,
+        "user_id": account.user_id,
+        "full_name": account.user.get_full_name(),
+        "is_active": account.user.is_active,
+        "is_gold": account.is_gold,
+    }
+    cache.set_many(
+        {
+            CARD_KEY_PREFIX + card_uuid: snapshot,
+            USER_KEY_PREFIX + str(account.user_id): card_uuid,
+        }
+    )
+    return snapshot
+
+
+def invalidate_card(card_uuid):
+    if card_uuid is None:
+        return
+    _cache().delete(CARD_KEY_PREFIX + str(card_uuid))
+
+
+def invalidate_user_card(user_id):
+    cache = _cache()
+    user_key = USER_KEY_PREFIX + str(user_id)
+    card_uuid = cache.get(user_key)
+    if card_uuid is not None:
+        cache.delete_many([CARD_KEY_PREFIX + card_uuid, user_key])
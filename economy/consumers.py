@@ -0,0 +1,44 @@
+import json
+
+from channels.generic.websocket import AsyncWebsocketConsumer
+
+from economy.price_ticker import STOCK_MARKET_GROUP_NAME
+
+
+class StockMarketConsumer(AsyncWebsocketConsumer):
+    """
+    Pushes stock market price changes and crashes to the X-App stock market screen.
+    """
+
+    async def connect(self):
+        await self.channel_layer.group_add(STOCK_MARKET_GROUP_NAME, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, code):
+        await self.channel_layer.group_discard(
+            STOCK_MARKET_GROUP_NAME, self.channel_name
+        )
+
+    async def stock_price_change(self, event):
+        await self.send(
+            text_data=json.dumps(
+                {
+                    "type": "price-change",
+                    "product_id": event["product_id"],
+                    "name": event["name"],
+                    "price": event["price"],
+                    "previous_price": event["previous_price"],
+                    "timestamp": event["timestamp"],
+                }
+            )
+        )
+
+    async def stock_market_crash(self, event):
+        await self.send(
+            text_data=json.dumps(
+                {
+                    "type": "crash",
+                    "timestamp": event["timestamp"],
+                }
+            )
+        )
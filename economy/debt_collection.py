@@ -0,0 +1,155 @@
+from typing import List, NamedTuple, Optional, Tuple
+
+from django.conf import settings
+from django.core.mail import EmailMessage
+from django.utils import timezone
+
+from common.mail import send_email_messages
+from economy.emails import build_debt_collection_email
+from economy.models import DebtCollectionNotice, DebtCollectionRun
+from economy.utils import get_users_with_balance_less_than
+from login.util import create_jwt_token_for_user
+
+
+class DebtCollectionResult(NamedTuple):
+    sent: int
+    failed: int
+    finished: bool
+
+
+def get_retryable_notices(run: DebtCollectionRun):
+    """
+    The notices of a run that are not sent yet and have attempts left
+    """
+    return run.notices.filter(
+        sent_at__isnull=True, attempts__lt=settings.DEBT_COLLECTION_MAX_ATTEMPTS
+    )
+
+
+def finish_debt_collection_run(run: DebtCollectionRun):
+    run.finished_at = timezone.now()
+    run.save(update_fields=["finished_at"])
+
+
+def finish_stale_debt_collection_runs():
+    """
+    Finishes the unfinished runs started before this month. The debt collection is run
+    monthly, so notices left from an earlier month would go out with old balances while
+    the debtors of this month wait for them.
+    """
+    month_start = timezone.localtime().replace(
+        day=1, hour=0, minute=0, second=0, microsecond=0
+    )
+    DebtCollectionRun.objects.filter(
+        finished_at__isnull=True, started_at__lt=month_start
+    ).update(finished_at=timezone.now())
+
+
+def get_debtors(all_users=False):
+    """
+    Users owing money, with their bank account, so reading their balance does not
+    cost a query per user.
+    """
+    return (
+        get_users_with_balance_less_than(
+            settings.OWES_MONEY_THRESHOLD, all_users=all_users
+        )
+        .select_related("bank_account")
+        .order_by("bank_account__balance", "id")
+    )
+
+
+def start_debt_collection_run(all_users=False) -> Optional[DebtCollectionRun]:
+    """
+    Starts a run with a notice for every current debtor, or returns None if nobody
+    owes money.
+    """
+    debtors = list(get_debtors(all_users))
+    if not debtors:
+        return None
+
+    run = DebtCollectionRun.objects.create(all_users=all_users)
+    DebtCollectionNotice.objects.bulk_create(
+        [
+            DebtCollectionNotice(run=run, user=user, balance=user.balance)
+            for user in debtors
+        ]
+    )
+    return run
+
+
+def get_or_start_debt_collection_run(
+    all_users=False,
+) -> Tuple[Optional[DebtCollectionRun], bool]:
+    """
+    Returns the run to send notices for, and whether it is an interrupted run being
+    resumed. Only a run started this month is resumed. Users that have paid since an
+    interrupted run started are not sent the notice they have left in it, and a run
+    with no notices left to try is finished so a new one is started.
+    """
+    finish_stale_debt_collection_runs()
+    run = DebtCollectionRun.get_unfinished_run()
+    if run is None:
+        return start_debt_collection_run(all_users), False
+
+    run.notices.filter(
+        sent_at__isnull=True,
+        user__bank_account__balance__gte=settings.OWES_MONEY_THRESHOLD,
+    ).delete()
+    if not get_retryable_notices(run).exists():
+        finish_debt_collection_run(run)
+        return start_debt_collection_run(all_users), False
+    return run, True
+
+
+def render_debt_collection_emails(
+    notices: List[DebtCollectionNotice],
+) -> List[EmailMessage]:
+    base_url = settings.APP_URL + "/login?token="
+    messages = []
+    for notice in notices:
+        token = create_jwt_token_for_user(notice.user)
+        messages.append(
+            build_debt_collection_email(
+                {
+                    "name": notice.user.get_full_name(),
+                    "email": notice.user.email,
+                    "token": token,
+                    "frontend_url": base_url + token,
+                }
+            )
+        )
+    return messages
+
+
+def send_debt_collection_emails(
+    run: DebtCollectionRun, concurrency: int = 1, rate_limit: Optional[float] = None
+) -> DebtCollectionResult:
+    """
+    Sends the notices of a run that have not been sent yet. Every notice is marked as
+    sent, or given the error it failed with, as soon as it is done, so running this
+    again after an interruption only sends what is left. A notice is given up after
+    DEBT_COLLECTION_MAX_ATTEMPTS failed attempts, and the run is finished once every
+    notice has been sent or given up.
+    """
+    notices = list(get_retryable_notices(run).select_related("user").order_by("id"))
+    messages = render_debt_collection_emails(notices)
+
+    sent = failed = 0
+    for index, error in send_email_messages(messages, concurrency, rate_limit):
+        notice = notices[index]
+        notice.attempts += 1
+        if error is None:
+            notice.sent_at = timezone.now()
+            notice.last_error = ""
+            sent += 1
+        else:
+            notice.last_error = f"{type(error).__name__}: {error}"
+            failed += 1
+        notice.save(update_fields=["attempts", "sent_at", "last_error"])
+
+    finished = not get_retryable_notices(run).exists()
+    if finished:
+        finish_debt_collection_run(run)
+
+    return DebtCollectionResult(sent, failed, finished)
@@ -0,0 +1,63 @@
+from collections import defaultdict
+from typing import List
+
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from economy.ledger import deposit_entry
+from economy.models import Deposit, LedgerEntry, SociBankAccount
+
+
+def approve_deposits(deposit_ids, approved_by) -> List[Deposit]:
+    """
+    Approves the given deposits in a single transaction and returns the deposits that
+    were approved. Deposits that are already approved, and Stripe deposits, which are
+    approved by the webhook, are skipped.
+
+    The number of queries does not depend on the number of deposits. Balances are
+    updated with one relative update for all the accounts involved, and the approval
+    emails are sent in one batch once the transaction has been committed.
+    """
+    with transaction.atomic():
+        deposits = list(
+            Deposit.objects.select_for_update()
+            .filter(pk__in=deposit_ids, approved=False, account__isnull=False)
+            .exclude(deposit_method=Deposit.DepositMethod.STRIPE)
+            .select_related("account__user")
+        )
+        if not deposits:
+            return []
+
+        approved_at = timezone.now()
+        Deposit.objects.filter(pk__in=[deposit.pk for deposit in deposits]).update(
+            approved=True, approved_at=approved_at, approved_by=approved_by
+        )
+
+        totals = defaultdict(int)
+        for deposit in deposits:
+            deposit.approved = True
+            deposit.approved_at = approved_at
+            deposit.approved_by = approved_by
+            totals[deposit.account_id] += deposit.amount
+
+        SociBankAccount.objects.filter(pk__in=totals.keys()).update(
+            balance=F("balance")
+            + Case(
+                *[When(pk=pk, then=Value(total)) for pk, total in totals.items()],
+                default=Value(0),
+            )
+        )
+        LedgerEntry.objects.bulk_create(
+            [deposit_entry(deposit, deposit.amount) for deposit in deposits]
+        )
+
+        to_notify = [
+            deposit for deposit in deposits if deposit.account.user.notify_on_deposit
+        ]
+        if to_notify:
+            from economy.utils import send_deposit_approved_emails
+
+            transaction.on_commit(lambda: send_deposit_approved_emails(to_notify))
+
+    return deposits
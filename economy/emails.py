@@ -1,4 +1,4 @@
-from common.util import send_email
+from common.util import build_email, send_email
 
 
 def send_deposit_invalidated_email(deposit):
@@ -26,7 +26,7 @@ def send_deposit_invalidated_email(deposit):
     )
 
 
-def send_debt_collection_email(user_info):
+def build_debt_collection_email(user_info):
     """
     User info contains name, email, frontend_url
     """
@@ -69,7 +69,7 @@ def send_debt_collection_email(user_info):
                
     """
 
-    send_email(
+    return build_email(
         recipients=[user_info["email"]],
         subject="KSG - Utestående gjeld",
         message=content,
@@ -0,0 +1,200 @@
+import calendar
+import datetime
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+import pytz
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Min, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from economy.models import DailyAccountSpend, ProductOrder, SociBankAccount
+
+
+class ExpenditureDateRange:
+    THIS_MONTH = "this-month"
+    THIS_SEMESTER = "this-semester"
+    ALL_SEMESTERS = "all-semesters"
+    ALL_TIME = "all-time"
+
+
+class ExpenditureGranularity:
+    DAY = "day"
+    WEEK = "week"
+    MONTH = "month"
+
+
+DEFAULT_GRANULARITIES = {
+    ExpenditureDateRange.THIS_MONTH: ExpenditureGranularity.DAY,
+    ExpenditureDateRange.THIS_SEMESTER: ExpenditureGranularity.WEEK,
+    ExpenditureDateRange.ALL_SEMESTERS: ExpenditureGranularity.MONTH,
+    ExpenditureDateRange.ALL_TIME: ExpenditureGranularity.MONTH,
+}
+
+
+def _local_timezone():
+    return pytz.timezone(settings.TIME_ZONE)
+
+
+def _local_today() -> datetime.date:
+    return timezone.localtime(timezone.now(), _local_timezone()).date()
+
+
+def _start_of_day(day: datetime.date) -> datetime.datetime:
+    return _local_timezone().localize(datetime.datetime.combine(day, datetime.time.min))
+
+
+def _semester_start(day: datetime.date) -> datetime.date:
+    return datetime.date(day.year, 1 if day.month < 7 else 7, 1)
+
+
+def _period_start(day: datetime.date, granularity: str) -> datetime.date:
+    if granularity == ExpenditureGranularity.WEEK:
+        return day - datetime.timedelta(days=day.weekday())
+    if granularity == ExpenditureGranularity.MONTH:
+        return day.replace(day=1)
+    return day
+
+
+def _next_period_start(start: datetime.date, granularity: str) -> datetime.date:
+    if granularity == ExpenditureGranularity.WEEK:
+        return start + datetime.timedelta(days=7)
+    if granularity == ExpenditureGranularity.MONTH:
+        days_in_month = calendar.monthrange(start.year, start.month)[1]
+        return start + datetime.timedelta(days=days_in_month)
+    return start + datetime.timedelta(days=1)
+
+
+def _first_spend_day(account: SociBankAccount):
+    first_day = DailyAccountSpend.objects.filter(account=account).aggregate(
+        first_day=Min("day")
+    )["first_day"]
+    if first_day is not None:
+        return first_day
+
+    first_purchase = account.product_orders.aggregate(
+        first_purchase=Min("purchased_at")
+    )["first_purchase"]
+    if first_purchase is None:
+        return None
+    return timezone.localtime(first_purchase, _local_timezone()).date()
+
+
+def get_date_range_bounds(
+    account: SociBankAccount, date_range: str
+) -> Tuple[datetime.date, datetime.date]:
+    """
+    Returns the first and last day, both inclusive, of a `ExpenditureDateRange`.
+    """
+    today = _local_today()
+    if date_range == ExpenditureDateRange.THIS_MONTH:
+        # The whole month is returned, where the remaining days are empty
+        days_in_month = calendar.monthrange(today.year, today.month)[1]
+        return today.replace(day=1), today.replace(day=days_in_month)
+
+    if date_range == ExpenditureDateRange.THIS_SEMESTER:
+        return _semester_start(today), today
+
+    first_day = _first_spend_day(account) or today
+    if date_range == ExpenditureDateRange.ALL_SEMESTERS:
+        return _semester_start(first_day), today
+
+    return first_day, today
+
+
+def _spend_by_day(product_orders) -> Dict[datetime.date, int]:
+    return dict(
+        product_orders.annotate(day=TruncDate("purchased_at", tzinfo=_local_timezone()))
+        .order_by()
+        .values("day")
+        .annotate(total=Sum("cost"))
+        .values_list("day", "total")
+    )
+
+
+def get_daily_spend(
+    account: SociBankAccount, first_day: datetime.date, last_day: datetime.date
+) -> Dict[datetime.date, int]:
+    """
+    Returns the amount spent per day between `first_day` and `last_day`, both inclusive.
+    Days without purchases are left out.
+
+    Ranges longer than EXPENDITURE_ROLLUP_MIN_DAYS read the days that have been rolled
+    up from DailyAccountSpend, and only aggregate the product orders made after that.
+    """
+    daily_spend = {}
+    live_from = first_day
+    if (last_day - first_day).days >= settings.EXPENDITURE_ROLLUP_MIN_DAYS:
+        daily_spend = dict(
+            DailyAccountSpend.objects.filter(
+                account=account, day__gte=first_day, day__lte=last_day
+            ).values_list("day", "total")
+        )
+        if daily_spend:
+            live_from = max(daily_spend) + datetime.timedelta(days=1)
+
+    if live_from <= last_day:
+        product_orders = account.product_orders.filter(
+            purchased_at__gte=_start_of_day(live_from),
+            purchased_at__lt=_start_of_day(last_day + datetime.timedelta(days=1)),
+        )
+        daily_spend.update(_spend_by_day(product_orders))
+
+    return daily_spend
+
+
+def get_expenditure_series(
+    account: SociBankAccount, date_range: str, granularity: str = None
+) -> Tuple[List[Tuple[datetime.date, int]], int]:
+    """
+    Returns the expenditure of an account within a `ExpenditureDateRange` as a list of
+    (period start, amount) with one entry per day, week or month, and the total.
+    Periods without purchases are included with an amount of 0.
+    """
+    granularity = granularity or DEFAULT_GRANULARITIES[date_range]
+    first_day, last_day = get_date_range_bounds(account, date_range)
+
+    totals = defaultdict(int)
+    for day, total in get_daily_spend(account, first_day, last_day).items():
+        totals[_period_start(day, granularity)] += total
+
+    series = []
+    period_start = _period_start(first_day, granularity)
+    while period_start <= last_day:
+        series.append((period_start, totals[period_start]))
+        period_start = _next_period_start(period_start, granularity)
+
+    return series, sum(totals.values())
+
+
+def rollup_daily_spend(first_day: datetime.date, last_day: datetime.date) -> int:
+    """
+    Recomputes DailyAccountSpend for every account from `first_day` to `last_day`, both
+    inclusive, in a single grouped query. Returns the number of rows written.
+    """
+    product_orders = ProductOrder.objects.filter(
+        purchased_at__gte=_start_of_day(first_day),
+        purchased_at__lt=_start_of_day(last_day + datetime.timedelta(days=1)),
+    )
+    rows = (
+        product_orders.annotate(day=TruncDate("purchased_at", tzinfo=_local_timezone()))
+        .order_by()
+        .values("source_id", "day")
+        .annotate(total=Sum("cost"))
+    )
+
+    with transaction.atomic():
+        DailyAccountSpend.objects.filter(day__gte=first_day, day__lte=last_day).delete()
+        created = DailyAccountSpend.objects.bulk_create(
+            [
+                DailyAccountSpend(
+                    account_id=row["source_id"], day=row["day"], total=row["total"]
+                )
+                for row in rows
+            ],
+            batch_size=1000,
+        )
+
+    return len(created)
@@ -0,0 +1,185 @@
+import datetime
+from collections import defaultdict
+from typing import Optional, Tuple
+
+import pytz
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Count, F, Q, Sum, Value, When, Window
+from django.utils import timezone
+
+from economy.models import (
+    ProductOrder,
+    SociBankAccount,
+    SociRankedSeason,
+    SociRankedSeasonStanding,
+)
+
+
+def _local_date(timestamp: datetime.datetime) -> datetime.date:
+    return timezone.localtime(timestamp, pytz.timezone(settings.TIME_ZONE)).date()
+
+
+def _season_covers(season: SociRankedSeason, day: datetime.date) -> bool:
+    if day < season.season_start_date:
+        return False
+    return season.season_end_date is None or day <= season.season_end_date
+
+
+def get_season_datetime_range(
+    season: SociRankedSeason,
+) -> Tuple[datetime.datetime, Optional[datetime.datetime]]:
+    """
+    Returns the start and the exclusive end of a season in TIME_ZONE. The end is None
+    for a season that is still running.
+    """
+    tz = pytz.timezone(settings.TIME_ZONE)
+    start = tz.localize(
+        datetime.datetime.combine(season.season_start_date, datetime.time.min)
+    )
+    if season.season_end_date is None:
+        return start, None
+
+    end = tz.localize(
+        datetime.datetime.combine(
+            season.season_end_date + datetime.timedelta(days=1), datetime.time.min
+        )
+    )
+    return start, end
+
+
+def rebuild_season_standings(season: SociRankedSeason, user_ids=None):
+    """
+    Recomputes the standings of the participants of a season, or only of `user_ids`,
+    from their product orders with a single grouped query.
+    """
+    participants = season.participants.all()
+    if user_ids is not None:
+        participants = participants.filter(id__in=user_ids)
+    participant_ids = list(participants.values_list("id", flat=True))
+
+    start, end = get_season_datetime_range(season)
+    product_orders = ProductOrder.objects.filter(
+        source__user_id__in=participant_ids, purchased_at__gte=start
+    )
+    if end is not None:
+        product_orders = product_orders.filter(purchased_at__lt=end)
+    expenditures = dict(
+        product_orders.order_by()
+        .values("source__user_id")
+        .annotate(total=Sum("cost"))
+        .values_list("source__user_id", "total")
+    )
+
+    with transaction.atomic():
+        standings = season.standings.all()
+        if user_ids is not None:
+            standings = standings.filter(user_id__in=user_ids)
+        standings.delete()
+        SociRankedSeasonStanding.objects.bulk_create(
+            [
+                SociRankedSeasonStanding(
+                    season=season,
+                    user_id=user_id,
+                    expenditure=expenditures.get(user_id, 0),
+                )
+                for user_id in participant_ids
+            ]
+        )
+
+
+def _get_account_user_ids(product_orders) -> dict:
+    source_field = ProductOrder._meta.get_field("source")
+    user_ids = {
+        product_order.source_id: product_order.source.user_id
+        for product_order in product_orders
+        if source_field.is_cached(product_order)
+    }
+    missing = {product_order.source_id for product_order in product_orders} - set(
+        user_ids
+    )
+    if missing:
+        user_ids.update(
+            SociBankAccount.objects.filter(pk__in=missing).values_list("pk", "user_id")
+        )
+    return user_ids
+
+
+def _add_to_standings(product_orders, sign):
+    if not product_orders:
+        return
+
+    days = [_local_date(product_order.purchased_at) for product_order in product_orders]
+    seasons = SociRankedSeason.objects.filter(season_start_date__lte=max(days)).filter(
+        Q(season_end_date__isnull=True) | Q(season_end_date__gte=min(days))
+    )
+    seasons = list(seasons)
+    if not seasons:
+        return
+
+    user_ids = _get_account_user_ids(product_orders)
+    for season in seasons:
+        totals = defaultdict(int)
+        for product_order, day in zip(product_orders, days):
+            if _season_covers(season, day):
+                totals[user_ids[product_order.source_id]] += sign * product_order.cost
+
+        if not totals:
+            continue
+
+        # Only participants have a standing, everyone else is left out by the filter
+        season.standings.filter(user_id__in=totals.keys()).update(
+            expenditure=F("expenditure")
+            + Case(
+                *[When(user_id=pk, then=Value(total)) for pk, total in totals.items()],
+                default=Value(0),
+            )
+        )
+
+
+def record_season_spend(product_orders):
+    """
+    Adds placed product orders to the standings of the ranked seasons they fall within.
+    """
+    _add_to_standings(list(product_orders), 1)
+
+
+def revert_season_spend(product_order):
+    _add_to_standings([product_order], -1)
+
+
+def get_current_season() -> Optional[SociRankedSeason]:
+    """
+    The latest season, annotated with the total number of seasons as `season_count`.
+    """
+    return (
+        SociRankedSeason.objects.annotate(season_count=Window(Count("id")))
+        .order_by("season_start_date")
+        .last()
+    )
+
+
+def get_leaderboard_summary(season: SociRankedSeason, user) -> dict:
+    """
+    Returns the standing of a user in a season, or None if the user is not
+    participating, together with its placement and the number of participants.
+    Placement follows RANK semantics, so participants that have spent the same share
+    a placement.
+    """
+    standing = season.standings.filter(user=user).first()
+    expenditure = standing.expenditure if standing else 0
+    counts = season.standings.aggregate(
+        ahead=Count("id", filter=Q(expenditure__gt=expenditure)),
+        participant_count=Count("id"),
+    )
+    return {
+        "standing": standing,
+        "placement": counts["ahead"] + 1 if standing else None,
+        "participant_count": counts["participant_count"],
+    }
+
+
+def get_top_standings(season: SociRankedSeason, count=10):
+    return season.standings.select_related("user").order_by("-expenditure", "id")[
+        :count
+    ]
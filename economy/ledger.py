@@ -0,0 +1,178 @@
+import base64
+import json
+from typing import List, Optional, Tuple
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from economy.models import LedgerEntry, SociBankAccount
+
+
+def _product_order_quantity(product_order):
+    if product_order.product.sku_number == settings.DIRECT_CHARGE_SKU:
+        return 1
+    return product_order.order_size
+
+
+# The `*_entry`/`*_entries` functions build unsaved entries, which lets both the
+# money movements and the backfill command insert them with bulk_create.
+def product_order_entry(product_order) -> LedgerEntry:
+    return LedgerEntry(
+        account_id=product_order.source_id,
+        type=LedgerEntry.Type.PRODUCT_ORDER,
+        amount=-product_order.cost,
+        name=product_order.product.name,
+        quantity=_product_order_quantity(product_order),
+        timestamp=product_order.purchased_at,
+        product_order=product_order,
+    )
+
+
+def write_product_order_entries(product_orders):
+    LedgerEntry.objects.bulk_create(
+        [product_order_entry(product_order) for product_order in product_orders]
+    )
+
+
+def write_soci_order_session_order_entry(order, cost):
+    """
+    Drink orders in a stilletime are charged when they are placed, while the product
+    order itself is first created when the session closes.
+    """
+    return LedgerEntry.objects.create(
+        account=order.user.bank_account,
+        type=LedgerEntry.Type.PRODUCT_ORDER,
+        amount=-cost,
+        name=order.product.name,
+        quantity=order.amount,
+        timestamp=order.ordered_at,
+    )
+
+
+def write_undo_entry(product_order):
+    return LedgerEntry.objects.create(
+        account_id=product_order.source_id,
+        type=LedgerEntry.Type.UNDO,
+        amount=product_order.cost,
+        name=f"Angret {product_order.product.name}",
+        quantity=_product_order_quantity(product_order),
+    )
+
+
+def transfer_entries(transfer) -> List[LedgerEntry]:
+    entries = []
+    if transfer.source_id:
+        entries.append(
+            LedgerEntry(
+                account_id=transfer.source_id,
+                type=LedgerEntry.Type.TRANSFER,
+                amount=-transfer.amount,
+                name="Overføring",
+                timestamp=transfer.created_at,
+                transfer=transfer,
+            )
+        )
+    if transfer.destination_id:
+        entries.append(
+            LedgerEntry(
+                account_id=transfer.destination_id,
+                type=LedgerEntry.Type.TRANSFER,
+                amount=transfer.amount,
+                name="Overføring",
+                timestamp=transfer.created_at,
+                transfer=transfer,
+            )
+        )
+    return entries
+
+
+def write_transfer_entries(transfer):
+    return LedgerEntry.objects.bulk_create(transfer_entries(transfer))
+
+
+def deposit_entry(deposit, amount) -> LedgerEntry:
+    return LedgerEntry(
+        account_id=deposit.account_id,
+        type=LedgerEntry.Type.DEPOSIT,
+        amount=amount,
+        name="Innskudd",
+        timestamp=deposit.approved_at or deposit.created_at,
+        deposit=deposit,
+    )
+
+
+def write_deposit_entry(deposit, amount):
+    entry = deposit_entry(deposit, amount)
+    entry.save()
+    return entry
+
+
+def write_deposit_refund_entry(deposit, amount):
+    return LedgerEntry.objects.create(
+        account_id=deposit.account_id,
+        type=LedgerEntry.Type.DEPOSIT_REFUND,
+        amount=-amount,
+        name="Innskudd trukket tilbake",
+        deposit=deposit,
+    )
+
+
+def external_charge_entry(external_charge) -> LedgerEntry:
+    return LedgerEntry(
+        account_id=external_charge.bank_account_id,
+        type=LedgerEntry.Type.EXTERNAL_CHARGE,
+        amount=-external_charge.amount,
+        name=external_charge.bar_tab_customer.name,
+        timestamp=external_charge.created_at,
+        external_charge=external_charge,
+    )
+
+
+def write_external_charge_entry(external_charge):
+    entry = external_charge_entry(external_charge)
+    entry.save()
+    return entry
+
+
+def encode_ledger_cursor(entry: LedgerEntry, balance: int) -> str:
+    payload = json.dumps([entry.timestamp.isoformat(), entry.id, balance])
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_ledger_cursor(cursor: str) -> Tuple:
+    try:
+        timestamp, entry_id, balance = json.loads(base64.urlsafe_b64decode(cursor))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid ledger cursor")
+    return parse_datetime(timestamp), int(entry_id), int(balance)
+
+
+def get_ledger_page(
+    account: SociBankAccount, first: int, after: Optional[str] = None
+) -> List[LedgerEntry]:
+    """
+    Returns up to `first` ledger entries for an account, newest first, starting after
+    the entry the `after` cursor points to. Every entry is given a `balance` attribute
+    holding the account balance right after the entry, and a `cursor` attribute that
+    can be passed as `after` to continue from that entry.
+
+    The running balance starts from the current balance and is carried in the cursor,
+    so each page is a single index range scan no matter how deep into the history it is.
+    """
+    entries = account.ledger_entries.order_by("-timestamp", "-id")
+    if after:
+        timestamp, entry_id, balance = decode_ledger_cursor(after)
+        entries = entries.filter(
+            Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=entry_id)
+        )
+    else:
+        balance = account.balance
+
+    entries = list(entries[:first])
+    for entry in entries:
+        entry.balance = balance
+        balance -= entry.amount
+        entry.cursor = encode_ledger_cursor(entry, balance)
+
+    return entries
@@ -0,0 +1,105 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Min, Q
+from django.utils import timezone
+
+from economy.ledger import (
+    deposit_entry,
+    external_charge_entry,
+    product_order_entry,
+    transfer_entries,
+)
+from economy.models import (
+    Deposit,
+    ExternalCharge,
+    LedgerEntry,
+    ProductOrder,
+    SociBankAccount,
+    Transfer,
+)
+
+
+class Command(BaseCommand):
+    help = "Writes ledger entries for money movements made before the ledger existed"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of ledger entries inserted per query",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            self.backfill_ledger(*args, **options)
+
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f"{e}"))
+            raise CommandError(e)
+
+    def backfill_ledger(self, *args, **options):
+        """
+        Every account is backfilled with the movements older than its first ledger entry,
+        or all of them if it has none. Running the command again is therefore a no-op,
+        and it is safe to run while new movements are being written to the ledger.
+        """
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{timezone.now().strftime('%Y-%d-%m, %H:%M:%S')} Backfilling ledger"
+            )
+        )
+        batch_size = options["batch_size"]
+        accounts = SociBankAccount.objects.annotate(
+            first_entry_at=Min("ledger_entries__timestamp")
+        ).order_by("pk")
+
+        total = 0
+        for account in accounts.iterator():
+            with transaction.atomic():
+                entries = self.get_missing_entries(account)
+                LedgerEntry.objects.bulk_create(entries, batch_size=batch_size)
+            total += len(entries)
+
+        self.stdout.write(self.style.SUCCESS(f"Wrote {total} ledger entries"))
+
+    @staticmethod
+    def get_missing_entries(account):
+        before = account.first_entry_at
+
+        product_orders = ProductOrder.objects.filter(source=account).select_related(
+            "product"
+        )
+        transfers = Transfer.objects.filter(Q(source=account) | Q(destination=account))
+        deposits = Deposit.objects.filter(account=account, approved=True)
+        external_charges = ExternalCharge.objects.filter(
+            bank_account=account
+        ).select_related("bar_tab_customer")
+
+        if before is not None:
+            product_orders = product_orders.filter(purchased_at__lt=before)
+            transfers = transfers.filter(created_at__lt=before)
+            deposits = deposits.filter(
+                Q(approved_at__lt=before)
+                | Q(approved_at__isnull=True, created_at__lt=before)
+            )
+            external_charges = external_charges.filter(created_at__lt=before)
+
+        entries = [
+            product_order_entry(product_order) for product_order in product_orders
+        ]
+        for transfer in transfers:
+            entries.extend(
+                entry
+                for entry in transfer_entries(transfer)
+                if entry.account_id == account.id
+            )
+        entries.extend(
+            deposit_entry(deposit, deposit.resolved_amount or deposit.amount)
+            for deposit in deposits
+        )
+        entries.extend(
+            external_charge_entry(external_charge)
+            for external_charge in external_charges
+        )
+        return entries
@@ -42,8 +42,7 @@ class Command(BaseCommand):
                     f"{timezone.now().strftime('%Y-%d-%m, %H:%M:%S')} Session last purchase is more than 2 hours ago, closing session"
                 )
             )
-            session.closed_at = timezone.now()
-            session.save()
+            session.close()
             return
 
         self.stdout.write(
@@ -1,13 +1,22 @@
+import csv
+
 from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
 from django.utils import timezone
 
-from economy.emails import send_debt_collection_email
-from economy.utils import get_users_with_balance_less_than
-from login.util import create_jwt_token_for_user
+from economy.debt_collection import (
+    get_debtors,
+    get_or_start_debt_collection_run,
+    send_debt_collection_emails,
+)
 
 
 class Command(BaseCommand):
+    help = (
+        "Emails users owing money a link to pay. Runs interrupted this month are "
+        "resumed, so it can be run again until every email has been sent"
+    )
+
     def handle(self, *args, **options):
         try:
             self.debt_collection(*args, **options)
@@ -23,69 +32,149 @@ class Command(BaseCommand):
             default=False,
             help="Send debt collection emails to all users, not just active users",
         )
+        parser.add_argument(
+            "--yes",
+            action="store_true",
+            default=False,
+            help="Send the emails without asking first, for running from cron",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            default=False,
+            help="List the users owing money without sending anything",
+        )
+        parser.add_argument(
+            "--report",
+            default=None,
+            help="Write the users owing money and whether they were emailed to this CSV",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=settings.DEBT_COLLECTION_EMAIL_CONCURRENCY,
+            help="Number of connections to the mail server to send over",
+        )
+        parser.add_argument(
+            "--rate-limit",
+            type=float,
+            default=settings.DEBT_COLLECTION_EMAIL_RATE_LIMIT,
+            help="Maximum number of emails sent per second, 0 for no limit",
+        )
 
-    def debt_collection(self, *args, **options):
+    def log(self, message):
         self.stdout.write(
             self.style.SUCCESS(
-                f"{timezone.now().strftime('%Y-%d-%m, %H:%M:%S')} Starting debt analysis"
+                f"{timezone.now().strftime('%Y-%d-%m, %H:%M:%S')} {message}"
             )
         )
-        all_users = options["all_users"]
+
+    def confirm(self, question, options):
+        if options["yes"]:
+            return True
+        return input(f"{question} [y/n]").lower() in ["yes", "y"]
+
+    def list_debtors(self, rows):
+        total_debt = 0
+        for name, balance in rows:
+            total_debt += balance
+            self.stdout.write(self.style.SUCCESS(f"{name:<30} {balance:<10}"))
+        self.stdout.write(self.style.SUCCESS(f"{'='*40}"))
+        self.stdout.write(self.style.SUCCESS(f"{'Total':<30} {total_debt:<10}"))
+
+    def write_report(self, path, rows):
+        with open(path, "w", newline="") as report:
+            writer = csv.writer(report)
+            writer.writerow(["name", "email", "balance", "sent_at", "error"])
+            writer.writerows(rows)
+        self.log(f"Wrote report to {path}")
+
+    def debt_collection(self, *args, **options):
+        self.log("Starting debt analysis")
         self.stdout.write(
             self.style.SUCCESS(
                 f"Finding users with balance less than {settings.OWES_MONEY_THRESHOLD}"
             )
         )
-        users = get_users_with_balance_less_than(
-            settings.OWES_MONEY_THRESHOLD, all_users=all_users
-        )
 
-        if not users:
-            self.stdout.write(self.style.SUCCESS("No users found. Exiting"))
+        if options["dry_run"]:
+            debtors = list(get_debtors(options["all_users"]))
+            self.stdout.write(self.style.SUCCESS(f"Found {len(debtors)} users"))
+            self.list_debtors(
+                [(user.get_full_name(), user.balance) for user in debtors]
+            )
+            if options["report"]:
+                self.write_report(
+                    options["report"],
+                    [
+                        (user.get_full_name(), user.email, user.balance, "", "")
+                        for user in debtors
+                    ],
+                )
             return
 
-        list_users = input(f"Found {users.count()} users. List users? [y/n]")
+        run, resumed = get_or_start_debt_collection_run(options["all_users"])
+        if run is None:
+            self.stdout.write(self.style.SUCCESS("No users found. Exiting"))
+            return
 
-        yes = ["yes", "y"]
-        if list_users.lower() in yes:
-            total_debt = 0
-            for user in users:
-                total_debt += user.balance
-                self.stdout.write(
-                    self.style.SUCCESS(f"{user.get_full_name():<30} {user.balance:<10}")
+        notices = list(run.notices.select_related("user").order_by("balance", "id"))
+        pending = [
+            notice
+            for notice in notices
+            if notice.sent_at is None
+            and notice.attempts < settings.DEBT_COLLECTION_MAX_ATTEMPTS
+        ]
+        if resumed:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"Resuming the run started {run.started_at}, "
+                    f"{len(notices) - len(pending)} of {len(notices)} emails are sent"
                 )
-            self.stdout.write(self.style.SUCCESS(f"{'='*40}"))
-            self.stdout.write(self.style.SUCCESS(f"{'Total':<30} {total_debt:<10}"))
+            )
 
-        send_email = input("Send emails? [y/n]")
+        if self.confirm(f"Found {len(pending)} users. List users?", options):
+            self.list_debtors(
+                [(notice.user.get_full_name(), notice.balance) for notice in pending]
+            )
 
-        if send_email.lower() not in yes:
+        if not self.confirm("Send emails?", options):
             self.stdout.write(self.style.SUCCESS("okthxbye"))
             return
 
-        self.stdout.write(
-            self.style.SUCCESS(
-                f"{timezone.now().strftime('%Y-%d-%m, %H:%M:%S')} Sending debt collection emails"
-            )
+        self.log("Sending debt collection emails")
+        result = send_debt_collection_emails(
+            run,
+            concurrency=options["concurrency"],
+            rate_limit=options["rate_limit"] or None,
         )
-        base_url = settings.APP_URL + "/login?token="
-        for user in users:
-            token = create_jwt_token_for_user(user)
-            user_dict = {
-                "name": user.get_full_name(),
-                "email": user.email,
-                "token": token,
-                "frontend_url": base_url + token,
-            }
-            send_debt_collection_email(user_dict)
-            self.stdout.write(
-                self.style.SUCCESS(
-                    f"{timezone.now().strftime('%Y-%d-%m, %H:%M:%S')} Sent email to {user.get_full_name()}"
-                )
+        self.log(f"Sent {result.sent} emails, {result.failed} failed")
+
+        if options["report"]:
+            self.write_report(
+                options["report"],
+                [
+                    (
+                        notice.user.get_full_name(),
+                        notice.user.email,
+                        notice.balance,
+                        notice.sent_at.isoformat() if notice.sent_at else "",
+                        notice.last_error,
+                    )
+                    for notice in run.notices.select_related("user").order_by(
+                        "balance", "id"
+                    )
+                ],
             )
 
-        self.stdout.write(
-            self.style.SUCCESS(
-                f"{timezone.now().strftime('%Y-%d-%m, %H:%M:%S')} Done sending debt collection emails. Fingers crossed"
+        if result.failed and result.finished:
+            raise CommandError(
+                f"{result.failed} emails failed and are given up after "
+                f"{settings.DEBT_COLLECTION_MAX_ATTEMPTS} attempts"
             )
-        )
+        if result.failed:
+            raise CommandError(
+                f"{result.failed} emails failed. Run the command again to retry them"
+            )
+
+        self.log("Done sending debt collection emails. Fingers crossed")
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from economy.stripe_webhooks import (
+    get_processable_stripe_events,
+    process_stripe_events,
+)
+
+
+class Command(BaseCommand):
+    help = "Retries the Stripe webhook events that are pending or failed"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=None,
+            help="Maximum number of events processed in this run",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            self.process_events(*args, **options)
+
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f"{e}"))
+            raise CommandError(e)
+
+    def process_events(self, *args, **options):
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{timezone.now().strftime('%Y-%d-%m, %H:%M:%S')} Processing Stripe events"
+            )
+        )
+        result = process_stripe_events(get_processable_stripe_events(options["limit"]))
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Processed {result.processed} events, ignored {result.ignored}"
+            )
+        )
+        if result.failed:
+            self.stdout.write(self.style.WARNING(f"{result.failed} events failed"))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from economy.leaderboard import rebuild_season_standings
+from economy.models import SociRankedSeason
+
+
+class Command(BaseCommand):
+    help = "Recomputes the ranked season leaderboard from product orders"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all-seasons",
+            action="store_true",
+            default=False,
+            help="Rebuild every season, not just the current one",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            self.rebuild_standings(*args, **options)
+
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f"{e}"))
+            raise CommandError(e)
+
+    def rebuild_standings(self, *args, **options):
+        seasons = SociRankedSeason.objects.order_by("season_start_date")
+        if not options["all_seasons"]:
+            seasons = seasons.reverse()[:1]
+
+        for season in seasons:
+            rebuild_season_standings(season)
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Rebuilt {season.standings.count()} standings for season "
+                    f"starting {season.season_start_date}"
+                )
+            )
@@ -0,0 +1,92 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from economy.models import BalanceReconciliation
+from economy.reconciliation import reconcile_balances
+
+CHECKPOINT = "checkpoint"
+
+
+class Command(BaseCommand):
+    help = "Recomputes account balances from their money movements and reports drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--since",
+            nargs="?",
+            const=CHECKPOINT,
+            default=None,
+            help="Only check accounts with activity since this ISO timestamp. "
+            "Without a value the start of the last finished run is used",
+        )
+        parser.add_argument(
+            "--repair",
+            action="store_true",
+            default=False,
+            help="Correct drifting balances and write an adjustment to their ledger",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            self.reconcile(*args, **options)
+
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f"{e}"))
+            raise CommandError(e)
+
+    def get_since(self, since):
+        if since is None:
+            return None
+
+        if since == CHECKPOINT:
+            checkpoint = BalanceReconciliation.get_checkpoint()
+            if checkpoint is None:
+                self.stdout.write(
+                    self.style.WARNING("No checkpoint found, checking every account")
+                )
+            return checkpoint
+
+        parsed = parse_datetime(since)
+        if parsed is None:
+            raise ValueError(f"Invalid timestamp '{since}'")
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed)
+        return parsed
+
+    def reconcile(self, *args, **options):
+        since = self.get_since(options["since"])
+        repair = options["repair"]
+        run = BalanceReconciliation.objects.create(since=since, repair=repair)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{timezone.now().strftime('%Y-%d-%m, %H:%M:%S')} Reconciling balances"
+                + (f" with activity since {since}" if since else "")
+            )
+        )
+
+        for result in reconcile_balances(since=since, repair=repair):
+            run.accounts_checked += 1
+            if not result.drift:
+                continue
+
+            run.accounts_with_drift += 1
+            run.total_drift += result.drift
+            self.stdout.write(
+                self.style.WARNING(
+                    f"Account {result.account_id:<8} balance {result.balance:<10} "
+                    f"expected {result.expected_balance:<10} drift {result.drift}"
+                    + (" (repaired)" if repair else "")
+                )
+            )
+
+        run.finished_at = timezone.now()
+        run.save()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Checked {run.accounts_checked} accounts, "
+                f"{run.accounts_with_drift} with a total drift of {run.total_drift}"
+            )
+        )
@@ -0,0 +1,95 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from economy.models import StripeWebhookEvent
+from economy.stripe_webhooks import (
+    fetch_stripe_events,
+    process_stripe_events,
+    record_stripe_event,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Processes stored Stripe events again, or backfills events that were never "
+        "delivered by the webhook"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--event-id",
+            action="append",
+            default=[],
+            help="Stripe id of a stored event to process again. Can be repeated",
+        )
+        parser.add_argument(
+            "--failed",
+            action="store_true",
+            default=False,
+            help="Process every failed event again, including those out of attempts",
+        )
+        parser.add_argument(
+            "--since",
+            default=None,
+            help="Fetch the events Stripe has created since this ISO timestamp and "
+            "store the ones that are missing before processing",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            self.replay(*args, **options)
+
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f"{e}"))
+            raise CommandError(e)
+
+    def backfill(self, since):
+        parsed = parse_datetime(since)
+        if parsed is None:
+            raise ValueError(f"Invalid timestamp '{since}'")
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed)
+
+        stripe_event_ids = []
+        created = 0
+        for event in fetch_stripe_events(parsed):
+            _, was_created = record_stripe_event(event)
+            stripe_event_ids.append(event["id"])
+            created += was_created
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Fetched {len(stripe_event_ids)} events from Stripe, {created} were missing"
+            )
+        )
+        return stripe_event_ids
+
+    def replay(self, *args, **options):
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{timezone.now().strftime('%Y-%d-%m, %H:%M:%S')} Replaying Stripe events"
+            )
+        )
+        stripe_event_ids = list(options["event_id"])
+        if options["since"]:
+            stripe_event_ids.extend(self.backfill(options["since"]))
+
+        events = StripeWebhookEvent.objects.filter(stripe_event_id__in=stripe_event_ids)
+        if options["failed"]:
+            events |= StripeWebhookEvent.objects.filter(
+                status=StripeWebhookEvent.Status.FAILED
+            )
+
+        # Handlers are idempotent, so replaying an event that was already processed
+        # does not apply it twice
+        events = events.order_by("stripe_created_at", "id")
+        result = process_stripe_events(events)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Processed {result.processed} events, ignored {result.ignored}"
+            )
+        )
+        if result.failed:
+            self.stdout.write(self.style.WARNING(f"{result.failed} events failed"))
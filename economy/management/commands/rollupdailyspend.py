@@ -0,0 +1,58 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from economy.expenditures import rollup_daily_spend
+from economy.models import DailyAccountSpend, ProductOrder
+
+
+class Command(BaseCommand):
+    help = "Rolls up product orders into the daily spend of every account"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=7,
+            help="Number of already rolled up days to recompute, to pick up late orders",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            self.rollup(*args, **options)
+
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f"{e}"))
+            raise CommandError(e)
+
+    def rollup(self, *args, **options):
+        """
+        Run this using a crontab after midnight. The rollup always continues from the
+        last rolled up day, so it covers the whole history without gaps.
+        """
+        last_day = timezone.localdate() - datetime.timedelta(days=1)
+        last_rolled_up_day = DailyAccountSpend.objects.aggregate(day=Max("day"))["day"]
+        if last_rolled_up_day is not None:
+            first_day = last_rolled_up_day - datetime.timedelta(days=options["days"])
+        else:
+            first_purchase = ProductOrder.objects.aggregate(
+                purchased_at=Min("purchased_at")
+            )["purchased_at"]
+            if first_purchase is None:
+                self.stdout.write(self.style.SUCCESS("No product orders found"))
+                return
+            first_day = timezone.localdate(first_purchase)
+
+        if first_day > last_day:
+            self.stdout.write(self.style.SUCCESS("Daily spend is up to date"))
+            return
+
+        rows = rollup_daily_spend(first_day, last_day)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{timezone.now().strftime('%Y-%d-%m, %H:%M:%S')} Rolled up {rows} "
+                f"daily spend rows from {first_day} to {last_day}"
+            )
+        )
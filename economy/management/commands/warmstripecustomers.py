@@ -0,0 +1,82 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from economy.models import SociBankAccount
+from economy.stripe_customers import (
+    create_new_stripe_customer,
+    list_stripe_customer_ids_by_email,
+)
+
+
+class Command(BaseCommand):
+    help = "Stores the Stripe customer of every bank account that is missing one"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--create",
+            action="store_true",
+            default=False,
+            help="Create Stripe customers for users that do not have one",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            self.warm_stripe_customers(*args, **options)
+
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f"{e}"))
+            raise CommandError(e)
+
+    def warm_stripe_customers(self, *args, **options):
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{timezone.now().strftime('%Y-%d-%m, %H:%M:%S')} Mapping bank accounts to Stripe customers"
+            )
+        )
+        customer_ids = list_stripe_customer_ids_by_email()
+        taken = set(
+            SociBankAccount.objects.filter(
+                stripe_customer_id__isnull=False
+            ).values_list("stripe_customer_id", flat=True)
+        )
+        accounts = SociBankAccount.objects.filter(
+            stripe_customer_id__isnull=True
+        ).select_related("user")
+
+        mapped = []
+        created = 0
+        for account in accounts:
+            email = (account.user.email or "").lower()
+            customer_id = customer_ids.get(email)
+            if email in customer_ids and customer_id is None:
+                self.stdout.write(
+                    self.style.WARNING(f"Several Stripe customers use {email}")
+                )
+                continue
+
+            if customer_id is None:
+                if not options["create"]:
+                    continue
+                customer_id = create_new_stripe_customer(account.user)
+                created += 1
+
+            if customer_id in taken:
+                self.stdout.write(
+                    self.style.WARNING(
+                        f"Stripe customer {customer_id} already belongs to another account"
+                    )
+                )
+                continue
+
+            taken.add(customer_id)
+            account.stripe_customer_id = customer_id
+            mapped.append(account)
+
+        SociBankAccount.objects.bulk_update(
+            mapped, ["stripe_customer_id"], batch_size=500
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Mapped {len(mapped)} bank accounts, {created} new Stripe customers"
+            )
+        )
@@ -0,0 +1,109 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("economy", "0006_socirankedseason"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LedgerEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "type",
+                    models.CharField(
+                        choices=[
+                            ("PRODUCT_ORDER", "Product order"),
+                            ("TRANSFER", "Transfer"),
+                            ("DEPOSIT", "Deposit"),
+                            ("DEPOSIT_REFUND", "Deposit refund"),
+                            ("EXTERNAL_CHARGE", "External charge"),
+                            ("UNDO", "Undo"),
+                        ],
+                        max_length=32,
+                    ),
+                ),
+                (
+                    "amount",
+                    models.IntegerField(
+                        help_text="Signed change to the account balance"
+                    ),
+                ),
+                ("name", models.CharField(max_length=255)),
+                ("quantity", models.IntegerField(blank=True, null=True)),
+                ("timestamp", models.DateTimeField(default=django.utils.timezone.now)),
+                (
+                    "account",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="ledger_entries",
+                        to="economy.socibankaccount",
+                    ),
+                ),
+                (
+                    "deposit",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="ledger_entries",
+                        to="economy.deposit",
+                    ),
+                ),
+                (
+                    "external_charge",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="ledger_entries",
+                        to="economy.externalcharge",
+                    ),
+                ),
+                (
+                    "product_order",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="ledger_entries",
+                        to="economy.productorder",
+                    ),
+                ),
+                (
+                    "transfer",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="ledger_entries",
+                        to="economy.transfer",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Ledger entry",
+                "verbose_name_plural": "Ledger entries",
+                "indexes": [
+                    models.Index(
+                        fields=["account", "timestamp"],
+                        name="economy_led_account_914d6c_idx",
+                    )
+                ],
+            },
+        ),
+    ]
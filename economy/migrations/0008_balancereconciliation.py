@@ -0,0 +1,61 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:00
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("economy", "0007_ledgerentry"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BalanceReconciliation",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("started_at", models.DateTimeField(default=django.utils.timezone.now)),
+                ("finished_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "since",
+                    models.DateTimeField(
+                        blank=True,
+                        help_text="Only accounts with activity since this time",
+                        null=True,
+                    ),
+                ),
+                ("repair", models.BooleanField(default=False)),
+                ("accounts_checked", models.IntegerField(default=0)),
+                ("accounts_with_drift", models.IntegerField(default=0)),
+                ("total_drift", models.IntegerField(default=0)),
+            ],
+            options={
+                "verbose_name": "Balance reconciliation",
+                "verbose_name_plural": "Balance reconciliations",
+            },
+        ),
+        migrations.AlterField(
+            model_name="ledgerentry",
+            name="type",
+            field=models.CharField(
+                choices=[
+                    ("PRODUCT_ORDER", "Product order"),
+                    ("TRANSFER", "Transfer"),
+                    ("DEPOSIT", "Deposit"),
+                    ("DEPOSIT_REFUND", "Deposit refund"),
+                    ("EXTERNAL_CHARGE", "External charge"),
+                    ("UNDO", "Undo"),
+                    ("ADJUSTMENT", "Adjustment"),
+                ],
+                max_length=32,
+            ),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("economy", "0008_balancereconciliation"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailyAccountSpend",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                ("total", models.IntegerField(default=0)),
+            ],
+            options={
+                "verbose_name": "Daily account spend",
+                "verbose_name_plural": "Daily account spend",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="productorder",
+            index=models.Index(
+                fields=["source", "purchased_at"], name="economy_pro_source__6fbcf9_idx"
+            ),
+        ),
+        migrations.AddField(
+            model_name="dailyaccountspend",
+            name="account",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="daily_spend",
+                to="economy.socibankaccount",
+            ),
+        ),
+        migrations.AlterUniqueTogether(
+            name="dailyaccountspend",
+            unique_together={("account", "day")},
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:06
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("economy", "0009_dailyaccountspend"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SociRankedSeasonStanding",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("expenditure", models.IntegerField(default=0)),
+                (
+                    "season",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="standings",
+                        to="economy.socirankedseason",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="ranked_season_standings",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Soci ranked season standing",
+                "verbose_name_plural": "Soci ranked season standings",
+                "indexes": [
+                    models.Index(
+                        fields=["season", "-expenditure"],
+                        name="economy_soc_season__b0a31f_idx",
+                    )
+                ],
+                "unique_together": {("season", "user")},
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("economy", "0010_socirankedseasonstanding"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="socisession",
+            name="summary_customer_count",
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="socisession",
+            name="summary_product_order_count",
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="socisession",
+            name="summary_revenue",
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:16
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("economy", "0011_socisession_summary"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StripeWebhookEvent",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("stripe_event_id", models.CharField(max_length=255, unique=True)),
+                ("type", models.CharField(max_length=255)),
+                (
+                    "payment_intent_id",
+                    models.CharField(blank=True, db_index=True, max_length=64),
+                ),
+                ("payload", models.JSONField()),
+                ("stripe_created_at", models.DateTimeField()),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("PENDING", "Pending"),
+                            ("PROCESSED", "Processed"),
+                            ("IGNORED", "Ignored"),
+                            ("FAILED", "Failed"),
+                        ],
+                        default="PENDING",
+                        max_length=16,
+                    ),
+                ),
+                ("attempts", models.IntegerField(default=0)),
+                ("last_error", models.TextField(blank=True, default="")),
+                (
+                    "received_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                ("processed_at", models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                "verbose_name": "Stripe webhook event",
+                "verbose_name_plural": "Stripe webhook events",
+                "indexes": [
+                    models.Index(
+                        fields=["status", "stripe_created_at", "id"],
+                        name="economy_str_status_a358bc_idx",
+                    )
+                ],
+            },
+        ),
+    ]
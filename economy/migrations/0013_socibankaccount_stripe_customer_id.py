@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("economy", "0012_stripewebhookevent"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="socibankaccount",
+            name="stripe_customer_id",
+            field=models.CharField(
+                blank=True, editable=False, max_length=255, null=True, unique=True
+            ),
+        ),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:34
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("economy", "0013_socibankaccount_stripe_customer_id"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DebtCollectionRun",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("started_at", models.DateTimeField(default=django.utils.timezone.now)),
+                ("finished_at", models.DateTimeField(blank=True, null=True)),
+                ("all_users", models.BooleanField(default=False)),
+            ],
+            options={
+                "verbose_name": "Debt collection run",
+                "verbose_name_plural": "Debt collection runs",
+            },
+        ),
+        migrations.CreateModel(
+            name="DebtCollectionNotice",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("balance", models.IntegerField()),
+                ("sent_at", models.DateTimeField(blank=True, null=True)),
+                ("attempts", models.IntegerField(default=0)),
+                ("last_error", models.TextField(blank=True, default="")),
+                (
+                    "run",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="notices",
+                        to="economy.debtcollectionrun",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="debt_collection_notices",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Debt collection notice",
+                "verbose_name_plural": "Debt collection notices",
+                "unique_together": {("run", "user")},
+            },
+        ),
+    ]
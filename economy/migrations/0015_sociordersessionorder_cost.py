@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-18 14:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("economy", "0014_debtcollectionrun"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="sociordersessionorder",
+            name="cost",
+            field=models.IntegerField(
+                blank=True,
+                help_text="What the user was charged when ordering, if charged right away",
+                null=True,
+            ),
+        ),
+    ]
@@ -0,0 +1,64 @@
+import datetime
+
+import pytz
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Sum
+
+
+def rebuild_season_standings(apps, schema_editor):
+    """
+    Builds the standings of every existing season from its participants and their
+    product orders, like the rebuildseasonstandings command does, so the leaderboard
+    is complete right after the standings table is deployed.
+    """
+    SociRankedSeason = apps.get_model("economy", "SociRankedSeason")
+    SociRankedSeasonStanding = apps.get_model("economy", "SociRankedSeasonStanding")
+    ProductOrder = apps.get_model("economy", "ProductOrder")
+    tz = pytz.timezone(settings.TIME_ZONE)
+
+    for season in SociRankedSeason.objects.all():
+        participant_ids = list(season.participants.values_list("id", flat=True))
+        product_orders = ProductOrder.objects.filter(
+            source__user_id__in=participant_ids,
+            purchased_at__gte=tz.localize(
+                datetime.datetime.combine(season.season_start_date, datetime.time.min)
+            ),
+        )
+        if season.season_end_date is not None:
+            product_orders = product_orders.filter(
+                purchased_at__lt=tz.localize(
+                    datetime.datetime.combine(
+                        season.season_end_date + datetime.timedelta(days=1),
+                        datetime.time.min,
+                    )
+                )
+            )
+        expenditures = dict(
+            product_orders.order_by()
+            .values("source__user_id")
+            .annotate(total=Sum("cost"))
+            .values_list("source__user_id", "total")
+        )
+
+        SociRankedSeasonStanding.objects.filter(season=season).delete()
+        SociRankedSeasonStanding.objects.bulk_create(
+            [
+                SociRankedSeasonStanding(
+                    season=season,
+                    user_id=user_id,
+                    expenditure=expenditures.get(user_id, 0),
+                )
+                for user_id in participant_ids
+            ]
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("economy", "0015_sociordersessionorder_cost"),
+    ]
+
+    operations = [
+        migrations.RunPython(rebuild_season_standings, migrations.RunPython.noop),
+    ]
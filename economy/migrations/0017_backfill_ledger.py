@@ -0,0 +1,106 @@
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Min, Q
+
+
+def backfill_ledger(apps, schema_editor):
+    """
+    Writes ledger entries for the movements made before the ledger existed, like the
+    backfillledger command does, so transaction histories and running balances are
+    complete right after deploying. Every account is backfilled with the movements
+    older than its first ledger entry, or all of them if it has none.
+    """
+    SociBankAccount = apps.get_model("economy", "SociBankAccount")
+    LedgerEntry = apps.get_model("economy", "LedgerEntry")
+    ProductOrder = apps.get_model("economy", "ProductOrder")
+    Transfer = apps.get_model("economy", "Transfer")
+    Deposit = apps.get_model("economy", "Deposit")
+    ExternalCharge = apps.get_model("economy", "ExternalCharge")
+
+    accounts = SociBankAccount.objects.annotate(
+        first_entry_at=Min("ledger_entries__timestamp")
+    ).order_by("pk")
+    for account in accounts.iterator():
+        before = account.first_entry_at
+        product_orders = ProductOrder.objects.filter(source=account).select_related(
+            "product"
+        )
+        transfers = Transfer.objects.filter(Q(source=account) | Q(destination=account))
+        deposits = Deposit.objects.filter(account=account, approved=True)
+        external_charges = ExternalCharge.objects.filter(
+            bank_account=account
+        ).select_related("bar_tab_customer")
+        if before is not None:
+            product_orders = product_orders.filter(purchased_at__lt=before)
+            transfers = transfers.filter(created_at__lt=before)
+            deposits = deposits.filter(
+                Q(approved_at__lt=before)
+                | Q(approved_at__isnull=True, created_at__lt=before)
+            )
+            external_charges = external_charges.filter(created_at__lt=before)
+
+        entries = [
+            LedgerEntry(
+                account=account,
+                type="PRODUCT_ORDER",
+                amount=-product_order.cost,
+                name=product_order.product.name,
+                quantity=(
+                    1
+                    if product_order.product.sku_number == settings.DIRECT_CHARGE_SKU
+                    else product_order.order_size
+                ),
+                timestamp=product_order.purchased_at,
+                product_order=product_order,
+            )
+            for product_order in product_orders
+        ]
+        for transfer in transfers:
+            for account_id, amount in [
+                (transfer.source_id, -transfer.amount),
+                (transfer.destination_id, transfer.amount),
+            ]:
+                if account_id == account.id:
+                    entries.append(
+                        LedgerEntry(
+                            account=account,
+                            type="TRANSFER",
+                            amount=amount,
+                            name="Overføring",
+                            timestamp=transfer.created_at,
+                            transfer=transfer,
+                        )
+                    )
+        entries.extend(
+            LedgerEntry(
+                account=account,
+                type="DEPOSIT",
+                amount=deposit.resolved_amount or deposit.amount,
+                name="Innskudd",
+                timestamp=deposit.approved_at or deposit.created_at,
+                deposit=deposit,
+            )
+            for deposit in deposits
+        )
+        entries.extend(
+            LedgerEntry(
+                account=account,
+                type="EXTERNAL_CHARGE",
+                amount=-external_charge.amount,
+                name=external_charge.bar_tab_customer.name,
+                timestamp=external_charge.created_at,
+                external_charge=external_charge,
+            )
+            for external_charge in external_charges
+        )
+        LedgerEntry.objects.bulk_create(entries, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("economy", "0016_backfill_season_standings"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_ledger, migrations.RunPython.noop),
+    ]
@@ -4,6 +4,7 @@ from django.core.validators import MinValueValidator
 from django.conf import settings
 from django.db import models
 from django.db.models import QuerySet
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 import common.models as common_models
 from django.utils.translation import gettext_lazy as _
@@ -31,6 +32,9 @@ class SociBankAccount(models.Model):
     balance = models.IntegerField(default=0, editable=False)
     card_uuid = models.CharField(max_length=50, blank=True, null=True, unique=True)
     external_charge_secret = models.CharField(max_length=64, null=True, blank=True)
+    stripe_customer_id = models.CharField(
+        max_length=255, blank=True, null=True, unique=True, editable=False
+    )
 
     objects = models.Manager()
 
@@ -75,14 +79,34 @@ class SociBankAccount(models.Model):
     def __repr__(self):
         return f"BankAccount(person={self.user},balance={self.balance})"
 
+    # Balance changes are done with an atomic update so concurrent purchases cannot
+    # overwrite each other. The in-memory balance is adjusted without refreshing.
     def add_funds(self, amount: int):
+        SociBankAccount.objects.filter(pk=self.pk).update(
+            balance=models.F("balance") + amount
+        )
         self.balance += amount
-        self.save()
 
     # This intentionally allows setting a negative balance
     def remove_funds(self, amount: int):
+        SociBankAccount.objects.filter(pk=self.pk).update(
+            balance=models.F("balance") - amount
+        )
         self.balance -= amount
-        self.save()
+
+    def try_remove_funds(self, amount: int, minimum_remaining_balance: int = 0) -> bool:
+        """
+        Removes funds only if the balance stays at or above `minimum_remaining_balance`.
+        The balance check and the update happen in a single query.
+        """
+        updated = SociBankAccount.objects.filter(
+            pk=self.pk, balance__gte=minimum_remaining_balance + amount
+        ).update(balance=models.F("balance") - amount)
+        if not updated:
+            return False
+
+        self.balance -= amount
+        return True
 
     @property
     def money_spent(self) -> int:
@@ -148,6 +172,38 @@ class SociProduct(models.Model):
         )
 
 
+class SociSessionQuerySet(models.QuerySet):
+    def with_totals(self):
+        """
+        Annotates every session with `revenue`, `product_order_count` and
+        `customer_count`. Closed sessions use their summary columns, while open
+        sessions are aggregated with a subquery each.
+        """
+        product_orders = (
+            ProductOrder.objects.filter(session=models.OuterRef("pk"))
+            .order_by()
+            .values("session")
+        )
+
+        def session_total(aggregate):
+            return models.Subquery(
+                product_orders.annotate(total=aggregate).values("total"),
+                output_field=models.IntegerField(),
+            )
+
+        return self.annotate(
+            revenue=Coalesce("summary_revenue", session_total(models.Sum("cost")), 0),
+            product_order_count=Coalesce(
+                "summary_product_order_count", session_total(models.Count("id")), 0
+            ),
+            customer_count=Coalesce(
+                "summary_customer_count",
+                session_total(models.Count("source", distinct=True)),
+                0,
+            ),
+        )
+
+
 class SociSession(models.Model):
     """
     A collection of Purchases made within a specified time period.
@@ -185,6 +241,15 @@ class SociSession(models.Model):
         help_text="Required remaining balance after placing a product order on a 'KRYSSELISTE'",
     )
 
+    # Filled in when the session is closed, as no orders can be added after that
+    summary_revenue = models.IntegerField(null=True, blank=True, editable=False)
+    summary_product_order_count = models.IntegerField(
+        null=True, blank=True, editable=False
+    )
+    summary_customer_count = models.IntegerField(null=True, blank=True, editable=False)
+
+    objects = SociSessionQuerySet.as_manager()
+
     @property
     def closed(self):
         return self.closed_at is not None
@@ -208,27 +273,42 @@ class SociSession(models.Model):
         active_session = cls.get_active_session()
         if active_session:
             if active_session.product_orders.all().exists():
-                active_session.closed_at = timezone.now()
-                active_session.save()
+                active_session.close()
             else:
                 # Nothing sold in session, we delete it
                 active_session.delete()
 
+    def close(self):
+        """
+        Closes the session and stores its totals in the summary columns.
+        """
+        totals = self.product_orders.aggregate(
+            revenue=Coalesce(models.Sum("cost"), 0),
+            product_order_count=models.Count("id"),
+            customer_count=models.Count("source", distinct=True),
+        )
+        self.summary_revenue = totals["revenue"]
+        self.summary_product_order_count = totals["product_order_count"]
+        self.summary_customer_count = totals["customer_count"]
+        self.closed_at = timezone.now()
+        self.save()
+
     @property
     def total_product_orders(self) -> int:
+        if self.summary_product_order_count is not None:
+            return self.summary_product_order_count
         return self.product_orders.count()
 
     @property
     def total_revenue(self) -> int:
-
-        purchase_sums = [order.cost for order in self.product_orders.all()]
-        return sum(purchase_sums)
+        if self.summary_revenue is not None:
+            return self.summary_revenue
+        return self.product_orders.aggregate(revenue=Coalesce(models.Sum("cost"), 0))[
+            "revenue"
+        ]
 
     def __str__(self):
-        return (
-            f"SociSession {self.name} containing {self.product_orders.count()} product_orders "
-            f"between {self.created_at} and {self.closed_at}"
-        )
+        return f"SociSession {self.name} between {self.created_at} and {self.closed_at}"
 
     def __repr__(self):
         return f"SociSession(name={self.name},start={self.created_at},end={self.closed_at})"
@@ -254,7 +334,10 @@ class ProductOrder(models.Model):
     class Meta:
         verbose_name = "Product order"
         verbose_name_plural = "Product orders"
-        indexes = (models.Index(fields=["session", "source"]),)
+        indexes = (
+            models.Index(fields=["session", "source"]),
+            models.Index(fields=["source", "purchased_at"]),
+        )
 
     product = models.ForeignKey("SociProduct", on_delete=models.CASCADE)
 
@@ -514,6 +597,11 @@ class SociOrderSessionOrder(models.Model):
         related_name="user_session_orders",
     )
     amount = models.IntegerField(null=False, blank=False)
+    cost = models.IntegerField(
+        null=True,
+        blank=True,
+        help_text="What the user was charged when ordering, if charged right away",
+    )
     ordered_at = models.DateTimeField(auto_now_add=True)
 
 
@@ -566,3 +654,242 @@ class SociRankedSeason(models.Model):
     season_start_date = models.DateField()
     season_end_date = models.DateField(default=None, blank=True, null=True)
     participants = models.ManyToManyField(User)
+
+
+class SociRankedSeasonStanding(models.Model):
+    """
+    The amount a participant has spent during a ranked season. Kept up to date as
+    product orders are placed and undone, so the leaderboard never has to sum orders.
+    """
+
+    class Meta:
+        verbose_name = "Soci ranked season standing"
+        verbose_name_plural = "Soci ranked season standings"
+        unique_together = ("season", "user")
+        indexes = (models.Index(fields=["season", "-expenditure"]),)
+
+    season = models.ForeignKey(
+        SociRankedSeason, on_delete=models.CASCADE, related_name="standings"
+    )
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="ranked_season_standings"
+    )
+    expenditure = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user} has spent {self.expenditure} kr in season {self.season_id}"
+
+
+class LedgerEntry(models.Model):
+    """
+    An append-only record of a single change to the balance of a Soci bank account.
+    Every money movement writes one entry per affected account, so the transaction
+    history of an account can be read a page at a time instead of being rebuilt from
+    product orders, transfers and deposits.
+    """
+
+    class Meta:
+        verbose_name = "Ledger entry"
+        verbose_name_plural = "Ledger entries"
+        indexes = (models.Index(fields=["account", "timestamp"]),)
+
+    class Type(models.TextChoices):
+        PRODUCT_ORDER = "PRODUCT_ORDER", _("Product order")
+        TRANSFER = "TRANSFER", _("Transfer")
+        DEPOSIT = "DEPOSIT", _("Deposit")
+        DEPOSIT_REFUND = "DEPOSIT_REFUND", _("Deposit refund")
+        EXTERNAL_CHARGE = "EXTERNAL_CHARGE", _("External charge")
+        UNDO = "UNDO", _("Undo")
+        ADJUSTMENT = "ADJUSTMENT", _("Adjustment")
+
+    account = models.ForeignKey(
+        SociBankAccount, on_delete=models.CASCADE, related_name="ledger_entries"
+    )
+    type = models.CharField(max_length=32, choices=Type.choices)
+    amount = models.IntegerField(help_text="Signed change to the account balance")
+    name = models.CharField(max_length=255)
+    quantity = models.IntegerField(null=True, blank=True)
+    timestamp = models.DateTimeField(default=timezone.now)
+
+    product_order = models.ForeignKey(
+        ProductOrder,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="ledger_entries",
+    )
+    transfer = models.ForeignKey(
+        Transfer,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="ledger_entries",
+    )
+    deposit = models.ForeignKey(
+        Deposit,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="ledger_entries",
+    )
+    external_charge = models.ForeignKey(
+        ExternalCharge,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="ledger_entries",
+    )
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Ledger entries are append-only and cannot be changed")
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.get_type_display()} of {self.amount} kr for {self.account.user}"
+
+    def __repr__(self):
+        return f"LedgerEntry(account={self.account_id},type={self.type},amount={self.amount})"
+
+
+class BalanceReconciliation(models.Model):
+    """
+    A run of the balance reconciliation. The start of the last finished run is the
+    checkpoint used when reconciling incrementally.
+    """
+
+    class Meta:
+        verbose_name = "Balance reconciliation"
+        verbose_name_plural = "Balance reconciliations"
+
+    started_at = models.DateTimeField(default=timezone.now)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    since = models.DateTimeField(
+        null=True, blank=True, help_text="Only accounts with activity since this time"
+    )
+    repair = models.BooleanField(default=False)
+    accounts_checked = models.IntegerField(default=0)
+    accounts_with_drift = models.IntegerField(default=0)
+    total_drift = models.IntegerField(default=0)
+
+    @classmethod
+    def get_checkpoint(cls) -> Optional[timezone.datetime]:
+        last_run = (
+            cls.objects.filter(finished_at__isnull=False)
+            .order_by("-started_at")
+            .first()
+        )
+        return last_run.started_at if last_run else None
+
+    def __str__(self):
+        return f"Balance reconciliation started {self.started_at}"
+
+
+class DailyAccountSpend(models.Model):
+    """
+    The total amount spent on product orders by an account on a single day in
+    TIME_ZONE. Rolled up from product orders so long expenditure series do not
+    have to aggregate every order an account has made.
+    """
+
+    class Meta:
+        verbose_name = "Daily account spend"
+        verbose_name_plural = "Daily account spend"
+        unique_together = ("account", "day")
+
+    account = models.ForeignKey(
+        SociBankAccount, on_delete=models.CASCADE, related_name="daily_spend"
+    )
+    day = models.DateField()
+    total = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.account.user} spent {self.total} kr on {self.day}"
+
+
+class StripeWebhookEvent(models.Model):
+    """
+    A Stripe webhook event as it was received. The webhook stores and processes the
+    event, and the processstripeevents command retries the events that failed, in the
+    order Stripe created them. Stripe retries deliveries, so events are unique by their
+    Stripe id.
+    """
+
+    class Meta:
+        verbose_name = "Stripe webhook event"
+        verbose_name_plural = "Stripe webhook events"
+        indexes = [models.Index(fields=["status", "stripe_created_at", "id"])]
+
+    class Status(models.TextChoices):
+        PENDING = "PENDING", "Pending"
+        PROCESSED = "PROCESSED", "Processed"
+        IGNORED = "IGNORED", "Ignored"
+        FAILED = "FAILED", "Failed"
+
+    stripe_event_id = models.CharField(max_length=255, unique=True)
+    type = models.CharField(max_length=255)
+    payment_intent_id = models.CharField(max_length=64, blank=True, db_index=True)
+    payload = models.JSONField()
+    stripe_created_at = models.DateTimeField()
+
+    status = models.CharField(
+        max_length=16, choices=Status.choices, default=Status.PENDING
+    )
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True, default="")
+    received_at = models.DateTimeField(default=timezone.now)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Stripe event {self.stripe_event_id} ({self.type})"
+
+
+class DebtCollectionRun(models.Model):
+    """
+    A run of the debt collection. Every debtor found when the run started gets a
+    notice, and a run is finished once all of its notices have been sent or have run
+    out of attempts, so an interrupted run is resumed where it stopped.
+    """
+
+    class Meta:
+        verbose_name = "Debt collection run"
+        verbose_name_plural = "Debt collection runs"
+
+    started_at = models.DateTimeField(default=timezone.now)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    all_users = models.BooleanField(default=False)
+
+    @classmethod
+    def get_unfinished_run(cls) -> Optional["DebtCollectionRun"]:
+        return (
+            cls.objects.filter(finished_at__isnull=True).order_by("-started_at").first()
+        )
+
+    def __str__(self):
+        return f"Debt collection started {self.started_at}"
+
+
+class DebtCollectionNotice(models.Model):
+    """
+    The debt collection email a user is sent in a run, with the balance it was sent
+    for.
+    """
+
+    class Meta:
+        verbose_name = "Debt collection notice"
+        verbose_name_plural = "Debt collection notices"
+        unique_together = ("run", "user")
+
+    run = models.ForeignKey(
+        DebtCollectionRun, on_delete=models.CASCADE, related_name="notices"
+    )
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="debt_collection_notices"
+    )
+    balance = models.IntegerField()
+    sent_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True, default="")
+
+    def __str__(self):
+        return f"Debt collection notice to {self.user} for {self.balance} kr"
@@ -1,7 +1,9 @@
+import bisect
 import math
+from collections import defaultdict
+from itertools import accumulate
+from typing import Iterable, List, Tuple
 
-from django.db.models.functions import Coalesce
-from django.db.models import Sum
 from django.utils import timezone
 from economy.models import (
     ProductOrder,
@@ -12,6 +14,10 @@ from economy.models import (
 from django.conf import settings
 
 
+STOCK_PRICE_HISTORY_DENSITY = timezone.timedelta(minutes=1)
+STOCK_PRICE_HISTORY_SPAN = timezone.timedelta(minutes=30)
+
+
 def calculate_stock_price_for_product(
     product_id: int, back_in_time_offset=timezone.timedelta(), fail_silently=True
 ):
@@ -19,53 +25,158 @@ def calculate_stock_price_for_product(
     Calculates the price of a product provided a specific product id.
     """
     product = SociProduct.objects.get(id=product_id)
+    engine = StockMarketPriceEngine([product], history_span=back_in_time_offset)
+    return engine.price(
+        product.id,
+        back_in_time_offset=back_in_time_offset,
+        fail_silently=fail_silently,
+    )
 
-    if not product.purchase_price:
-        if fail_silently:
-            return product.price
-        else:
-            raise RuntimeError(
-                f"Cannot calculate stock price for product without purchase price: {product}"
-            )
 
-    purchase_window_start = timezone.now() - settings.STOCK_MODE_PRICE_WINDOW
+def get_stock_market_products():
+    return SociProduct.objects.filter(
+        purchase_price__isnull=False, hide_from_api=False
+    ).order_by("name")
 
-    latest_crash = StockMarketCrash.objects.all().order_by("-timestamp").first()
-    if latest_crash:
-        crash_timestamp = latest_crash.timestamp
-    else:
-        crash_timestamp = purchase_window_start
 
-    purchase_window_start -= back_in_time_offset
-    purchase_window_end = timezone.now() - back_in_time_offset
+class StockMarketPriceEngine:
+    """
+    Batch version of `calculate_stock_price_for_product`. All sales events (product orders
+    and ghost orders) in the lookback window of the given products are loaded in two queries,
+    after which any price within `history_span` back in time is answered from per-product
+    prefix sums without touching the database.
 
-    purchases_made_in_window = ProductOrder.objects.filter(
-        product_id=product_id,
-        purchased_at__gte=purchase_window_start,
-        purchased_at__lte=purchase_window_end,
-    ).filter(
-        purchased_at__gte=crash_timestamp,
-    )
+    The price window semantics are identical to `calculate_stock_price_for_product`, including
+    the lower bound given by the latest market crash.
+    """
 
-    purchase_volume = purchases_made_in_window.aggregate(
-        volume=Coalesce(Sum("order_size"), 0)
-    )["volume"]
+    def __init__(
+        self,
+        products: Iterable[SociProduct],
+        now=None,
+        history_span=STOCK_PRICE_HISTORY_SPAN,
+    ):
+        self.now = now or timezone.now()
+        self.products = {product.id: product for product in products}
 
-    ghost_volume = (
-        ProductGhostOrder.objects.filter(
-            product=product,
-            timestamp__gte=purchase_window_start,
-            timestamp__lte=purchase_window_end,
+        window_start = self.now - settings.STOCK_MODE_PRICE_WINDOW
+        latest_crash = StockMarketCrash.objects.all().order_by("-timestamp").first()
+        self.crash_timestamp = latest_crash.timestamp if latest_crash else window_start
+
+        # Event timestamps and cumulative volumes per product, sorted by timestamp
+        self._timestamps = {}
+        self._cumulative_volumes = {}
+
+        stock_product_ids = [
+            product_id
+            for product_id, product in self.products.items()
+            if product.purchase_price
+        ]
+        if stock_product_ids:
+            self._load_sales_events(stock_product_ids, history_span)
+
+    def _load_sales_events(self, product_ids: List[int], history_span):
+        lookback_start = max(
+            self.now - settings.STOCK_MODE_PRICE_WINDOW - history_span,
+            self.crash_timestamp,
         )
-        .filter(
-            timestamp__gte=crash_timestamp,
+
+        events = defaultdict(list)
+        orders = ProductOrder.objects.filter(
+            product_id__in=product_ids,
+            purchased_at__gte=lookback_start,
+            purchased_at__lte=self.now,
+        ).values_list("product_id", "purchased_at", "order_size")
+        for product_id, purchased_at, order_size in orders:
+            events[product_id].append((purchased_at, order_size))
+
+        ghost_orders = ProductGhostOrder.objects.filter(
+            product_id__in=product_ids,
+            timestamp__gte=lookback_start,
+            timestamp__lte=self.now,
+        ).values_list("product_id", "timestamp")
+        for product_id, timestamp in ghost_orders:
+            events[product_id].append((timestamp, 1))
+
+        for product_id, product_events in events.items():
+            product_events.sort(key=lambda event: event[0])
+            self._timestamps[product_id] = [event[0] for event in product_events]
+            self._cumulative_volumes[product_id] = [0] + list(
+                accumulate(event[1] for event in product_events)
+            )
+
+    def sales_volume(self, product_id: int, window_start, window_end) -> int:
+        """
+        Sum of sales volume for a product in the inclusive range [window_start, window_end]
+        """
+        timestamps = self._timestamps.get(product_id)
+        if not timestamps:
+            return 0
+
+        cumulative_volumes = self._cumulative_volumes[product_id]
+        lower = bisect.bisect_left(timestamps, window_start)
+        upper = bisect.bisect_right(timestamps, window_end)
+        if upper <= lower:
+            return 0
+        return cumulative_volumes[upper] - cumulative_volumes[lower]
+
+    def price(
+        self,
+        product_id: int,
+        back_in_time_offset=timezone.timedelta(),
+        fail_silently=True,
+    ) -> int:
+        product = self.products[product_id]
+
+        if not product.purchase_price:
+            if fail_silently:
+                return product.price
+            else:
+                raise RuntimeError(
+                    f"Cannot calculate stock price for product without purchase price: {product}"
+                )
+
+        window_end = self.now - back_in_time_offset
+        window_start = max(
+            window_end - settings.STOCK_MODE_PRICE_WINDOW, self.crash_timestamp
         )
-        .count()
-    )
 
-    total_sales_volume = ghost_volume + purchase_volume
-    popularity_tax = total_sales_volume * settings.STOCK_MODE_PRICE_MULTIPLIER
-    product = SociProduct.objects.get(id=product_id)
+        total_sales_volume = self.sales_volume(product_id, window_start, window_end)
+        popularity_tax = total_sales_volume * settings.STOCK_MODE_PRICE_MULTIPLIER
+        return math.floor(product.purchase_price + popularity_tax)
 
-    calculated_price = math.floor(product.purchase_price + popularity_tax)
-    return calculated_price
+    def price_history(
+        self,
+        product_id: int,
+        span=STOCK_PRICE_HISTORY_SPAN,
+        density=STOCK_PRICE_HISTORY_DENSITY,
+    ) -> List[Tuple[timezone.datetime, int]]:
+        """
+        Returns a list of (timestamp, price) tuples from `span` back in time until now,
+        one data point for every `density` interval, both endpoints included.
+        """
+        data_points = int(span / density) + 1
+        starting_point = self.now - span
+
+        history = []
+        for index in range(data_points):
+            cursor = starting_point + density * index
+            price = self.price(product_id, back_in_time_offset=self.now - cursor)
+            history.append((cursor, price))
+
+        return history
+
+
+def calculate_stock_prices_for_products(
+    products: Iterable[SociProduct], back_in_time_offset=timezone.timedelta()
+) -> dict:
+    """
+    Returns a dict of product id to current stock price for all given products. Products
+    without a purchase price resolve to their ordinary price.
+    """
+    products = list(products)
+    engine = StockMarketPriceEngine(products, history_span=back_in_time_offset)
+    return {
+        product.id: engine.price(product.id, back_in_time_offset=back_in_time_offset)
+        for product in products
+    }
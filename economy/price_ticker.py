@@ -0,0 +1,259 @@
+import logging
+import math
+import threading
+from typing import Dict, List
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.utils import timezone
+from graphql_relay import to_global_id
+
+from economy.models import (
+    ProductGhostOrder,
+    ProductOrder,
+    SociProduct,
+    StockMarketCrash,
+)
+from economy.price_strategies import STOCK_PRICE_HISTORY_SPAN
+
+logger = logging.getLogger(__name__)
+
+STOCK_MARKET_GROUP_NAME = "stock-market"
+
+
+def _minute(timestamp) -> int:
+    return int(timestamp.timestamp() // 60)
+
+
+class StockPriceTicker:
+    """
+    Per-process ticker keeping the sales volume of every stock mode product in ring buffers
+    of one-minute buckets. The buffers span the price window plus the price history shown on
+    the stock market screen, so reading a price never touches the database.
+
+    Sales recorded in this process are added to the buckets immediately. Sales recorded by
+    other workers are picked up when the ticker resyncs from the database, which happens on
+    first use, including the first recorded sale, and then every
+    `STOCK_MODE_TICKER_RESYNC_INTERVAL`.
+    """
+
+    def __init__(self, history_span=STOCK_PRICE_HISTORY_SPAN):
+        self.window_minutes = int(
+            settings.STOCK_MODE_PRICE_WINDOW.total_seconds() // 60
+        )
+        self.history_minutes = int(history_span.total_seconds() // 60)
+        self.size = self.window_minutes + self.history_minutes + 1
+
+        self._lock = threading.RLock()
+        self._volumes: Dict[int, List[int]] = {}
+        self._bucket_minutes: Dict[int, List[int]] = {}
+        self._crash_minute = None
+        self._synced_at = None
+
+    def invalidate(self):
+        """
+        Drops all buckets, forcing a rebuild from the database on next use.
+        """
+        with self._lock:
+            self._volumes = {}
+            self._bucket_minutes = {}
+            self._crash_minute = None
+            self._synced_at = None
+
+    def rebuild(self, now=None):
+        now = now or timezone.now()
+        lookback_start = now - settings.STOCK_MODE_PRICE_WINDOW
+        lookback_start -= timezone.timedelta(minutes=self.history_minutes)
+
+        latest_crash = StockMarketCrash.objects.all().order_by("-timestamp").first()
+        if latest_crash:
+            lookback_start = max(lookback_start, latest_crash.timestamp)
+
+        orders = ProductOrder.objects.filter(
+            product__purchase_price__isnull=False,
+            purchased_at__gte=lookback_start,
+            purchased_at__lte=now,
+        ).values_list("product_id", "purchased_at", "order_size")
+        ghost_orders = ProductGhostOrder.objects.filter(
+            product__purchase_price__isnull=False,
+            timestamp__gte=lookback_start,
+            timestamp__lte=now,
+        ).values_list("product_id", "timestamp")
+
+        with self._lock:
+            self._volumes = {}
+            self._bucket_minutes = {}
+            self._crash_minute = (
+                _minute(latest_crash.timestamp) if latest_crash else None
+            )
+            for product_id, purchased_at, order_size in orders:
+                self._add(product_id, order_size, _minute(purchased_at))
+            for product_id, timestamp in ghost_orders:
+                self._add(product_id, 1, _minute(timestamp))
+            self._synced_at = now
+
+    def _ensure_synced(self, now):
+        if (
+            self._synced_at is None
+            or now - self._synced_at >= settings.STOCK_MODE_TICKER_RESYNC_INTERVAL
+        ):
+            self.rebuild(now=now)
+
+    def _add(self, product_id: int, volume: int, minute: int):
+        volumes = self._volumes.setdefault(product_id, [0] * self.size)
+        bucket_minutes = self._bucket_minutes.setdefault(product_id, [None] * self.size)
+
+        slot = minute % self.size
+        if bucket_minutes[slot] != minute:
+            bucket_minutes[slot] = minute
+            volumes[slot] = 0
+        volumes[slot] += volume
+
+    def _sales_volume(self, product_id: int, first_minute: int, last_minute: int):
+        volumes = self._volumes.get(product_id)
+        if volumes is None:
+            return 0
+
+        bucket_minutes = self._bucket_minutes[product_id]
+        first_minute = max(first_minute, last_minute - self.size + 1)
+        volume = 0
+        for minute in range(first_minute, last_minute + 1):
+            slot = minute % self.size
+            if bucket_minutes[slot] == minute:
+                volume += volumes[slot]
+        return volume
+
+    def _price(self, product: SociProduct, now_minute: int, offset_minutes: int):
+        window_end = now_minute - offset_minutes
+        # Same floor as the price engine, which uses one price window back from now
+        # whenever the market has never crashed.
+        if self._crash_minute is not None:
+            floor = self._crash_minute
+        else:
+            floor = now_minute - self.window_minutes
+        window_start = max(window_end - self.window_minutes, floor)
+
+        volume = self._sales_volume(product.id, window_start, window_end)
+        popularity_tax = volume * settings.STOCK_MODE_PRICE_MULTIPLIER
+        return math.floor(product.purchase_price + popularity_tax)
+
+    def price(self, product: SociProduct, back_in_time_offset=timezone.timedelta()):
+        if not product.purchase_price:
+            return product.price
+
+        now = timezone.now()
+        offset_minutes = int(back_in_time_offset.total_seconds() // 60)
+        with self._lock:
+            self._ensure_synced(now)
+            return self._price(product, _minute(now), offset_minutes)
+
+    def price_history(self, product: SociProduct):
+        """
+        Returns a list of (timestamp, price) tuples, one for each minute of the price history.
+        """
+        now = timezone.now()
+        starting_point = now - timezone.timedelta(minutes=self.history_minutes)
+        offsets = range(self.history_minutes, -1, -1)
+
+        if not product.purchase_price:
+            return [
+                (starting_point + timezone.timedelta(minutes=index), product.price)
+                for index, _ in enumerate(offsets)
+            ]
+
+        with self._lock:
+            self._ensure_synced(now)
+            now_minute = _minute(now)
+            return [
+                (
+                    starting_point + timezone.timedelta(minutes=index),
+                    self._price(product, now_minute, offset),
+                )
+                for index, offset in enumerate(offsets)
+            ]
+
+    def record_sales(self, product: SociProduct, volume: int, timestamp=None):
+        """
+        Adds sales volume for a product and pushes a price change event to subscribers
+        if the price moved. Should be called after the sale has been committed, since a
+        ticker that has not been used yet loads the sales from the database first.
+        """
+        if not product.purchase_price:
+            return
+
+        timestamp = timestamp or timezone.now()
+        with self._lock:
+            now = timezone.now()
+            now_minute = _minute(now)
+            if _minute(timestamp) <= now_minute - self.size:
+                return
+
+            if self._synced_at is None:
+                # The committed sale is loaded with the rest, so it is taken out again
+                # to find the price before it
+                self.rebuild(now=now)
+                price = self._price(product, now_minute, 0)
+                self._add(product.id, -volume, _minute(timestamp))
+                previous_price = self._price(product, now_minute, 0)
+                self._add(product.id, volume, _minute(timestamp))
+            else:
+                previous_price = self._price(product, now_minute, 0)
+                self._add(product.id, volume, _minute(timestamp))
+                price = self._price(product, now_minute, 0)
+
+        if price != previous_price:
+            broadcast_stock_price_change(product, price, previous_price)
+
+    def reset(self, timestamp=None):
+        """
+        Clears all sales volume, used when the stock market crashes.
+        """
+        timestamp = timestamp or timezone.now()
+        with self._lock:
+            self._volumes = {}
+            self._bucket_minutes = {}
+            self._crash_minute = _minute(timestamp)
+            self._synced_at = self._synced_at or timestamp
+
+        broadcast_stock_market_crash(timestamp)
+
+
+def record_product_orders(product_orders):
+    for product_order in product_orders:
+        stock_price_ticker.record_sales(
+            product_order.product, product_order.order_size, product_order.purchased_at
+        )
+
+
+def _group_send(message: dict):
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+
+    try:
+        async_to_sync(channel_layer.group_send)(STOCK_MARKET_GROUP_NAME, message)
+    except Exception as e:
+        # The stock market screen falls back to polling, so a missing channel layer
+        # should never break a sale.
+        logger.warning(f"Unable to push stock market event. Failed with {e}.")
+
+
+def broadcast_stock_price_change(product: SociProduct, price: int, previous_price: int):
+    _group_send(
+        {
+            "type": "stock_price_change",
+            "product_id": to_global_id("SociProductNode", product.id),
+            "name": product.name,
+            "price": price,
+            "previous_price": previous_price,
+            "timestamp": timezone.now().isoformat(),
+        }
+    )
+
+
+def broadcast_stock_market_crash(timestamp):
+    _group_send({"type": "stock_market_crash", "timestamp": timestamp.isoformat()})
+
+
+stock_price_ticker = StockPriceTicker()
@@ -0,0 +1,251 @@
+import datetime
+from collections import defaultdict
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+from django.core.exceptions import SuspiciousOperation
+from django.db import transaction
+from django.db.models import Case, F, Max, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+from economy.leaderboard import record_season_spend
+from economy.ledger import write_product_order_entries
+from economy.models import (
+    ProductOrder,
+    SociBankAccount,
+    SociOrderSession,
+    SociProduct,
+    SociSession,
+)
+from economy.price_ticker import record_product_orders
+from users.models import User
+
+
+class ProductOrderLine(NamedTuple):
+    user_id: int
+    product_id: int
+    order_size: int
+
+
+class ProductOrderLineError(NamedTuple):
+    # Position of the line in the list that was placed
+    line: int
+    message: str
+
+
+class PlacedProductOrders(NamedTuple):
+    product_orders: List[ProductOrder]
+    errors: List[ProductOrderLineError]
+
+
+class SettledOrder(NamedTuple):
+    user: User
+    product: SociProduct
+    amount: int
+    # What the orders were charged when placed, or cost at the current price
+    cost: int
+    # When the user last ordered the product
+    ordered_at: datetime.datetime
+
+
+def _charge_accounts(product_orders: Sequence[ProductOrder]):
+    """
+    Charges the accounts of the product orders in one relative update
+    """
+    totals = defaultdict(int)
+    for product_order in product_orders:
+        totals[product_order.source_id] += product_order.cost
+
+    SociBankAccount.objects.filter(pk__in=totals.keys()).update(
+        balance=F("balance")
+        - Case(
+            *[When(pk=pk, then=Value(total)) for pk, total in totals.items()],
+            default=Value(0),
+        )
+    )
+
+
+def _validate_line(
+    line: ProductOrderLine, accounts, products, balances, session, overcharge
+) -> Optional[str]:
+    if line.order_size < 1:
+        return "Order size must be at least 1"
+
+    account = accounts.get(line.user_id)
+    if account is None:
+        return "User has no bank account"
+
+    product = products.get(line.product_id)
+    if product is None:
+        return "Product does not exist"
+
+    cost = product.price * line.order_size
+    remaining_balance = balances[account.id] - cost
+    can_afford = session.minimum_remaining_balance <= remaining_balance
+    if not can_afford and not overcharge and not account.is_gold:
+        return "Insufficient funds"
+
+    return None
+
+
+def place_product_orders(
+    session: SociSession,
+    lines: Sequence[ProductOrderLine],
+    overcharge: bool = False,
+    abort_on_error: bool = False,
+) -> PlacedProductOrders:
+    """
+    Places all the lines of a list typed in after the fact, such as a krysseliste, in
+    one transaction. Every line is checked like a single order would be, against the
+    balance the account has left after the lines before it. Lines that fail are
+    returned as errors while the rest are placed, unless `abort_on_error` is set, in
+    which case nothing is placed if any line fails.
+
+    The number of queries does not depend on the number of lines. Accounts and
+    products are loaded up front, every account is charged in one relative update,
+    and the orders and their ledger entries are bulk created.
+    """
+    if session.closed:
+        raise SuspiciousOperation("Cannot place order on a closed session")
+
+    with transaction.atomic():
+        accounts = {
+            account.user_id: account
+            for account in SociBankAccount.objects.select_for_update()
+            .filter(user_id__in={line.user_id for line in lines})
+            .select_related("user")
+        }
+        products = SociProduct.objects.in_bulk({line.product_id for line in lines})
+        balances = {account.id: account.balance for account in accounts.values()}
+
+        product_orders = []
+        errors = []
+        for index, line in enumerate(lines):
+            error = _validate_line(
+                line, accounts, products, balances, session, overcharge
+            )
+            if error:
+                errors.append(ProductOrderLineError(index, error))
+                continue
+
+            account = accounts[line.user_id]
+            product = products[line.product_id]
+            cost = product.price * line.order_size
+            balances[account.id] -= cost
+            product_orders.append(
+                ProductOrder(
+                    source=account,
+                    product=product,
+                    order_size=line.order_size,
+                    cost=cost,
+                    session=session,
+                )
+            )
+
+        if not product_orders or (errors and abort_on_error):
+            return PlacedProductOrders([], errors)
+
+        _charge_accounts(product_orders)
+        for account in accounts.values():
+            account.balance = balances[account.id]
+
+        product_orders = ProductOrder.objects.bulk_create(product_orders)
+        write_product_order_entries(product_orders)
+        record_season_spend(product_orders)
+        transaction.on_commit(lambda: record_product_orders(product_orders))
+
+    return PlacedProductOrders(product_orders, errors)
+
+
+def get_settled_orders(
+    order_session: SociOrderSession, product_type: str
+) -> List[SettledOrder]:
+    """
+    Sums up the orders of a stilletime by user and product, for the products of one
+    type. Takes three queries however many users have ordered.
+    """
+    rows = list(
+        order_session.orders.filter(product__type=product_type)
+        .values("user", "product")
+        # The cost is annotated before amount is, which would shadow the field
+        .annotate(
+            total_cost=Sum(Coalesce("cost", F("amount") * F("product__price"))),
+            amount=Sum("amount"),
+            ordered_at=Max("ordered_at"),
+        )
+        .order_by("user", "product")
+    )
+    users = User.objects.select_related("bank_account").in_bulk(
+        {row["user"] for row in rows}
+    )
+    products = SociProduct.objects.in_bulk({row["product"] for row in rows})
+    return [
+        SettledOrder(
+            user=users[row["user"]],
+            product=products[row["product"]],
+            amount=row["amount"],
+            cost=row["total_cost"],
+            ordered_at=row["ordered_at"],
+        )
+        for row in rows
+    ]
+
+
+def summarize_settled_orders(settled_orders: Sequence[SettledOrder]) -> List[Dict]:
+    """
+    The number of each product ordered, by product name
+    """
+    counts = defaultdict(int)
+    for settled_order in settled_orders:
+        counts[settled_order.product.name] += settled_order.amount
+    return [{"name": name, "count": count} for name, count in sorted(counts.items())]
+
+
+def settle_soci_order_session(
+    settled_orders: Sequence[SettledOrder], session: SociSession, charge: bool
+) -> List[ProductOrder]:
+    """
+    Turns the summed up orders of a stilletime into product orders in `session`, one
+    for each user and product, dated when the user last ordered the product. Food is
+    charged when the stilletime moves on to drinks, while drinks have already been
+    charged as they were ordered, so `charge` tells whether to charge the accounts.
+    Orders that were charged keep the cost they were charged.
+
+    Must be called in a transaction. The number of queries does not depend on the
+    number of orders.
+    """
+    product_orders = [
+        ProductOrder(
+            session=session,
+            product=settled_order.product,
+            order_size=settled_order.amount,
+            cost=settled_order.cost,
+            source=settled_order.user.bank_account,
+        )
+        for settled_order in settled_orders
+    ]
+    if not product_orders:
+        return []
+
+    if charge:
+        _charge_accounts(product_orders)
+
+    product_orders = ProductOrder.objects.bulk_create(product_orders)
+    # purchased_at is set to now when the orders are created
+    for product_order, settled_order in zip(product_orders, settled_orders):
+        product_order.purchased_at = settled_order.ordered_at
+    ProductOrder.objects.filter(
+        pk__in=[product_order.pk for product_order in product_orders]
+    ).update(
+        purchased_at=Case(
+            *[
+                When(pk=product_order.pk, then=Value(product_order.purchased_at))
+                for product_order in product_orders
+            ]
+        )
+    )
+
+    if charge:
+        write_product_order_entries(product_orders)
+    record_season_spend(product_orders)
+
+    return product_orders
@@ -0,0 +1,158 @@
+from datetime import datetime
+from typing import Iterator, List, NamedTuple, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Sum
+from django.db.models.functions import Coalesce
+
+from economy.models import (
+    Deposit,
+    ExternalCharge,
+    LedgerEntry,
+    ProductOrder,
+    SociBankAccount,
+    SociOrderSession,
+    SociOrderSessionOrder,
+    SociProduct,
+    Transfer,
+)
+
+
+class BalanceDrift(NamedTuple):
+    account_id: int
+    balance: int
+    expected_balance: int
+
+    @property
+    def drift(self) -> int:
+        return self.balance - self.expected_balance
+
+
+def _sum_by(queryset, group_field, total) -> dict:
+    return dict(
+        queryset.order_by()
+        .values(group_field)
+        .annotate(total=total)
+        .values_list(group_field, "total")
+    )
+
+
+def compute_expected_balances(account_ids) -> dict:
+    """
+    Recomputes the balance of the given accounts from the money movements they have
+    been part of. Uses one grouped aggregate query per kind of movement, regardless of
+    the number of accounts.
+    """
+    credits = [
+        _sum_by(
+            Deposit.objects.filter(account_id__in=account_ids, approved=True),
+            "account_id",
+            Sum(Coalesce("resolved_amount", "amount")),
+        ),
+        _sum_by(
+            Transfer.objects.filter(destination_id__in=account_ids),
+            "destination_id",
+            Sum("amount"),
+        ),
+    ]
+    debits = [
+        _sum_by(
+            ProductOrder.objects.filter(source_id__in=account_ids),
+            "source_id",
+            Sum("cost"),
+        ),
+        _sum_by(
+            Transfer.objects.filter(source_id__in=account_ids),
+            "source_id",
+            Sum("amount"),
+        ),
+        _sum_by(
+            ExternalCharge.objects.filter(bank_account_id__in=account_ids),
+            "bank_account_id",
+            Sum("amount"),
+        ),
+        # Drink orders are charged when placed, but only become product orders
+        # when the stilletime is closed. What was charged is recorded on the order,
+        # so a price change while the stilletime is open is not taken for drift
+        _sum_by(
+            SociOrderSessionOrder.objects.filter(
+                user__bank_account__in=account_ids,
+                product__type=SociProduct.Type.DRINK,
+            ).exclude(session__status=SociOrderSession.Status.CLOSED),
+            "user__bank_account",
+            Sum(Coalesce("cost", F("amount") * F("product__price"))),
+        ),
+    ]
+
+    expected = {}
+    for account_id in account_ids:
+        expected[account_id] = sum(
+            credit.get(account_id) or 0 for credit in credits
+        ) - sum(debit.get(account_id) or 0 for debit in debits)
+    return expected
+
+
+def get_accounts_with_activity_since(since: datetime) -> List[int]:
+    return list(
+        LedgerEntry.objects.filter(timestamp__gte=since)
+        .order_by("account_id")
+        .values_list("account_id", flat=True)
+        .distinct()
+    )
+
+
+def _reconcile_chunk(account_ids, repair):
+    with transaction.atomic():
+        accounts = SociBankAccount.objects.filter(pk__in=account_ids)
+        if repair:
+            # Purchases on these accounts wait until the repair is done, so the
+            # balances and the movements are read in a consistent state
+            accounts = accounts.select_for_update()
+        balances = dict(accounts.values_list("pk", "balance"))
+        expected = compute_expected_balances(list(balances))
+
+        results = [
+            BalanceDrift(account_id, balance, expected[account_id])
+            for account_id, balance in balances.items()
+        ]
+        drifted = [result for result in results if result.drift]
+        if repair and drifted:
+            for result in drifted:
+                SociBankAccount.objects.filter(pk=result.account_id).update(
+                    balance=F("balance") - result.drift
+                )
+            LedgerEntry.objects.bulk_create(
+                [
+                    LedgerEntry(
+                        account_id=result.account_id,
+                        type=LedgerEntry.Type.ADJUSTMENT,
+                        amount=-result.drift,
+                        name="Korrigering",
+                    )
+                    for result in drifted
+                ]
+            )
+
+    return results
+
+
+def reconcile_balances(
+    since: Optional[datetime] = None, repair: bool = False
+) -> Iterator[BalanceDrift]:
+    """
+    Compares the balance of every account with the balance recomputed from its money
+    movements, yielding one result per account as chunks are finished. With `since`
+    only accounts with ledger activity since then are checked. With `repair` drifting
+    balances are corrected, and an adjustment is written to the ledger of the account.
+    """
+    if since is None:
+        account_ids = list(
+            SociBankAccount.objects.order_by("pk").values_list("pk", flat=True)
+        )
+    else:
+        account_ids = get_accounts_with_activity_since(since)
+
+    chunk_size = settings.BALANCE_RECONCILIATION_CHUNK_SIZE
+    for index in range(0, len(account_ids), chunk_size):
+        yield from _reconcile_chunk(account_ids[index : index + chunk_size], repair)
@@ -0,0 +1,7 @@
+from django.urls import path
+
+from economy import consumers
+
+websocket_urlpatterns = [
+    path("ws/stock-market/", consumers.StockMarketConsumer.as_asgi()),
+]
@@ -1,7 +1,6 @@
 import datetime
 
 import graphene
-import calendar
 
 import pytz
 from django.conf import settings
@@ -23,6 +22,7 @@ from graphene_django_cud.mutations import (
 )
 from graphene_django import DjangoConnectionField
 from graphene_django_cud.util import disambiguate_id
+from graphene_file_upload.scalars import Upload
 from graphql_relay import to_global_id
 
 from common.exceptions import IllegalOperation
@@ -33,7 +33,34 @@ from common.decorators import (
     gql_login_required,
 )
 from common.util import check_feature_flag, midnight_timestamps_from_date
+from economy.bank_statements import match_bank_statement
+from economy.deposits import approve_deposits
+from economy.product_orders import (
+    ProductOrderLine,
+    get_settled_orders,
+    place_product_orders,
+    settle_soci_order_session,
+)
 from economy.emails import send_deposit_invalidated_email
+from economy.expenditures import (
+    ExpenditureDateRange,
+    ExpenditureGranularity,
+    get_expenditure_series,
+)
+from economy.leaderboard import (
+    get_current_season,
+    get_leaderboard_summary,
+    get_top_standings,
+    record_season_spend,
+    revert_season_spend,
+)
+from economy.ledger import (
+    write_deposit_entry,
+    write_deposit_refund_entry,
+    write_product_order_entries,
+    write_soci_order_session_order_entry,
+    write_undo_entry,
+)
 from economy.models import (
     SociProduct,
     Deposit,
@@ -47,7 +74,11 @@ from economy.models import (
     StockMarketCrash,
     SociRankedSeason,
 )
-from economy.price_strategies import calculate_stock_price_for_product
+from economy.price_strategies import (
+    get_stock_market_products,
+    STOCK_PRICE_HISTORY_DENSITY,
+)
+from economy.price_ticker import stock_price_ticker, record_product_orders
 from schedules.models import Schedule
 from users.models import User
 
@@ -71,10 +102,16 @@ class TotalExpenditureItem(graphene.ObjectType):
 
 
 class TotalExpenditureDateRange(graphene.Enum):
-    THIS_MONTH = "this-month"
-    THIS_SEMESTER = "this-semester"
-    ALL_SEMESTERS = "all-semesters"
-    ALL_TIME = "all-time"
+    THIS_MONTH = ExpenditureDateRange.THIS_MONTH
+    THIS_SEMESTER = ExpenditureDateRange.THIS_SEMESTER
+    ALL_SEMESTERS = ExpenditureDateRange.ALL_SEMESTERS
+    ALL_TIME = ExpenditureDateRange.ALL_TIME
+
+
+class ExpenditureGranularityEnum(graphene.Enum):
+    DAY = ExpenditureGranularity.DAY
+    WEEK = ExpenditureGranularity.WEEK
+    MONTH = ExpenditureGranularity.MONTH
 
 
 class BankAccountActivity(graphene.ObjectType):
@@ -83,6 +120,8 @@ class BankAccountActivity(graphene.ObjectType):
     amount = graphene.Int()
     quantity = graphene.Int()  # Transfer or deposit returns None for this field
     timestamp = graphene.NonNull(graphene.DateTime)
+    balance = graphene.Int()  # Balance right after the activity
+    cursor = graphene.String()  # Pass as `after` to continue from this activity
 
 
 class SociProductNode(DjangoObjectType):
@@ -106,13 +145,30 @@ class SociSessionNode(DjangoObjectType):
         interfaces = (Node,)
 
     money_spent = graphene.Int()
+    product_order_count = graphene.Int()
+    customer_count = graphene.Int()
     product_orders = graphene.List("economy.schema.ProductOrderNode")
     closed = graphene.Boolean()
     get_name_display = graphene.String()
 
+    # Sessions listed through allSociSessions come annotated by `with_totals`
     def resolve_money_spent(self: SociSession, info, *args, **kwargs):
+        if hasattr(self, "revenue"):
+            return self.revenue
         return self.total_revenue
 
+    def resolve_product_order_count(self: SociSession, info, *args, **kwargs):
+        if hasattr(self, "product_order_count"):
+            return self.product_order_count
+        return self.total_product_orders
+
+    def resolve_customer_count(self: SociSession, info, *args, **kwargs):
+        if hasattr(self, "customer_count"):
+            return self.customer_count
+        if self.summary_customer_count is not None:
+            return self.summary_customer_count
+        return self.product_orders.values("source").distinct().count()
+
     def resolve_product_orders(self: SociSession, info, *args, **kwargs):
         return (
             self.product_orders.all()
@@ -298,10 +354,6 @@ class SociProductQuery(graphene.ObjectType):
             Q(end__isnull=True) | Q(end__gte=timezone.now())
         )
 
-    @gql_has_permissions("economy.view_socisession")
-    def resolve_all_soci_sessions(self, info, *args, **kwargs):
-        return SociSession.objects.all().order_by("-created_at")
-
     @gql_has_permissions("economy.view_sociproduct")
     def resolve_default_soci_products(self, info, *args, **kwargs):
         return SociProduct.objects.filter(default_stilletime_product=True)
@@ -435,9 +487,9 @@ class SociSessionQuery(graphene.ObjectType):
     soci_session = Node.Field(SociSessionNode)
     all_soci_sessions = DjangoConnectionField(SociSessionNode)
 
+    @gql_has_permissions("economy.view_socisession")
     def resolve_all_soci_sessions(self, info, *args, **kwargs):
-        SociSession.objects.all().delete()
-        return SociSession.objects.all().order_by("created_at")
+        return SociSession.objects.with_totals().order_by("-created_at")
 
 
 class SociBankAccountQuery(graphene.ObjectType):
@@ -445,7 +497,9 @@ class SociBankAccountQuery(graphene.ObjectType):
     all_soci_bank_accounts = DjangoConnectionField(SociBankAccountNode)
     my_bank_account = graphene.Field(graphene.NonNull(SociBankAccountNode))
     my_expenditures = graphene.Field(
-        TotalExpenditure, date_range=TotalExpenditureDateRange()
+        TotalExpenditure,
+        date_range=TotalExpenditureDateRange(required=True),
+        granularity=ExpenditureGranularityEnum(),
     )
     my_external_charge_qr_code_url = graphene.String()
 
@@ -457,50 +511,16 @@ class SociBankAccountQuery(graphene.ObjectType):
     def resolve_all_soci_bank_accounts(self, info, *args, **kwargs):
         return SociBankAccount.objects.all()
 
-    def resolve_my_expenditures(self, info, date_range, *args, **kwargs):
-        data = []
-        total = 0
-
+    def resolve_my_expenditures(
+        self, info, date_range, granularity=None, *args, **kwargs
+    ):
         my_bank_account = info.context.user.bank_account
-
-        cal = calendar.Calendar()
-        today = datetime.date.today()
-        iterator = cal.itermonthdates(today.year, today.month)
-        for day in iterator:
-            # Won't be any more data in the future
-            if day > today:
-                data.append(ExpenditureDay(day=day, sum=0))
-                continue
-
-            # The iterator returns days in prev month if they are contained in within the first week
-            if day.month != today.month:
-                continue
-
-            # Create a day datetime range for each day
-            day_min = timezone.make_aware(
-                timezone.datetime(
-                    year=day.year,
-                    month=day.month,
-                    day=day.day,
-                    hour=0,
-                    minute=0,
-                    second=0,
-                ),
-                timezone=pytz.timezone(settings.TIME_ZONE),
-            )
-            day_max = day_min + timezone.timedelta(hours=23, minutes=59, seconds=59)
-            # https://blog.zdsmith.com/posts/comparing-dates-and-datetimes-in-the-django-orm.html
-
-            purchases = my_bank_account.product_orders.filter(
-                purchased_at__range=(day_min, day_max)
-            )
-            purchase_sum = purchases.aggregate(purchase_sum=Coalesce(Sum("cost"), 0))[
-                "purchase_sum"
-            ]
-            expenditure_day = ExpenditureDay(day=day, sum=purchase_sum)
-            total += purchase_sum
-            data.append(expenditure_day)
-
+        series, total = get_expenditure_series(
+            my_bank_account,
+            date_range.value,
+            granularity.value if granularity else None,
+        )
+        data = [ExpenditureDay(day=day, sum=amount) for day, amount in series]
         return TotalExpenditure(data=data, total=total)
 
     def resolve_my_external_charge_qr_code_url(self, info, *args, **kwargs):
@@ -617,16 +637,13 @@ class StockMarketQuery(graphene.ObjectType):
 
     @gql_login_required()
     def resolve_stock_market_products(self, info, *args, **kwargs):
-        products = SociProduct.objects.filter(
-            purchase_price__isnull=False, hide_from_api=False
-        ).order_by("name")
+        products = get_stock_market_products()
 
         data = []
         for product in products:
-            # Probably some optimization possibilities here instead of hitting the method twice
-            price = calculate_stock_price_for_product(product.id)
-            prev_price = calculate_stock_price_for_product(
-                product.id, back_in_time_offset=timezone.timedelta(minutes=1)
+            price = stock_price_ticker.price(product)
+            prev_price = stock_price_ticker.price(
+                product, back_in_time_offset=STOCK_PRICE_HISTORY_DENSITY
             )
             diff = price - prev_price
             percentage_diff = (float(price) - float(prev_price)) / float(price)
@@ -653,25 +670,14 @@ class StockMarketQuery(graphene.ObjectType):
 
     @gql_login_required()
     def resolve_stock_price_history(self, info, *args, **kwargs):
-        products = SociProduct.objects.filter(
-            purchase_price__isnull=False, hide_from_api=False
-        ).order_by("name")
+        products = get_stock_market_products()
 
         data = []
-
-        DENSITY = timezone.timedelta(minutes=1)
-        STARTING_POINT = timezone.now() - timezone.timedelta(minutes=30)
-        cursor = STARTING_POINT
         for product in products:
-            product_data = []
-            for i in range(31):
-                price = calculate_stock_price_for_product(
-                    product.id,
-                    back_in_time_offset=timezone.now() - cursor,  # THIS IS A DELTA
-                )
-                point = StockMarketProductDataPoint(price=price, timestamp=cursor)
-                product_data.append(point)
-                cursor += DENSITY
+            product_data = [
+                StockMarketProductDataPoint(price=price, timestamp=timestamp)
+                for timestamp, price in stock_price_ticker.price_history(product)
+            ]
 
             history = StockMarketProductHistory(
                 data_points=product_data,
@@ -679,7 +685,6 @@ class StockMarketQuery(graphene.ObjectType):
                 product_id=product.id,
             )
             data.append(history)
-            cursor = STARTING_POINT
 
         return data
 
@@ -711,84 +716,39 @@ class SociRankedQuery(graphene.ObjectType):
     def resolve_current_ranked_season(self, info, *args, **kwargs):
         current_user = info.context.user
 
-        current_season = (
-            SociRankedSeason.objects.all().order_by("season_start_date").last()
-        )
+        current_season = get_current_season()
 
         if not current_season:
             return CurrentRankSeason(
                 is_participant=False, season_expenditure=0, placement=None
             )
 
-        season_start_datetime = timezone.make_aware(
-            timezone.datetime(
-                year=current_season.season_start_date.year,
-                month=current_season.season_start_date.month,
-                day=current_season.season_start_date.day,
-                hour=0,
-                minute=0,
-                second=0,
-            ),
-            timezone=pytz.timezone(settings.TIME_ZONE),
-        )
-
-        season_filter = Q(
-            bank_account__product_orders__purchased_at__gte=season_start_datetime
-        )
-
-        if current_season.season_end_date:
-            _, season_end_datetime = midnight_timestamps_from_date(
-                current_season.season_end_date
-            )
-            season_filter = season_filter & Q(
-                bank_account__product_orders__purchased_at__lte=season_end_datetime
-            )
-
-        leaderboard = current_season.participants.annotate(
-            expenditure=Coalesce(
-                Sum("bank_account__product_orders__cost", filter=season_filter), 0
-            ),
-        ).order_by("-expenditure")
-
-        is_participant = current_season.participants.filter(id=current_user.id).exists()
-        if not is_participant and not current_user.is_superuser:
+        summary = get_leaderboard_summary(current_season, current_user)
+        standing = summary["standing"]
+        if standing is None and not current_user.is_superuser:
             return CurrentRankSeason(
                 is_participant=False,
                 season_expenditure=0,
                 placement=None,
-                participant_count=leaderboard.count(),
+                participant_count=summary["participant_count"],
             )
 
-        placement = 0
-        user_expenditure = 0
-
-        for index, entry in enumerate(leaderboard):
-            # I'm terrible at complex query expressions in Django
-            # - Alexander Orvik 25-10-2024
-            if entry.id == current_user.id:
-                placement = index + 1
-                user_expenditure = entry.expenditure
-                break
-
-        top_ten = leaderboard[0:10]
-
-        top_ten_data_list = []
-        for entry in top_ten:
-            top_ten_data_list.append(
-                LeaderboardEntry(
-                    name=entry.get_full_name(), expenditure=entry.expenditure
-                )
+        top_ten_data_list = [
+            LeaderboardEntry(
+                name=entry.user.get_full_name(), expenditure=entry.expenditure
             )
+            for entry in get_top_standings(current_season, 10)
+        ]
 
         return CurrentRankSeason(
             is_participant=True,
-            season_expenditure=user_expenditure,
-            placement=placement,
+            season_expenditure=standing.expenditure if standing else 0,
+            placement=summary["placement"] or 0,
             top_ten=top_ten_data_list,
             season_start=current_season.season_start_date,
             season_end=current_season.season_end_date,
-            participant_count=leaderboard.count(),
-            ranked_season=SociRankedSeason.objects.all().count(),
+            participant_count=summary["participant_count"],
+            ranked_season=current_season.season_count,
         )
 
 
@@ -834,6 +794,8 @@ class UndoProductOrderMutation(graphene.Mutation):
         account = product_order.source
         with transaction.atomic():
             account.add_funds(product_order.cost)
+            write_undo_entry(product_order)
+            revert_season_spend(product_order)
             product_order.delete()
         return UndoProductOrderMutation(found=True)
 
@@ -895,6 +857,9 @@ class PlaceProductOrderMutation(graphene.Mutation):
                 cost=cost,
                 session=session,
             )
+            write_product_order_entries([product_order])
+            record_season_spend([product_order])
+            transaction.on_commit(lambda: record_product_orders([product_order]))
             return PlaceProductOrderMutation(product_order=product_order)
 
         # Cannot afford it and overcharge is not allowed
@@ -909,9 +874,75 @@ class PlaceProductOrderMutation(graphene.Mutation):
             cost=cost,
             session=session,
         )
+        write_product_order_entries([product_order])
+        record_season_spend([product_order])
+        transaction.on_commit(lambda: record_product_orders([product_order]))
         return PlaceProductOrderMutation(product_order=product_order)
 
 
+class ProductOrderLineInput(graphene.InputObjectType):
+    user_id = graphene.ID(required=True)
+    product_id = graphene.ID(required=True)
+    order_size = graphene.Int(required=True)
+
+
+class ProductOrderLineErrorNode(graphene.ObjectType):
+    line = graphene.Int()
+    message = graphene.String()
+
+
+class PlaceProductOrdersMutation(graphene.Mutation):
+    class Arguments:
+        soci_session_id = graphene.ID(required=True)
+        orders = graphene.List(graphene.NonNull(ProductOrderLineInput), required=True)
+        overcharge = graphene.Boolean(required=False)
+        abort_on_error = graphene.Boolean(required=False)
+
+    product_orders = graphene.List(ProductOrderNode)
+    errors = graphene.List(ProductOrderLineErrorNode)
+
+    @gql_has_permissions("economy.add_productorder")
+    def mutate(
+        self,
+        info,
+        soci_session_id,
+        orders,
+        overcharge=False,
+        abort_on_error=False,
+        *args,
+        **kwargs,
+    ):
+        """
+        Places every line of a list typed in after the fact, like a krysseliste, at once.
+        Lines that cannot be placed are returned as errors, by their position in the
+        list, and do not stop the other lines unless abortOnError is set.
+        """
+        request_user = info.context.user
+        if overcharge and not request_user.has_perm("economy.can_overcharge"):
+            raise PermissionDenied("You do not have permission to overcharge")
+
+        soci_session_id = disambiguate_id(soci_session_id)
+        session = SociSession.objects.get(id=soci_session_id)
+        lines = [
+            ProductOrderLine(
+                user_id=int(disambiguate_id(order.user_id)),
+                product_id=int(disambiguate_id(order.product_id)),
+                order_size=order.order_size,
+            )
+            for order in orders
+        ]
+        placed = place_product_orders(
+            session, lines, overcharge=overcharge, abort_on_error=abort_on_error
+        )
+        return PlaceProductOrdersMutation(
+            product_orders=placed.product_orders,
+            errors=[
+                ProductOrderLineErrorNode(line=error.line, message=error.message)
+                for error in placed.errors
+            ],
+        )
+
+
 class CreateSociSessionMutation(DjangoCreateMutation):
     class Meta:
         model = SociSession
@@ -950,8 +981,7 @@ class CloseSociSessionMutation(graphene.Mutation):
             soci_session.delete()
             return CloseSociSessionMutation(soci_session=None)
 
-        soci_session.closed_at = timezone.now()
-        soci_session.save()
+        soci_session.close()
         if soci_session.type == SociSession.Type.STILLETIME:
             stilletime_closed_email_notification(soci_session)
         return CloseSociSessionMutation(soci_session=soci_session)
@@ -1040,12 +1070,60 @@ class ApproveDepositMutation(graphene.Mutation):
 
         deposit.save()
         deposit.account.add_funds(deposit.amount)
+        write_deposit_entry(deposit, deposit.amount)
         if deposit.account.user.notify_on_deposit:
             send_deposit_approved_email(deposit)
 
         return ApproveDepositMutation(deposit=deposit)
 
 
+class BankStatementLineData(graphene.ObjectType):
+    line_number = graphene.Int()
+    date = graphene.Date()
+    text = graphene.String()
+    amount = graphene.Int()
+
+
+class BankStatementDepositMatch(graphene.ObjectType):
+    line = graphene.Field(BankStatementLineData)
+    deposit = graphene.Field(DepositNode)
+    match_type = graphene.String()
+
+
+class MatchBankStatementMutation(graphene.Mutation):
+    """
+    Matches the incoming payments of a bank statement CSV export with pending deposits.
+    Nothing is approved, the matches are returned for review and can then be approved
+    with BulkApproveDepositsMutation
+    """
+
+    class Arguments:
+        statement_file = Upload(required=True)
+
+    matches = graphene.List(BankStatementDepositMatch)
+    unmatched_lines = graphene.List(BankStatementLineData)
+
+    @gql_has_permissions("economy.approve_deposit")
+    def mutate(self, info, statement_file, *args, **kwargs):
+        matches, unmatched_lines = match_bank_statement(statement_file)
+        return MatchBankStatementMutation(
+            matches=matches, unmatched_lines=unmatched_lines
+        )
+
+
+class BulkApproveDepositsMutation(graphene.Mutation):
+    class Arguments:
+        deposit_ids = graphene.List(graphene.ID, required=True)
+
+    deposits = graphene.List(DepositNode)
+
+    @gql_has_permissions("economy.approve_deposit")
+    def mutate(self, info, deposit_ids, *args, **kwargs):
+        deposit_ids = [disambiguate_id(deposit_id) for deposit_id in deposit_ids]
+        deposits = approve_deposits(deposit_ids, approved_by=info.context.user)
+        return BulkApproveDepositsMutation(deposits=deposits)
+
+
 class InvalidateDepositMutation(graphene.Mutation):
     class Arguments:
         deposit_id = graphene.ID(required=True)
@@ -1069,6 +1147,7 @@ class InvalidateDepositMutation(graphene.Mutation):
         deposit.approved = False
         deposit.save()
         deposit.account.remove_funds(deposit.resolved_amount)
+        write_deposit_refund_entry(deposit, deposit.resolved_amount)
         if deposit.account.user.notify_on_deposit:
             send_deposit_invalidated_email(deposit)
 
@@ -1142,34 +1221,18 @@ class SociOrderSessionNextStatusMutation(graphene.Mutation):
             from economy.utils import create_food_order_pdf_file
 
             with transaction.atomic():
-                orders = soci_order_session.orders.filter(
-                    product__type=SociProduct.Type.FOOD
+                settled_orders = get_settled_orders(
+                    soci_order_session, SociProduct.Type.FOOD
                 )
                 session = SociSession.objects.create(
                     type=SociSession.Type.BURGERLISTE,
                     created_by=info.context.user,
                 )
-                for order in orders:
-                    price = order.product.price
-                    amount = order.amount
-                    total = price * amount
-
-                    purchase = ProductOrder.objects.create(
-                        session=session,
-                        product=order.product,
-                        order_size=order.amount,
-                        cost=total,
-                        source=order.user.bank_account,
-                    )
-                    purchase.purchased_at = order.ordered_at
-                    purchase.save()
-                    order.user.bank_account.remove_funds(total)
-
-                session.closed_at = timezone.now()
-                session.save()
+                settle_soci_order_session(settled_orders, session, charge=True)
+                session.close()
 
                 soci_order_session.status = SociOrderSession.Status.DRINK_ORDERING
-                file = create_food_order_pdf_file(soci_order_session)
+                file = create_food_order_pdf_file(settled_orders)
                 soci_order_session.order_pdf.save("burgerliste.pdf", file)
                 soci_order_session.save()
 
@@ -1182,8 +1245,8 @@ class SociOrderSessionNextStatusMutation(graphene.Mutation):
                 soci_order_session.status = SociOrderSession.Status.CLOSED
                 soci_order_session.closed_at = timezone.now()
                 soci_order_session.closed_by = info.context.user
-                orders = soci_order_session.orders.filter(
-                    product__type=SociProduct.Type.DRINK
+                settled_orders = get_settled_orders(
+                    soci_order_session, SociProduct.Type.DRINK
                 )
                 session = SociSession.objects.create(
                     type=SociSession.Type.STILLETIME,
@@ -1191,25 +1254,11 @@ class SociOrderSessionNextStatusMutation(graphene.Mutation):
                 )
                 session.created_at = soci_order_session.created_at
 
-                for order in orders:
-                    # Drink orders are paid when registered. So no need to charge here
-                    price = order.product.price
-                    amount = order.amount
-                    total = price * amount
-
-                    product_order = ProductOrder.objects.create(
-                        session=session,
-                        product=order.product,
-                        order_size=order.amount,
-                        cost=total,
-                        source=order.user.bank_account,
-                    )
-                    product_order.purchased_at = order.ordered_at
-                    product_order.save()
+                # Drink orders are paid when registered. So no need to charge here
+                settle_soci_order_session(settled_orders, session, charge=False)
 
                 soci_order_session.save()
-                session.closed_at = timezone.now()
-                session.save()
+                session.close()
                 return SociOrderSessionNextStatusMutation(
                     soci_order_session=soci_order_session
                 )
@@ -1260,15 +1309,18 @@ class PlaceSociOrderSessionOrderMutation(graphene.Mutation):
             raise IllegalOperation("You do not have enough funds to place this order")
 
         with transaction.atomic():
+            charged = active_session.status == SociOrderSession.Status.DRINK_ORDERING
             order = SociOrderSessionOrder.objects.create(
                 session=active_session,
                 product=product,
                 amount=amount,
+                cost=cost if charged else None,
                 user=me,
             )
-            if active_session.status == SociOrderSession.Status.DRINK_ORDERING:
+            if charged:
                 # During drink ordering we instantly charge the user
                 me.bank_account.remove_funds(cost)
+                write_soci_order_session_order_entry(order, cost)
 
             return PlaceSociOrderSessionOrderMutation(soci_order_session_order=order)
 
@@ -1404,7 +1456,10 @@ class IncrementProductGhostOrderMutation(graphene.Mutation):
 
         product = SociProduct.objects.get(id=product_id)
 
-        ProductGhostOrder.objects.create(product=product)
+        ghost_order = ProductGhostOrder.objects.create(product=product)
+        transaction.on_commit(
+            lambda: stock_price_ticker.record_sales(product, 1, ghost_order.timestamp)
+        )
 
         return IncrementProductGhostOrderMutation(success=True)
 
@@ -1415,12 +1470,14 @@ class CrashStockMarketMutation(graphene.Mutation):
 
     @gql_has_permissions("economy.add_stockmarketcrash")
     def mutate(self, info, *args, **kwargs):
-        StockMarketCrash.objects.create()
+        crash = StockMarketCrash.objects.create()
+        transaction.on_commit(lambda: stock_price_ticker.reset(crash.timestamp))
         return CrashStockMarketMutation(success=True)
 
 
 class EconomyMutations(graphene.ObjectType):
     place_product_order = PlaceProductOrderMutation.Field()
+    place_product_orders = PlaceProductOrdersMutation.Field()
     undo_product_order = UndoProductOrderMutation.Field()
 
     create_soci_session = CreateSociSessionMutation.Field()
@@ -1433,6 +1490,8 @@ class EconomyMutations(graphene.ObjectType):
     create_deposit = CreateDepositMutation.Field()
     delete_deposit = DeleteDepositMutation.Field()
     approve_deposit = ApproveDepositMutation.Field()
+    bulk_approve_deposits = BulkApproveDepositsMutation.Field()
+    match_bank_statement = MatchBankStatementMutation.Field()
     invalidate_deposit = InvalidateDepositMutation.Field()
 
     create_soci_order_session = CreateSociOrderSessionMutation.Field()
@@ -0,0 +1,49 @@
+from django.conf import settings
+from django.db.models.signals import m2m_changed, post_save, post_delete
+from django.dispatch import receiver
+
+from economy.card_lookup import invalidate_card, invalidate_user_card
+from economy.leaderboard import rebuild_season_standings
+from economy.models import SociBankAccount, SociRankedSeason
+
+
+@receiver(post_save, sender=SociBankAccount)
+@receiver(post_delete, sender=SociBankAccount)
+def invalidate_card_lookup_for_account(sender, instance, **kwargs):
+    # The user entry points at the previously cached card, which covers card changes
+    invalidate_card(instance.card_uuid)
+    invalidate_user_card(instance.user_id)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def invalidate_card_lookup_for_user(sender, instance, **kwargs):
+    invalidate_user_card(instance.pk)
+
+
+@receiver(post_save, sender=SociRankedSeason)
+def rebuild_standings_for_season(sender, instance, created, **kwargs):
+    # The season dates may have changed, which changes what counts towards it
+    if not created:
+        rebuild_season_standings(instance)
+
+
+@receiver(m2m_changed, sender=SociRankedSeason.participants.through)
+def update_standings_for_participants(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+
+    if not reverse:
+        rebuild_season_standings(
+            instance, user_ids=pk_set if action != "post_clear" else None
+        )
+        return
+
+    # Changed from the user side, where pk_set holds season ids
+    seasons = SociRankedSeason.objects.all()
+    if action != "post_clear":
+        seasons = seasons.filter(pk__in=pk_set)
+    for season in seasons:
+        rebuild_season_standings(season, user_ids=[instance.pk])
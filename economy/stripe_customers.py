@@ -0,0 +1,105 @@
+from typing import Dict, Optional
+
+from django.conf import settings
+
+from economy.models import SociBankAccount
+
+
+def _stripe():
+    import stripe
+
+    if not settings.STRIPE_SECRET_KEY:
+        raise EnvironmentError("Stripe API key missing")
+
+    stripe.api_key = settings.STRIPE_SECRET_KEY
+    return stripe
+
+
+def stripe_search_customer(query_string):
+    res = _stripe().Customer.search(query=query_string)
+    data = res["data"]
+
+    if len(data) == 0:
+        return None
+
+    if len(data) > 1:
+        raise Exception(
+            f"Multiple Stripe customers resolved for query string: {query_string}"
+        )
+
+    customer_data = data[0]
+    return customer_data["id"]
+
+
+def create_new_stripe_customer(customer):
+    customer = _stripe().Customer.create(
+        name=customer.get_full_name(), email=customer.email, phone=customer.phone
+    )
+    return customer.id
+
+
+def _save_stripe_customer_id(bank_account: SociBankAccount, customer_id: str) -> str:
+    # Only the first mapping is kept if two requests resolve the customer at once
+    SociBankAccount.objects.filter(
+        pk=bank_account.pk, stripe_customer_id__isnull=True
+    ).update(stripe_customer_id=customer_id)
+    bank_account.refresh_from_db(fields=["stripe_customer_id"])
+    return bank_account.stripe_customer_id
+
+
+def get_stripe_customer_id(user) -> str:
+    """
+    Returns the Stripe customer of a user. The customer id is stored on the bank
+    account, so Stripe is only searched, and the customer created if it is missing,
+    the first time a user pays with Stripe.
+    """
+    bank_account = user.bank_account
+    if bank_account.stripe_customer_id:
+        return bank_account.stripe_customer_id
+
+    customer_id = stripe_search_customer(f"email:'{user.email}'")
+    if not customer_id:
+        customer_id = create_new_stripe_customer(user)
+    return _save_stripe_customer_id(bank_account, customer_id)
+
+
+def is_missing_stripe_customer_error(error) -> bool:
+    """
+    Whether a Stripe InvalidRequestError is caused by a customer that does not exist,
+    like one that has been deleted in Stripe.
+    """
+    if getattr(error, "code", None) == "resource_missing":
+        return getattr(error, "param", None) == "customer"
+    return "No such customer" in str(error)
+
+
+def forget_stripe_customer_id(bank_account: SociBankAccount):
+    """
+    Clears a stored customer id that no longer exists in Stripe, so the customer is
+    searched for or created again the next time the user pays with Stripe.
+    """
+    customer_id = bank_account.stripe_customer_id
+    if not customer_id:
+        return
+
+    SociBankAccount.objects.filter(
+        pk=bank_account.pk, stripe_customer_id=customer_id
+    ).update(stripe_customer_id=None)
+    bank_account.stripe_customer_id = None
+
+
+def list_stripe_customer_ids_by_email() -> Dict[str, Optional[str]]:
+    """
+    Maps the email of every Stripe customer to its id, paging through all customers
+    instead of searching for one at a time. Emails shared by several customers are
+    mapped to None, as it is ambiguous which of them is the right one.
+    """
+    customers = _stripe().Customer.list(limit=100)
+    customer_ids = {}
+    for customer in customers.auto_paging_iter():
+        email = customer["email"]
+        if not email:
+            continue
+        email = email.lower()
+        customer_ids[email] = None if email in customer_ids else customer["id"]
+    return customer_ids
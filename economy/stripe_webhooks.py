@@ -0,0 +1,197 @@
+import datetime
+import json
+from typing import Iterable, Iterator, NamedTuple, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from economy.ledger import write_deposit_entry, write_deposit_refund_entry
+from economy.models import Deposit, StripeWebhookEvent
+
+
+class StripeEventResult(NamedTuple):
+    processed: int
+    ignored: int
+    failed: int
+
+
+def _get_payment_intent_id(event: dict) -> str:
+    event_object = event["data"]["object"]
+    if event_object.get("object") == "payment_intent":
+        return event_object.get("id") or ""
+    return event_object.get("payment_intent") or ""
+
+
+def record_stripe_event(event: dict) -> Tuple[StripeWebhookEvent, bool]:
+    """
+    Stores a verified Stripe event for processing. Returns the stored event and whether
+    it was new, as Stripe delivers the same event again when it is not acknowledged.
+    """
+    return StripeWebhookEvent.objects.get_or_create(
+        stripe_event_id=event["id"],
+        defaults={
+            "type": event["type"],
+            "payment_intent_id": _get_payment_intent_id(event),
+            "payload": event,
+            "stripe_created_at": datetime.datetime.fromtimestamp(
+                event["created"], tz=datetime.timezone.utc
+            ),
+        },
+    )
+
+
+def _handle_payment_intent_succeeded(event_object):
+    deposit = Deposit.objects.select_for_update().get(
+        stripe_payment_id=event_object["id"]
+    )
+    if deposit.approved:
+        # Already approved. Do nothing
+        return
+
+    from economy.utils import send_deposit_approved_email
+
+    deposit.approved_at = timezone.now()
+    deposit.approved = True
+    deposit.save()
+    deposit.account.add_funds(deposit.resolved_amount)
+    write_deposit_entry(deposit, deposit.resolved_amount)
+    if deposit.account.user.notify_on_deposit:
+        transaction.on_commit(lambda: send_deposit_approved_email(deposit))
+
+
+def _handle_charge_refunded(event_object):
+    deposit = Deposit.objects.select_for_update().get(
+        stripe_payment_id=event_object["payment_intent"]
+    )
+    if not deposit.approved:
+        # Already invalidated. Do nothing
+        return
+
+    from economy.utils import send_deposit_refunded_email
+
+    deposit.approved = False
+    deposit.account.remove_funds(deposit.resolved_amount)
+    write_deposit_refund_entry(deposit, deposit.resolved_amount)
+    deposit.save()
+    if deposit.account.user.notify_on_deposit:
+        transaction.on_commit(lambda: send_deposit_refunded_email(deposit))
+        # Could be confusing user flow if we don't delete the deposit
+        deposit.delete()
+
+
+STRIPE_EVENT_HANDLERS = {
+    "payment_intent.succeeded": _handle_payment_intent_succeeded,
+    "charge.refunded": _handle_charge_refunded,
+}
+
+
+def process_stripe_event(webhook_event: StripeWebhookEvent) -> str:
+    """
+    Processes a single stored event and returns its new status. Events without a
+    handler are ignored. A failing handler rolls back everything it did, and the event
+    is marked as failed so it is retried.
+    """
+    handler = STRIPE_EVENT_HANDLERS.get(webhook_event.type)
+    webhook_event.attempts = F("attempts") + 1
+    try:
+        with transaction.atomic():
+            if handler is not None:
+                handler(webhook_event.payload["data"]["object"])
+    except Exception as e:
+        webhook_event.status = StripeWebhookEvent.Status.FAILED
+        webhook_event.last_error = f"{type(e).__name__}: {e}"
+    else:
+        webhook_event.status = (
+            StripeWebhookEvent.Status.PROCESSED
+            if handler is not None
+            else StripeWebhookEvent.Status.IGNORED
+        )
+        webhook_event.last_error = ""
+        webhook_event.processed_at = timezone.now()
+
+    webhook_event.save(
+        update_fields=["attempts", "status", "last_error", "processed_at"]
+    )
+    webhook_event.refresh_from_db(fields=["attempts"])
+    return webhook_event.status
+
+
+def get_processable_stripe_events(limit: Optional[int] = None) -> Iterable:
+    """
+    Pending events, and failed events that have attempts left, in the order Stripe
+    created them.
+    """
+    events = StripeWebhookEvent.objects.filter(
+        Q(status=StripeWebhookEvent.Status.PENDING)
+        | Q(
+            status=StripeWebhookEvent.Status.FAILED,
+            attempts__lt=settings.STRIPE_WEBHOOK_MAX_ATTEMPTS,
+        )
+    ).order_by("stripe_created_at", "id")
+    if limit is not None:
+        events = events[:limit]
+    return events
+
+
+def process_stripe_events(events) -> StripeEventResult:
+    """
+    Processes events in order. Events of a payment intent are processed in the order
+    Stripe created them, so once one fails, the later events of the same payment
+    intent are left for the next run instead of being processed out of order.
+    """
+    processed = ignored = failed = 0
+    blocked_payment_intents = set()
+    for webhook_event in events:
+        payment_intent_id = webhook_event.payment_intent_id
+        if payment_intent_id and payment_intent_id in blocked_payment_intents:
+            continue
+
+        status = process_stripe_event(webhook_event)
+        if status == StripeWebhookEvent.Status.PROCESSED:
+            processed += 1
+        elif status == StripeWebhookEvent.Status.IGNORED:
+            ignored += 1
+        else:
+            failed += 1
+            if payment_intent_id:
+                blocked_payment_intents.add(payment_intent_id)
+
+    return StripeEventResult(processed, ignored, failed)
+
+
+def process_received_stripe_event(
+    webhook_event: StripeWebhookEvent,
+) -> StripeEventResult:
+    """
+    Processes a just received event together with the earlier events of its payment
+    intent that are still waiting, so the webhook credits deposits right away without
+    reordering them. Whatever fails is left for the processstripeevents command.
+    """
+    events = get_processable_stripe_events()
+    if webhook_event.payment_intent_id:
+        events = events.filter(payment_intent_id=webhook_event.payment_intent_id)
+    else:
+        events = events.filter(pk=webhook_event.pk)
+    return process_stripe_events(events)
+
+
+def fetch_stripe_events(since: datetime.datetime) -> Iterator[dict]:
+    """
+    Lists the events Stripe has created since a point in time, limited to the types
+    that have a handler. Used to backfill events whose delivery never reached us.
+    """
+    import stripe
+
+    if not settings.STRIPE_SECRET_KEY:
+        raise EnvironmentError("Stripe API key missing")
+
+    stripe.api_key = settings.STRIPE_SECRET_KEY
+    events = stripe.Event.list(
+        created={"gte": int(since.timestamp())},
+        types=list(STRIPE_EVENT_HANDLERS),
+        limit=100,
+    )
+    for event in events.auto_paging_iter():
+        yield json.loads(str(event))
@@ -1,6 +1,13 @@
 import pytz
 from django.utils import timezone
-from factory import SubFactory, Faker, Sequence, post_generation
+from factory import (
+    DictFactory,
+    LazyFunction,
+    SubFactory,
+    Faker,
+    Sequence,
+    post_generation,
+)
 from factory.django import DjangoModelFactory
 from factory.django import ImageField
 
@@ -96,3 +103,26 @@ class DepositCommentFactory(DjangoModelFactory):
     user = SubFactory("users.tests.factories.UserFactory")
     comment = Faker("text")
     created = Faker("date_time", tzinfo=pytz.timezone(settings.TIME_ZONE))
+
+
+class StripePaymentIntentFactory(DictFactory):
+    id = Sequence(lambda n: f"pi_{n}")
+    object = "payment_intent"
+    amount = 10000
+    currency = "nok"
+
+
+class StripeEventDataFactory(DictFactory):
+    object = SubFactory(StripePaymentIntentFactory)
+
+
+class StripeEventFactory(DictFactory):
+    """
+    A Stripe webhook event as a plain dict, like the body of a webhook request
+    """
+
+    id = Sequence(lambda n: f"evt_{n}")
+    object = "event"
+    type = "payment_intent.succeeded"
+    created = LazyFunction(lambda: int(timezone.now().timestamp()))
+    data = SubFactory(StripeEventDataFactory)
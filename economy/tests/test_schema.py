@@ -1,9 +1,40 @@
-from django.test import TestCase
+import importlib
+
+from django.apps import apps
+from django.db import connection
+from django.core import mail
+from django.core.files.uploadedfile import SimpleUploadedFile
+import shutil
+import tempfile
+from unittest.mock import patch
+
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from addict import Dict
 from graphene.test import Client
+from graphql_relay import to_global_id
 from ksg_nett.schema import schema
-from economy.tests.factories import SociProductFactory
-from economy.models import ProductGhostOrder
+from economy.tests.factories import (
+    DepositFactory,
+    ProductOrderFactory,
+    SociBankAccountFactory,
+    SociProductFactory,
+    SociSessionFactory,
+)
+from django.utils import timezone
+from economy.leaderboard import record_season_spend, revert_season_spend
+from economy.ledger import write_product_order_entries, write_undo_entry
+from economy.models import (
+    Deposit,
+    LedgerEntry,
+    ProductGhostOrder,
+    ProductOrder,
+    SociOrderSession,
+    SociOrderSessionOrder,
+    SociProduct,
+    SociRankedSeason,
+    SociSession,
+)
 from users.tests.factories import UserWithPermissionsFactory, UserFactory
 
 
@@ -49,3 +80,553 @@ class TestIncrementProductGhostOrderMutation(TestCase):
         diff = post_count - pre_count
         self.assertEqual(diff, 0)
         self.assertIsNotNone(result.data.errors)
+
+
+class TestMyExpendituresQuery(TestCase):
+    def setUp(self) -> None:
+        self.graphql_client = Client(schema)
+        self.bank_account = SociBankAccountFactory.create()
+        ProductOrderFactory.create_batch(3, source=self.bank_account, cost=20)
+
+        self.query = """
+            query MyExpenditures($dateRange: TotalExpenditureDateRange!, $granularity: ExpenditureGranularityEnum) {
+              myExpenditures(dateRange: $dateRange, granularity: $granularity) {
+                total
+                data {
+                  day
+                  sum
+                }
+              }
+            }
+          """
+
+    def test__all_time_by_month__returns_total_and_series(self):
+        executed = self.graphql_client.execute(
+            self.query,
+            variables={"dateRange": "ALL_TIME", "granularity": "MONTH"},
+            context=Dict(user=self.bank_account.user),
+        )
+        result = Dict(executed)
+
+        self.assertNotIn("errors", executed)
+        self.assertEqual(60, result.data.myExpenditures.total)
+        self.assertEqual(60, result.data.myExpenditures.data[-1].sum)
+
+
+class TestCurrentRankedSeasonQuery(TestCase):
+    def setUp(self) -> None:
+        self.graphql_client = Client(schema)
+        self.season = SociRankedSeason.objects.create(
+            season_start_date=timezone.localdate()
+        )
+        self.bank_accounts = SociBankAccountFactory.create_batch(3)
+        for cost, bank_account in zip([100, 300, 200], self.bank_accounts):
+            ProductOrderFactory.create(source=bank_account, cost=cost)
+        self.season.participants.add(
+            *[bank_account.user for bank_account in self.bank_accounts]
+        )
+
+        self.query = """
+            query CurrentRankedSeason {
+              currentRankedSeason {
+                isParticipant
+                seasonExpenditure
+                placement
+                participantCount
+                rankedSeason
+                topTen {
+                  expenditure
+                }
+              }
+            }
+          """
+
+    def execute(self, user):
+        executed = self.graphql_client.execute(self.query, context=Dict(user=user))
+        self.assertNotIn("errors", executed)
+        return Dict(executed).data.currentRankedSeason
+
+    def test__joining_season__standings_built_from_season_orders(self):
+        with self.assertNumQueries(4):
+            result = self.execute(self.bank_accounts[0].user)
+
+        self.assertTrue(result.isParticipant)
+        self.assertEqual(100, result.seasonExpenditure)
+        self.assertEqual(3, result.placement)
+        self.assertEqual(3, result.participantCount)
+        self.assertEqual(1, result.rankedSeason)
+        self.assertEqual([300, 200, 100], [e.expenditure for e in result.topTen])
+
+    def test__placing_and_undoing_orders__updates_standings_incrementally(self):
+        bank_account = self.bank_accounts[0]
+        product_order = ProductOrderFactory.create(source=bank_account, cost=250)
+        write_product_order_entries([product_order])
+        record_season_spend([product_order])
+
+        result = self.execute(bank_account.user)
+        self.assertEqual(350, result.seasonExpenditure)
+        self.assertEqual(1, result.placement)
+
+        write_undo_entry(product_order)
+        revert_season_spend(product_order)
+
+        result = self.execute(bank_account.user)
+        self.assertEqual(100, result.seasonExpenditure)
+        self.assertEqual(3, result.placement)
+
+    def test__standings_migration__builds_standings_of_existing_seasons(self):
+        migration = importlib.import_module(
+            "economy.migrations.0016_backfill_season_standings"
+        )
+        self.season.standings.all().delete()
+
+        migration.rebuild_season_standings(apps, None)
+
+        result = self.execute(self.bank_accounts[0].user)
+        self.assertTrue(result.isParticipant)
+        self.assertEqual(100, result.seasonExpenditure)
+        self.assertEqual([300, 200, 100], [e.expenditure for e in result.topTen])
+
+    def test__not_participating__only_participant_count(self):
+        result = self.execute(SociBankAccountFactory.create().user)
+
+        self.assertFalse(result.isParticipant)
+        self.assertIsNone(result.placement)
+        self.assertEqual(3, result.participantCount)
+
+
+class TestAllSociSessionsQuery(TestCase):
+    def setUp(self):
+        self.graphql_client = Client(schema)
+        self.user = UserWithPermissionsFactory(permissions="economy.view_socisession")
+        self.query = """
+            query AllSociSessions {
+              allSociSessions {
+                edges {
+                  node {
+                    moneySpent
+                    productOrderCount
+                    customerCount
+                  }
+                }
+              }
+            }
+          """
+
+    def create_sessions(self, count):
+        for _ in range(count):
+            session = SociSessionFactory()
+            ProductOrderFactory.create_batch(2, session=session, cost=50)
+
+    def list_sessions(self):
+        with CaptureQueriesContext(connection) as queries:
+            executed = self.graphql_client.execute(
+                self.query, context=Dict(user=self.user)
+            )
+        self.assertNotIn("errors", executed)
+        return Dict(executed).data.allSociSessions.edges, len(queries)
+
+    def test__many_sessions__constant_number_of_queries(self):
+        self.create_sessions(2)
+        # Warms up the permission cache of the user
+        self.list_sessions()
+        _, few_sessions_queries = self.list_sessions()
+
+        self.create_sessions(10)
+        SociSession.objects.first().close()
+        edges, many_sessions_queries = self.list_sessions()
+
+        self.assertEqual(few_sessions_queries, many_sessions_queries)
+        self.assertEqual(12, len(edges))
+        self.assertTrue(all(edge.node.moneySpent == 100 for edge in edges))
+        self.assertTrue(all(edge.node.productOrderCount == 2 for edge in edges))
+
+
+class TestBulkApproveDepositsMutation(TestCase):
+    def setUp(self):
+        self.graphql_client = Client(schema)
+        self.treasurer = UserWithPermissionsFactory(
+            permissions="economy.approve_deposit"
+        )
+        self.accounts = SociBankAccountFactory.create_batch(2, balance=0)
+        self.mutation = """
+            mutation BulkApproveDeposits($depositIds: [ID]!) {
+              bulkApproveDeposits(depositIds: $depositIds) {
+                deposits {
+                  id
+                  approved
+                }
+              }
+            }
+          """
+
+    def create_deposit(
+        self, account, amount=100, deposit_method=Deposit.DepositMethod.BANK_TRANSFER
+    ):
+        return DepositFactory(
+            account=account,
+            amount=amount,
+            receipt=None,
+            approved_by=None,
+            deposit_method=deposit_method,
+        )
+
+    def approve(self, deposits, user=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.graphql_client.execute(
+                self.mutation,
+                variables={"depositIds": [deposit.id for deposit in deposits]},
+                context=Dict(user=user or self.treasurer),
+            )
+
+    def test__pending_deposits__approves_and_credits_accounts(self):
+        first, second = self.accounts
+        deposits = [
+            self.create_deposit(first, 100),
+            self.create_deposit(first, 200),
+            self.create_deposit(second, 300),
+        ]
+
+        executed = self.approve(deposits)
+
+        self.assertNotIn("errors", executed)
+        self.assertEqual(3, len(executed["data"]["bulkApproveDeposits"]["deposits"]))
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(300, first.balance)
+        self.assertEqual(300, second.balance)
+        self.assertEqual(3, Deposit.objects.filter(approved=True).count())
+        self.assertEqual(
+            3, LedgerEntry.objects.filter(type=LedgerEntry.Type.DEPOSIT).count()
+        )
+        self.assertEqual(3, len(mail.outbox))
+
+    def test__approved_and_stripe_deposits__are_skipped(self):
+        account = self.accounts[0]
+        approved = self.create_deposit(account)
+        Deposit.objects.filter(pk=approved.pk).update(approved=True)
+        stripe = self.create_deposit(
+            account, deposit_method=Deposit.DepositMethod.STRIPE
+        )
+
+        executed = self.approve([approved, stripe])
+
+        self.assertNotIn("errors", executed)
+        self.assertEqual([], executed["data"]["bulkApproveDeposits"]["deposits"])
+        account.refresh_from_db()
+        self.assertEqual(0, account.balance)
+        self.assertEqual(0, len(mail.outbox))
+
+    def test__user_without_permission__approves_nothing(self):
+        deposit = self.create_deposit(self.accounts[0])
+
+        executed = self.approve([deposit], user=UserFactory())
+
+        self.assertIn("errors", executed)
+        deposit.refresh_from_db()
+        self.assertFalse(deposit.approved)
+
+    def test__500_deposits__bounded_number_of_queries(self):
+        accounts = SociBankAccountFactory.create_batch(50, balance=0)
+        deposits = [self.create_deposit(accounts[i % 50]) for i in range(500)]
+        # Warms up the permission cache of the user
+        self.approve([])
+
+        with CaptureQueriesContext(connection) as queries:
+            executed = self.approve(deposits)
+
+        self.assertNotIn("errors", executed)
+        self.assertEqual(500, Deposit.objects.filter(approved=True).count())
+        accounts[0].refresh_from_db()
+        self.assertEqual(1000, accounts[0].balance)
+        # SQLite splits the ledger entry insert into batches, other than that the
+        # number of queries is the same for any number of deposits
+        self.assertLess(len(queries), 20)
+
+
+class TestMatchBankStatementMutation(TestCase):
+    def setUp(self):
+        self.graphql_client = Client(schema)
+        self.treasurer = UserWithPermissionsFactory(
+            permissions="economy.approve_deposit"
+        )
+        self.deposit = DepositFactory(
+            account=SociBankAccountFactory(
+                user=UserFactory(first_name="Ola", last_name="Nordmann")
+            ),
+            amount=500,
+            receipt=None,
+            approved_by=None,
+            deposit_method=Deposit.DepositMethod.BANK_TRANSFER,
+        )
+        self.mutation = """
+            mutation MatchBankStatement($statementFile: Upload!) {
+              matchBankStatement(statementFile: $statementFile) {
+                matches {
+                  matchType
+                  deposit {
+                    id
+                  }
+                  line {
+                    lineNumber
+                    amount
+                  }
+                }
+                unmatchedLines {
+                  text
+                }
+              }
+            }
+          """
+
+    def test__statement_file__returns_matches_without_approving(self):
+        statement = SimpleUploadedFile(
+            "statement.csv",
+            "Dato;Forklaring;Inn på konto\n"
+            "01.09.2023;Ola Nordmann;500,00\n"
+            "01.09.2023;Kari Nordmann;200,00\n".encode("utf-8"),
+        )
+
+        executed = self.graphql_client.execute(
+            self.mutation,
+            variables={"statementFile": statement},
+            context=Dict(user=self.treasurer),
+        )
+
+        self.assertNotIn("errors", executed)
+        data = Dict(executed).data.matchBankStatement
+        self.assertEqual(1, len(data.matches))
+        self.assertEqual("exact", data.matches[0].matchType)
+        self.assertEqual(
+            to_global_id("DepositNode", self.deposit.id), data.matches[0].deposit.id
+        )
+        self.assertEqual(["Kari Nordmann"], [line.text for line in data.unmatchedLines])
+        self.deposit.refresh_from_db()
+        self.assertFalse(self.deposit.approved)
+
+
+class TestPlaceProductOrdersMutation(TestCase):
+    def setUp(self):
+        self.graphql_client = Client(schema)
+        self.user = UserWithPermissionsFactory(permissions="economy.add_productorder")
+        self.session = SociSessionFactory(
+            type=SociSession.Type.KRYSELLISTE, minimum_remaining_balance=0
+        )
+        self.product = SociProductFactory(price=30)
+        self.accounts = SociBankAccountFactory.create_batch(2, balance=100)
+        self.mutation = """
+            mutation PlaceProductOrders(
+              $sociSessionId: ID!
+              $orders: [ProductOrderLineInput!]!
+              $abortOnError: Boolean
+            ) {
+              placeProductOrders(
+                sociSessionId: $sociSessionId
+                orders: $orders
+                abortOnError: $abortOnError
+              ) {
+                productOrders {
+                  cost
+                }
+                errors {
+                  line
+                  message
+                }
+              }
+            }
+          """
+
+    def line(self, account, order_size=1):
+        return {
+            "userId": to_global_id("UserNode", account.user_id),
+            "productId": to_global_id("SociProductNode", self.product.id),
+            "orderSize": order_size,
+        }
+
+    def place(self, lines, abort_on_error=False):
+        with self.captureOnCommitCallbacks(execute=True):
+            executed = self.graphql_client.execute(
+                self.mutation,
+                variables={
+                    "sociSessionId": to_global_id("SociSessionNode", self.session.id),
+                    "orders": lines,
+                    "abortOnError": abort_on_error,
+                },
+                context=Dict(user=self.user),
+            )
+        self.assertNotIn("errors", executed)
+        return Dict(executed).data.placeProductOrders
+
+    def test__lines__charged_against_remaining_balance(self):
+        first, second = self.accounts
+
+        result = self.place(
+            [self.line(first, 2), self.line(second), self.line(first, 2)]
+        )
+
+        self.assertEqual([60, 30], [order.cost for order in result.productOrders])
+        self.assertEqual([{"line": 2, "message": "Insufficient funds"}], result.errors)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(40, first.balance)
+        self.assertEqual(70, second.balance)
+        self.assertEqual(2, LedgerEntry.objects.count())
+
+    def test__abort_on_error__places_nothing(self):
+        first, second = self.accounts
+
+        result = self.place(
+            [self.line(second), self.line(first, 0)], abort_on_error=True
+        )
+
+        self.assertEqual([], result.productOrders)
+        self.assertEqual(1, result.errors[0].line)
+        second.refresh_from_db()
+        self.assertEqual(100, second.balance)
+        self.assertFalse(self.session.product_orders.exists())
+
+    def test__300_lines__bounded_number_of_queries(self):
+        accounts = SociBankAccountFactory.create_batch(30, balance=1000)
+        lines = [self.line(accounts[i % 30]) for i in range(300)]
+        # Warms up the permission cache of the user
+        self.place([])
+
+        with CaptureQueriesContext(connection) as queries:
+            result = self.place(lines)
+
+        self.assertEqual(300, len(result.productOrders))
+        self.assertEqual([], result.errors)
+        accounts[0].refresh_from_db()
+        self.assertEqual(700, accounts[0].balance)
+        self.assertLess(len(queries), 30)
+
+
+class TestSociOrderSessionNextStatusMutation(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.graphql_client = Client(schema)
+        self.user = UserWithPermissionsFactory(
+            permissions="economy.change_sociordersession"
+        )
+        self.burger = SociProductFactory(
+            name="Burger", price=50, type=SociProduct.Type.FOOD
+        )
+        self.fries = SociProductFactory(
+            name="Pommes", price=20, type=SociProduct.Type.FOOD
+        )
+        self.beer = SociProductFactory(name="Øl", price=30, type=SociProduct.Type.DRINK)
+        self.order_session = SociOrderSession.objects.create(
+            status=SociOrderSession.Status.FOOD_ORDERING
+        )
+        self.mutation = """
+            mutation SociOrderSessionNextStatus {
+              sociOrderSessionNextStatus {
+                sociOrderSession {
+                  status
+                }
+              }
+            }
+          """
+
+    def order(self, account, product, amount=1):
+        return SociOrderSessionOrder.objects.create(
+            session=self.order_session,
+            user=account.user,
+            product=product,
+            amount=amount,
+        )
+
+    def create_guests(self, count):
+        accounts = SociBankAccountFactory.create_batch(count, balance=500)
+        for account in accounts:
+            self.order(account, self.burger)
+            self.order(account, self.burger, amount=2)
+            self.order(account, self.fries)
+            self.order(account, self.beer)
+        return accounts
+
+    def next_status(self):
+        with override_settings(MEDIA_ROOT=self.media_root):
+            with CaptureQueriesContext(connection) as queries:
+                executed = self.graphql_client.execute(
+                    self.mutation, context=Dict(user=self.user)
+                )
+        self.assertNotIn("errors", executed)
+        return len(queries)
+
+    def test__food_ordering__charges_summed_up_food_orders(self):
+        account = self.create_guests(1)[0]
+        last_burger = self.order(account, self.burger)
+
+        with patch("economy.utils.render_pdf", return_value=b"") as render_pdf:
+            self.next_status()
+
+        account.refresh_from_db()
+        self.assertEqual(500 - 4 * 50 - 20, account.balance)
+        burgers = ProductOrder.objects.get(source=account, product=self.burger)
+        self.assertEqual(4, burgers.order_size)
+        self.assertEqual(200, burgers.cost)
+        self.assertEqual(last_burger.ordered_at, burgers.purchased_at)
+        self.assertEqual(
+            2, LedgerEntry.objects.filter(type=LedgerEntry.Type.PRODUCT_ORDER).count()
+        )
+        self.assertFalse(ProductOrder.objects.filter(product=self.beer).exists())
+        summary = render_pdf.call_args.args[1]["summary"]
+        self.assertEqual(
+            [{"name": "Burger", "count": 4}, {"name": "Pommes", "count": 1}], summary
+        )
+
+    def test__food_ordering__constant_number_of_queries(self):
+        self.create_guests(2)
+        # Warms up the permission cache of the user
+        self.user.has_perm("economy.change_sociordersession")
+        few_guests_queries = self.next_status()
+
+        self.order_session.status = SociOrderSession.Status.FOOD_ORDERING
+        self.order_session.save()
+        self.create_guests(10)
+        many_guests_queries = self.next_status()
+
+        self.assertEqual(few_guests_queries, many_guests_queries)
+
+    def test__drink_ordering__settles_drinks_without_charging(self):
+        self.order_session.status = SociOrderSession.Status.DRINK_ORDERING
+        self.order_session.save()
+        account = self.create_guests(1)[0]
+
+        self.next_status()
+
+        account.refresh_from_db()
+        self.assertEqual(500, account.balance)
+        beers = ProductOrder.objects.get(source=account, product=self.beer)
+        self.assertEqual(30, beers.cost)
+        self.order_session.refresh_from_db()
+        self.assertEqual(SociOrderSession.Status.CLOSED, self.order_session.status)
+
+    def test__drink_ordering__settles_drinks_at_the_price_charged(self):
+        self.order_session.status = SociOrderSession.Status.DRINK_ORDERING
+        self.order_session.save()
+        account = SociBankAccountFactory(balance=500)
+        SociOrderSessionOrder.objects.create(
+            session=self.order_session,
+            user=account.user,
+            product=self.beer,
+            amount=2,
+            cost=60,
+        )
+        self.beer.price = 40
+        self.beer.save()
+
+        self.next_status()
+
+        beers = ProductOrder.objects.get(source=account, product=self.beer)
+        self.assertEqual(60, beers.cost)
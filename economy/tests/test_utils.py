@@ -1,16 +1,76 @@
+import calendar
+import csv
+import hashlib
+import hmac
+import importlib
+import json
 import math
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest.mock import patch
 
-from django.test import TestCase
-from economy.utils import parse_transaction_history
-from economy.price_strategies import calculate_stock_price_for_product
+from addict import Dict
+from django.apps import apps
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from economy.bank_statements import (
+    BankStatementMatchType,
+    match_bank_statement,
+    normalize_name,
+)
+from economy.models import (
+    BalanceReconciliation,
+    DebtCollectionNotice,
+    DebtCollectionRun,
+    Deposit,
+    DailyAccountSpend,
+    LedgerEntry,
+    ProductOrder,
+    ProductGhostOrder,
+    SociBankAccount,
+    SociOrderSession,
+    SociOrderSessionOrder,
+    SociProduct,
+    StockMarketCrash,
+    StripeWebhookEvent,
+)
+from economy.utils import (
+    parse_transaction_history,
+    get_bank_account_activity,
+    stripe_create_payment_intent,
+)
+from economy.price_strategies import (
+    calculate_stock_price_for_product,
+    get_stock_market_products,
+    StockMarketPriceEngine,
+)
+from economy.expenditures import (
+    ExpenditureDateRange,
+    ExpenditureGranularity,
+    get_expenditure_series,
+)
+from economy.debt_collection import get_debtors
+from economy.price_ticker import StockPriceTicker
+from economy.reconciliation import reconcile_balances
 from economy.tests.factories import (
     SociBankAccountFactory,
     ProductOrderFactory,
     DepositFactory,
     TransferFactory,
     SociProductFactory,
+    StripeEventFactory,
 )
 from users.schema import BankAccountActivity
+from users.tests.factories import UserFactory
 from django.conf import settings
 from django.utils import timezone
 
@@ -39,6 +99,710 @@ class TestParseTransactionHistory(TestCase):
         self.assertEqual(5, len(parsed_activities))
 
 
+class TestBankAccountLedger(TestCase):
+    def setUp(self) -> None:
+        self.bank_account = SociBankAccountFactory.create()
+        ProductOrderFactory.create_batch(5, source=self.bank_account)
+        TransferFactory.create_batch(5, source=self.bank_account)
+        DepositFactory.create_batch(3, account=self.bank_account, approved=True)
+
+    def test__backfill_ledger__writes_every_movement_once(self):
+        call_command("backfillledger", stdout=StringIO())
+        self.assertEqual(13, self.bank_account.ledger_entries.count())
+
+        call_command("backfillledger", stdout=StringIO())
+        self.assertEqual(13, self.bank_account.ledger_entries.count())
+
+    def test__ledger_migration__backfills_like_the_command(self):
+        migration = importlib.import_module("economy.migrations.0017_backfill_ledger")
+        call_command("backfillledger", stdout=StringIO())
+        expected = list(
+            self.bank_account.ledger_entries.order_by("timestamp", "id").values_list(
+                "type", "amount", "name", "quantity", "timestamp"
+            )
+        )
+        LedgerEntry.objects.all().delete()
+
+        migration.backfill_ledger(apps, None)
+        migration.backfill_ledger(apps, None)
+
+        self.assertEqual(
+            expected,
+            list(
+                self.bank_account.ledger_entries.order_by(
+                    "timestamp", "id"
+                ).values_list("type", "amount", "name", "quantity", "timestamp")
+            ),
+        )
+
+    def test__get_bank_account_activity__pages_with_running_balance(self):
+        call_command("backfillledger", stdout=StringIO())
+        self.bank_account.refresh_from_db()
+
+        first_page = get_bank_account_activity(self.bank_account, 5)
+        with self.assertNumQueries(1):
+            second_page = get_bank_account_activity(
+                self.bank_account, 10, first_page[-1].cursor
+            )
+
+        self.assertEqual(5, len(first_page))
+        self.assertEqual(8, len(second_page))
+        self.assertEqual(self.bank_account.balance, first_page[0].balance)
+
+        entries = list(self.bank_account.ledger_entries.order_by("-timestamp", "-id"))
+        activities = [*first_page, *second_page]
+        balance = self.bank_account.balance
+        for entry, activity in zip(entries, activities):
+            self.assertEqual(balance, activity.balance)
+            balance -= entry.amount
+
+
+class TestBalanceReconciliation(TestCase):
+    def setUp(self) -> None:
+        self.bank_accounts = SociBankAccountFactory.create_batch(3)
+        for bank_account in self.bank_accounts:
+            DepositFactory.create(account=bank_account, approved=True, amount=1000)
+            ProductOrderFactory.create(source=bank_account, cost=300)
+        TransferFactory.create(
+            source=self.bank_accounts[0], destination=self.bank_accounts[1], amount=100
+        )
+        SociBankAccount.objects.filter(pk=self.bank_accounts[0].pk).update(balance=600)
+        SociBankAccount.objects.filter(pk=self.bank_accounts[1].pk).update(balance=800)
+        SociBankAccount.objects.filter(pk=self.bank_accounts[2].pk).update(balance=650)
+
+    def test__reconcile_balances__reports_drift_with_constant_query_count(self):
+        # Account ids, balances and one aggregate per kind of movement, plus a savepoint
+        with self.assertNumQueries(10):
+            results = list(reconcile_balances())
+
+        drifted = [result for result in results if result.drift]
+        self.assertEqual(3, len(results))
+        self.assertEqual(1, len(drifted))
+        self.assertEqual(self.bank_accounts[2].id, drifted[0].account_id)
+        self.assertEqual(-50, drifted[0].drift)
+
+    def test__open_stilletime_after_price_change__no_drift(self):
+        beer = SociProductFactory.create(price=30, type=SociProduct.Type.DRINK)
+        order_session = SociOrderSession.objects.create(
+            status=SociOrderSession.Status.DRINK_ORDERING
+        )
+        bank_account = self.bank_accounts[0]
+        SociOrderSessionOrder.objects.create(
+            session=order_session,
+            user=bank_account.user,
+            product=beer,
+            amount=2,
+            cost=60,
+        )
+        SociBankAccount.objects.filter(pk=bank_account.pk).update(balance=540)
+        beer.price = 50
+        beer.save()
+
+        results = {result.account_id: result for result in reconcile_balances()}
+
+        self.assertEqual(0, results[bank_account.id].drift)
+
+    def test__reconcile_balances_command_with_repair__fixes_balance(self):
+        call_command("reconcilebalances", "--repair", stdout=StringIO())
+
+        bank_account = self.bank_accounts[2]
+        bank_account.refresh_from_db()
+        self.assertEqual(700, bank_account.balance)
+        self.assertEqual(
+            50,
+            bank_account.ledger_entries.get(type=LedgerEntry.Type.ADJUSTMENT).amount,
+        )
+        self.assertFalse(any(result.drift for result in reconcile_balances()))
+
+    def test__reconcile_balances_command_with_since__uses_checkpoint(self):
+        call_command("reconcilebalances", stdout=StringIO())
+        LedgerEntry.objects.create(
+            account=self.bank_accounts[0],
+            type=LedgerEntry.Type.TRANSFER,
+            amount=0,
+            name="Overføring",
+        )
+
+        call_command("reconcilebalances", "--since", stdout=StringIO())
+
+        last_run = BalanceReconciliation.objects.latest("started_at")
+        self.assertIsNotNone(last_run.since)
+        self.assertEqual(1, last_run.accounts_checked)
+
+
+class TestDebtCollection(TestCase):
+    def setUp(self):
+        self.debtors = [
+            SociBankAccountFactory(balance=balance) for balance in (-300, -200, -100)
+        ]
+        SociBankAccountFactory(balance=500)
+
+    def collect(self, *args):
+        call_command(
+            "debtcollection", "--yes", "--rate-limit", "0", *args, stdout=StringIO()
+        )
+
+    def test__get_debtors__balances_in_one_query(self):
+        with self.assertNumQueries(1):
+            balances = [user.balance for user in get_debtors()]
+
+        self.assertEqual([-300, -200, -100], balances)
+
+    def test__dry_run__reports_debtors_without_sending(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "debt.csv")
+            call_command(
+                "debtcollection", "--dry-run", "--report", path, stdout=StringIO()
+            )
+            with open(path, newline="") as report:
+                rows = list(csv.DictReader(report))
+
+        self.assertEqual(["-300", "-200", "-100"], [row["balance"] for row in rows])
+        self.assertEqual(0, len(mail.outbox))
+        self.assertFalse(DebtCollectionRun.objects.exists())
+
+    def test__yes__emails_every_debtor_and_finishes_run(self):
+        self.collect("--concurrency", "2")
+
+        recipients = sorted(message.to[0] for message in mail.outbox)
+        self.assertEqual(
+            sorted(account.user.email for account in self.debtors), recipients
+        )
+        run = DebtCollectionRun.objects.get()
+        self.assertIsNotNone(run.finished_at)
+        self.assertFalse(run.notices.filter(sent_at__isnull=True).exists())
+
+    def test__interrupted_run__resumes_with_unsent_emails(self):
+        failing_email = self.debtors[0].user.email
+        send_messages = EmailBackend.send_messages
+
+        def fail_for_one_user(backend, messages):
+            if messages[0].to == [failing_email]:
+                raise ConnectionError("Connection unexpectedly closed")
+            return send_messages(backend, messages)
+
+        with patch.object(EmailBackend, "send_messages", fail_for_one_user):
+            with self.assertRaises(CommandError):
+                self.collect()
+
+        notice = DebtCollectionNotice.objects.get(user__email=failing_email)
+        self.assertIsNone(notice.sent_at)
+        self.assertIn("Connection unexpectedly closed", notice.last_error)
+        self.assertEqual(2, len(mail.outbox))
+
+        self.collect()
+
+        self.assertEqual(3, len(mail.outbox))
+        self.assertEqual([failing_email], mail.outbox[-1].to)
+        self.assertEqual(1, DebtCollectionRun.objects.count())
+        self.assertIsNotNone(DebtCollectionRun.objects.get().finished_at)
+
+    def test__run_interrupted_last_month__finished_and_new_run_started(self):
+        failing_email = self.debtors[0].user.email
+        send_messages = EmailBackend.send_messages
+
+        def fail_for_one_user(backend, messages):
+            if messages[0].to == [failing_email]:
+                raise ConnectionError("Connection unexpectedly closed")
+            return send_messages(backend, messages)
+
+        with patch.object(EmailBackend, "send_messages", fail_for_one_user):
+            with self.assertRaises(CommandError):
+                self.collect()
+        last_month = timezone.localtime().replace(day=1) - timedelta(days=1)
+        DebtCollectionRun.objects.update(started_at=last_month)
+        SociBankAccount.objects.filter(pk=self.debtors[0].pk).update(balance=-400)
+        new_debtor = SociBankAccountFactory(balance=-50)
+
+        self.collect()
+
+        old_run, new_run = DebtCollectionRun.objects.order_by("started_at")
+        self.assertIsNotNone(old_run.finished_at)
+        self.assertIsNotNone(new_run.finished_at)
+        self.assertEqual(
+            {self.debtors[0].user_id: -400, new_debtor.user_id: -50},
+            {
+                notice.user_id: notice.balance
+                for notice in new_run.notices.filter(
+                    user__in=[self.debtors[0].user, new_debtor.user]
+                )
+            },
+        )
+        self.assertEqual(4, new_run.notices.filter(sent_at__isnull=False).count())
+
+    @override_settings(DEBT_COLLECTION_MAX_ATTEMPTS=2)
+    def test__always_failing_email__given_up_and_next_run_started(self):
+        failing_email = self.debtors[0].user.email
+        send_messages = EmailBackend.send_messages
+
+        def fail_for_one_user(backend, messages):
+            if messages[0].to == [failing_email]:
+                raise ConnectionError("Mailbox unavailable")
+            return send_messages(backend, messages)
+
+        with patch.object(EmailBackend, "send_messages", fail_for_one_user):
+            for _ in range(2):
+                with self.assertRaises(CommandError):
+                    self.collect()
+
+        first_run = DebtCollectionRun.objects.get()
+        self.assertIsNotNone(first_run.finished_at)
+        notice = first_run.notices.get(user__email=failing_email)
+        self.assertEqual(2, notice.attempts)
+        self.assertIsNone(notice.sent_at)
+
+        new_debtor = SociBankAccountFactory(balance=-50)
+        self.collect()
+
+        self.assertEqual(2, DebtCollectionRun.objects.count())
+        self.assertIn([new_debtor.user.email], [message.to for message in mail.outbox])
+
+
+class TestBankStatementMatching(TestCase):
+    def setUp(self) -> None:
+        self.deposits = {
+            name: DepositFactory.create(
+                account=SociBankAccountFactory(
+                    user=UserFactory(first_name=first_name, last_name=last_name)
+                ),
+                amount=amount,
+                receipt=None,
+                approved_by=None,
+                deposit_method=Deposit.DepositMethod.BANK_TRANSFER,
+            )
+            for name, first_name, last_name, amount in [
+                ("ola", "Ola", "Nordmann", 500),
+                ("kari", "Kari Marie", "Østby", 300),
+                ("per", "Per", "Hansen", 250),
+            ]
+        }
+
+    def statement(self, *rows, encoding="utf-8"):
+        lines = ["Dato;Forklaring;Ut fra konto;Inn på konto"]
+        lines.extend(";".join(row) for row in rows)
+        return BytesIO("\n".join(lines).encode(encoding))
+
+    def test__normalize_name__ignores_order_case_and_accents(self):
+        self.assertEqual(
+            normalize_name("Nordmann, OLA"), normalize_name("Ola Nordmann")
+        )
+        self.assertEqual(("marie", "ostby"), normalize_name("Marie Østby"))
+
+    def test__match_bank_statement__exact_partial_and_fuzzy_names(self):
+        statement = self.statement(
+            ("01.09.2023", "NORDMANN OLA", "", "500,00"),
+            ("01.09.2023", "Giro Kari Marie Ostby", "", "300,00"),
+            ("02.09.2023", "Per Hanssen", "", "250,00"),
+            ("02.09.2023", "Ola Nordmann", "", "499,00"),
+            ("02.09.2023", "Ola Nordmann", "120,00", ""),
+        )
+
+        matches, unmatched = match_bank_statement(statement)
+
+        self.assertEqual(
+            [
+                (self.deposits["ola"], BankStatementMatchType.EXACT),
+                (self.deposits["kari"], BankStatementMatchType.PARTIAL),
+                (self.deposits["per"], BankStatementMatchType.FUZZY),
+            ],
+            [(match.deposit, match.match_type) for match in matches],
+        )
+        self.assertEqual([5], [line.line_number for line in unmatched])
+
+    def test__match_bank_statement__each_deposit_matched_once(self):
+        statement = self.statement(
+            ("01.09.2023", "Ola Nordmann", "", "500"),
+            ("01.09.2023", "Ola Nordmann", "", "500"),
+        )
+
+        matches, unmatched = match_bank_statement(statement)
+
+        self.assertEqual(1, len(matches))
+        self.assertEqual(1, len(unmatched))
+
+    def test__match_bank_statement__exact_names_matched_before_fuzzy(self):
+        statement = self.statement(
+            ("01.09.2023", "Ola Nordman", "", "500"),
+            ("02.09.2023", "Ola Nordmann", "", "500"),
+        )
+
+        matches, unmatched = match_bank_statement(statement)
+
+        self.assertEqual(
+            [(3, self.deposits["ola"], BankStatementMatchType.EXACT)],
+            [(m.line.line_number, m.deposit, m.match_type) for m in matches],
+        )
+        self.assertEqual([2], [line.line_number for line in unmatched])
+
+    def test__match_bank_statement__closest_fuzzy_name_matched(self):
+        kristina, kristian = [
+            DepositFactory.create(
+                account=SociBankAccountFactory(
+                    user=UserFactory(first_name=first_name, last_name="Olsen")
+                ),
+                amount=200,
+                receipt=None,
+                approved_by=None,
+                deposit_method=Deposit.DepositMethod.BANK_TRANSFER,
+            )
+            for first_name in ["Kristina", "Kristian"]
+        ]
+        # The older deposit is not picked just for being first
+        Deposit.objects.filter(pk=kristina.pk).update(
+            created_at=kristian.created_at - timedelta(days=1)
+        )
+
+        matches, _ = match_bank_statement(
+            self.statement(("01.09.2023", "Kristian Olsn", "", "200"))
+        )
+
+        self.assertEqual([kristian], [match.deposit for match in matches])
+
+    def test__match_bank_statement__thousands_separators(self):
+        self.deposits["ola"].amount = 1500
+        self.deposits["ola"].save()
+
+        for amount in ["1.500", "1 500,00", "1.500,00", "1,500.00"]:
+            with self.subTest(amount=amount):
+                matches, _ = match_bank_statement(
+                    self.statement(("01.09.2023", "Ola Nordmann", "", amount))
+                )
+                self.assertEqual(
+                    [self.deposits["ola"]], [match.deposit for match in matches]
+                )
+
+        matches, _ = match_bank_statement(
+            self.statement(("01.09.2023", "Ola Nordmann", "", "1.5"))
+        )
+        self.assertEqual([], matches)
+
+    def test__match_bank_statement__single_query_for_many_lines(self):
+        rows = [("01.09.2023", f"Person {i}", "", "100") for i in range(5000)]
+
+        with self.assertNumQueries(1):
+            matches, unmatched = match_bank_statement(self.statement(*rows))
+
+        self.assertEqual(0, len(matches))
+        self.assertEqual(5000, len(unmatched))
+
+    def test__match_bank_statement__missing_columns__raises(self):
+        with self.assertRaises(ValueError):
+            match_bank_statement(BytesIO(b"Dato,Tekst,Belop\n01.09.2023,Ola,500"))
+
+    def test__match_bank_statement__windows_1252_export(self):
+        statement = self.statement(
+            ("01.09.2023", "Kari Marie Østby", "", "300,00"),
+            encoding="cp1252",
+        )
+
+        matches, unmatched = match_bank_statement(statement)
+
+        self.assertEqual([self.deposits["kari"]], [match.deposit for match in matches])
+        self.assertEqual(0, len(unmatched))
+
+    def test__match_bank_statement__undecodable_file__raises_value_error(self):
+        with self.assertRaisesMessage(ValueError, "neither UTF-8 nor Windows-1252"):
+            match_bank_statement(
+                self.statement(
+                    ("01.09.2023", "\x81\x8d\x8f", "", "1"), encoding="latin-1"
+                )
+            )
+
+
+@override_settings(STRIPE_WEBHOOK_SECRET="whsec_test")
+class TestStripeWebhookInbox(TestCase):
+    def setUp(self) -> None:
+        self.bank_account = SociBankAccountFactory.create(balance=0)
+        self.deposit = DepositFactory.create(
+            account=self.bank_account,
+            amount=103,
+            resolved_amount=100,
+            receipt=None,
+            approved_by=None,
+            deposit_method=Deposit.DepositMethod.STRIPE,
+            stripe_payment_id="pi_test",
+        )
+
+    def payment_succeeded(self, **kwargs):
+        return StripeEventFactory.create(data__object__id="pi_test", **kwargs)
+
+    def charge_refunded(self, **kwargs):
+        return StripeEventFactory.create(
+            type="charge.refunded",
+            data__object={"object": "charge", "payment_intent": "pi_test"},
+            **kwargs,
+        )
+
+    def post_event(self, event, secret="whsec_test"):
+        payload = json.dumps(event)
+        timestamp = int(time.time())
+        signature = hmac.new(
+            secret.encode(), f"{timestamp}.{payload}".encode(), hashlib.sha256
+        ).hexdigest()
+        return self.client.post(
+            "/economy/stripe-webhook",
+            data=payload,
+            content_type="application/json",
+            HTTP_STRIPE_SIGNATURE=f"t={timestamp},v1={signature}",
+        )
+
+    def process_events(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("processstripeevents", stdout=StringIO())
+
+    def test__webhook__processes_event_once(self):
+        event = self.payment_succeeded()
+
+        first = self.post_event(event)
+        second = self.post_event(event)
+
+        self.assertEqual(200, first.status_code)
+        self.assertEqual(200, second.status_code)
+        stored = StripeWebhookEvent.objects.get()
+        self.assertEqual(StripeWebhookEvent.Status.PROCESSED, stored.status)
+        self.assertEqual(1, stored.attempts)
+        self.assertEqual("pi_test", stored.payment_intent_id)
+        self.deposit.refresh_from_db()
+        self.bank_account.refresh_from_db()
+        self.assertTrue(self.deposit.approved)
+        self.assertEqual(100, self.bank_account.balance)
+
+    def test__webhook_with_invalid_signature__rejected(self):
+        response = self.post_event(self.payment_succeeded(), secret="whsec_wrong")
+
+        self.assertEqual(400, response.status_code)
+        self.assertFalse(StripeWebhookEvent.objects.exists())
+
+    def test__webhook__ignores_unknown_types(self):
+        self.post_event(StripeEventFactory.create(type="customer.created"))
+
+        self.assertEqual(
+            StripeWebhookEvent.Status.IGNORED, StripeWebhookEvent.objects.get().status
+        )
+
+    def test__failed_event__later_events_of_payment_intent_wait(self):
+        created = int(time.time())
+        Deposit.objects.filter(pk=self.deposit.pk).update(stripe_payment_id="pi_later")
+        first = self.post_event(self.payment_succeeded(created=created))
+        self.post_event(self.charge_refunded(created=created + 1))
+
+        # Stripe does not redeliver the event, the command retries it instead
+        self.assertEqual(200, first.status_code)
+        statuses = dict(StripeWebhookEvent.objects.values_list("type", "status"))
+        self.assertEqual(
+            StripeWebhookEvent.Status.FAILED, statuses["payment_intent.succeeded"]
+        )
+        self.assertEqual(StripeWebhookEvent.Status.PENDING, statuses["charge.refunded"])
+
+        # The deposit shows up, and the next run processes both events in order
+        Deposit.objects.filter(pk=self.deposit.pk).update(stripe_payment_id="pi_test")
+        self.process_events()
+
+        self.bank_account.refresh_from_db()
+        self.assertEqual(0, self.bank_account.balance)
+        self.assertFalse(
+            StripeWebhookEvent.objects.exclude(
+                status=StripeWebhookEvent.Status.PROCESSED
+            ).exists()
+        )
+
+    def test__replay_events_since__backfills_missing_events_once(self):
+        self.post_event(self.payment_succeeded(id="evt_delivered"))
+        self.process_events()
+        missing = self.charge_refunded(id="evt_missing")
+        fetched = [StripeWebhookEvent.objects.get().payload, missing]
+
+        with patch(
+            "economy.management.commands.replaystripeevents.fetch_stripe_events",
+            return_value=fetched,
+        ):
+            call_command(
+                "replaystripeevents", "--since", "2023-09-01T00:00", stdout=StringIO()
+            )
+
+        self.assertEqual(2, StripeWebhookEvent.objects.count())
+        self.bank_account.refresh_from_db()
+        self.assertEqual(0, self.bank_account.balance)
+
+
+class FakeInvalidRequestError(Exception):
+    def __init__(self, message, param=None, code=None):
+        super().__init__(message)
+        self.param = param
+        self.code = code
+
+
+class FakeStripe:
+    """
+    Stands in for the stripe module, counting the API calls made through it
+    """
+
+    error = Dict(InvalidRequestError=FakeInvalidRequestError)
+
+    def __init__(self, customers=()):
+        self.calls = Counter()
+        self.customers = [
+            {"id": f"cus_{i}", "email": email} for i, email in enumerate(customers)
+        ]
+        fake = self
+
+        class Customer:
+            @staticmethod
+            def search(query):
+                fake.calls["Customer.search"] += 1
+                email = query.split("'")[1]
+                return {"data": [c for c in fake.customers if c["email"] == email]}
+
+            @staticmethod
+            def create(name, email, phone):
+                fake.calls["Customer.create"] += 1
+                customer = Dict(id=f"cus_new_{len(fake.customers)}", email=email)
+                fake.customers.append(customer)
+                return customer
+
+            @staticmethod
+            def list(limit):
+                fake.calls["Customer.list"] += 1
+                return Dict(auto_paging_iter=lambda: iter(fake.customers))
+
+        class PaymentIntent:
+            @staticmethod
+            def create(**kwargs):
+                fake.calls["PaymentIntent.create"] += 1
+                customer = kwargs.get("customer")
+                if customer and customer not in [c["id"] for c in fake.customers]:
+                    raise FakeInvalidRequestError(
+                        f"No such customer: '{customer}'",
+                        param="customer",
+                        code="resource_missing",
+                    )
+                return Dict(id="pi_fake", **kwargs)
+
+        self.Customer = Customer
+        self.PaymentIntent = PaymentIntent
+
+
+@override_settings(STRIPE_SECRET_KEY="sk_test")
+class TestStripeCustomers(TestCase):
+    def setUp(self) -> None:
+        self.bank_account = SociBankAccountFactory.create(
+            user=UserFactory(email="ola@example.com")
+        )
+        self.user = self.bank_account.user
+
+    def create_intent(self, fake_stripe, **kwargs):
+        with patch.dict(sys.modules, {"stripe": fake_stripe}):
+            return stripe_create_payment_intent(100, customer=self.user, **kwargs)
+
+    def test__payment_intent__customer_searched_only_first_time(self):
+        fake_stripe = FakeStripe(customers=["ola@example.com"])
+
+        self.create_intent(fake_stripe)
+        self.user.bank_account.refresh_from_db()
+        fake_stripe.calls.clear()
+        intent, _ = self.create_intent(fake_stripe)
+
+        self.assertEqual(Counter({"PaymentIntent.create": 1}), fake_stripe.calls)
+        self.assertEqual("cus_0", intent.customer)
+        self.assertEqual("cus_0", self.user.bank_account.stripe_customer_id)
+
+    def test__payment_intent__missing_customer_created_once(self):
+        fake_stripe = FakeStripe()
+
+        self.create_intent(fake_stripe)
+        self.user.bank_account.refresh_from_db()
+        self.create_intent(fake_stripe)
+
+        self.assertEqual(1, fake_stripe.calls["Customer.create"])
+        self.assertEqual(1, fake_stripe.calls["Customer.search"])
+
+    def test__saved_card__only_payment_intent_created(self):
+        self.bank_account.stripe_customer_id = "cus_0"
+        self.bank_account.save()
+        fake_stripe = FakeStripe(customers=["ola@example.com"])
+
+        self.create_intent(fake_stripe, charge_saved_card=True)
+
+        self.assertEqual(Counter({"PaymentIntent.create": 1}), fake_stripe.calls)
+
+    def test__customer_deleted_in_stripe__new_customer_created(self):
+        self.bank_account.stripe_customer_id = "cus_deleted"
+        self.bank_account.save()
+        fake_stripe = FakeStripe()
+
+        intent, _ = self.create_intent(fake_stripe)
+
+        self.bank_account.refresh_from_db()
+        self.assertEqual("cus_new_0", intent.customer)
+        self.assertEqual("cus_new_0", self.bank_account.stripe_customer_id)
+        self.assertEqual(2, fake_stripe.calls["PaymentIntent.create"])
+
+    def test__warm_stripe_customers__maps_accounts_in_bulk(self):
+        other = SociBankAccountFactory.create(
+            user=UserFactory(email="kari@example.com")
+        )
+        SociBankAccountFactory.create(user=UserFactory(email="per@example.com"))
+        fake_stripe = FakeStripe(
+            customers=["OLA@example.com", "kari@example.com", "kari@example.com"]
+        )
+
+        with patch.dict(sys.modules, {"stripe": fake_stripe}):
+            call_command("warmstripecustomers", stdout=StringIO())
+
+        self.bank_account.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual("cus_0", self.bank_account.stripe_customer_id)
+        self.assertIsNone(other.stripe_customer_id)
+        self.assertEqual(Counter({"Customer.list": 1}), fake_stripe.calls)
+
+
+class TestExpenditureSeries(TestCase):
+    def setUp(self) -> None:
+        self.bank_account = SociBankAccountFactory.create()
+        self.today = timezone.localdate()
+        self.old_order = ProductOrderFactory.create(source=self.bank_account, cost=40)
+        ProductOrder.objects.filter(pk=self.old_order.pk).update(
+            purchased_at=timezone.now() - timezone.timedelta(days=100)
+        )
+        ProductOrderFactory.create_batch(2, source=self.bank_account, cost=30)
+
+    def test__this_month__one_query_and_every_day_of_the_month(self):
+        with self.assertNumQueries(1):
+            series, total = get_expenditure_series(
+                self.bank_account, ExpenditureDateRange.THIS_MONTH
+            )
+
+        days_in_month = calendar.monthrange(self.today.year, self.today.month)[1]
+        self.assertEqual(days_in_month, len(series))
+        self.assertEqual(60, total)
+        self.assertEqual(60, dict(series)[self.today])
+
+    def test__all_time_by_month__rollup_gives_same_series(self):
+        live_series, live_total = get_expenditure_series(
+            self.bank_account, ExpenditureDateRange.ALL_TIME
+        )
+        call_command("rollupdailyspend", stdout=StringIO())
+        rolled_up_series, rolled_up_total = get_expenditure_series(
+            self.bank_account, ExpenditureDateRange.ALL_TIME
+        )
+
+        self.assertTrue(DailyAccountSpend.objects.exists())
+        self.assertEqual(100, live_total)
+        self.assertEqual(live_series, rolled_up_series)
+        self.assertEqual(live_total, rolled_up_total)
+        self.assertEqual(self.today.replace(day=1), rolled_up_series[-1][0])
+
+    def test__this_semester_by_week__periods_start_on_monday(self):
+        series, _ = get_expenditure_series(
+            self.bank_account,
+            ExpenditureDateRange.THIS_SEMESTER,
+            ExpenditureGranularity.WEEK,
+        )
+
+        self.assertTrue(all(day.weekday() == 0 for day, _ in series))
+        self.assertEqual(60, series[-1][1])
+
+
 class TestAuctionPriceCalculation(TestCase):
     def setUp(self) -> None:
         self.tuborg = SociProductFactory.create(
@@ -94,3 +858,123 @@ class TestAuctionPriceCalculation(TestCase):
         expected = math.floor(5 * multiplier + self.tuborg.purchase_price)
         calculated_price = calculate_stock_price_for_product(self.tuborg.id)
         self.assertEqual(expected, calculated_price)
+
+
+class TestStockMarketPriceEngine(TestCase):
+    def setUp(self) -> None:
+        self.tuborg = SociProductFactory.create(
+            name="tuborg", price=25, purchase_price=20
+        )
+        self.ice = SociProductFactory.create(
+            name="Smirnoff Ice", price=45, purchase_price=39
+        )
+        self.chips = SociProductFactory.create(name="chips", price=20)
+
+    def test__engine_price__matches_single_product_calculation(self):
+        ProductOrderFactory.create(product=self.tuborg, order_size=4)
+        ProductOrderFactory.create(product=self.ice, order_size=2)
+        ProductGhostOrder.objects.create(product=self.ice)
+
+        engine = StockMarketPriceEngine([self.tuborg, self.ice, self.chips])
+
+        for product in [self.tuborg, self.ice, self.chips]:
+            self.assertEqual(
+                calculate_stock_price_for_product(product.id),
+                engine.price(product.id),
+            )
+
+    def test__purchases_before_market_crash__not_included_in_calculation(self):
+        ProductOrderFactory.create(product=self.tuborg, order_size=4)
+        StockMarketCrash.objects.create()
+        ProductOrderFactory.create(product=self.tuborg, order_size=1)
+
+        engine = StockMarketPriceEngine([self.tuborg])
+
+        multiplier = settings.STOCK_MODE_PRICE_MULTIPLIER
+        expected = math.floor(1 * multiplier + self.tuborg.purchase_price)
+        self.assertEqual(expected, engine.price(self.tuborg.id))
+
+    def test__price_history__returns_a_data_point_per_minute(self):
+        ProductOrderFactory.create(product=self.tuborg, order_size=3)
+
+        history = StockMarketPriceEngine([self.tuborg]).price_history(self.tuborg.id)
+
+        self.assertEqual(31, len(history))
+        self.assertEqual(
+            history[-1][1], calculate_stock_price_for_product(self.tuborg.id)
+        )
+
+    def test__price_history_for_all_products__constant_query_count(self):
+        def query_count_for_history():
+            with CaptureQueriesContext(connection) as context:
+                engine = StockMarketPriceEngine(get_stock_market_products())
+                for product_id in engine.products:
+                    engine.price_history(product_id)
+            return len(context.captured_queries)
+
+        ProductOrderFactory.create(product=self.tuborg, order_size=3)
+        baseline = query_count_for_history()
+
+        for product in SociProductFactory.create_batch(20, purchase_price=10):
+            ProductOrderFactory.create(product=product, order_size=2)
+            ProductGhostOrder.objects.create(product=product)
+
+        self.assertEqual(baseline, query_count_for_history())
+
+
+class TestStockPriceTicker(TestCase):
+    def setUp(self) -> None:
+        self.ticker = StockPriceTicker()
+        self.tuborg = SociProductFactory.create(
+            name="tuborg", price=25, purchase_price=20
+        )
+        self.chips = SociProductFactory.create(name="chips", price=20)
+
+    def test__ticker_price__matches_price_engine_after_rebuild(self):
+        ProductOrderFactory.create(product=self.tuborg, order_size=4)
+        ProductGhostOrder.objects.create(product=self.tuborg)
+
+        self.assertEqual(
+            calculate_stock_price_for_product(self.tuborg.id),
+            self.ticker.price(self.tuborg),
+        )
+        self.assertEqual(self.chips.price, self.ticker.price(self.chips))
+
+    @patch("economy.price_ticker.broadcast_stock_price_change")
+    def test__record_sales__updates_price_without_queries(self, broadcast):
+        initial_price = self.ticker.price(self.tuborg)
+
+        with self.assertNumQueries(0):
+            self.ticker.record_sales(self.tuborg, 3)
+            price = self.ticker.price(self.tuborg)
+
+        multiplier = settings.STOCK_MODE_PRICE_MULTIPLIER
+        self.assertEqual(math.floor(initial_price + 3 * multiplier), price)
+        broadcast.assert_called_once_with(self.tuborg, price, initial_price)
+
+    @patch("economy.price_ticker.broadcast_stock_price_change")
+    def test__record_sales_on_cold_ticker__syncs_and_broadcasts(self, broadcast):
+        order = ProductOrderFactory.create(product=self.tuborg, order_size=3)
+
+        self.ticker.record_sales(self.tuborg, 3, order.purchased_at)
+
+        price = calculate_stock_price_for_product(self.tuborg.id)
+        self.assertEqual(price, self.ticker.price(self.tuborg))
+        broadcast.assert_called_once_with(
+            self.tuborg, price, self.tuborg.purchase_price
+        )
+
+    @patch("economy.price_ticker.broadcast_stock_market_crash")
+    def test__reset__returns_purchase_price(self, _broadcast):
+        ProductOrderFactory.create(product=self.tuborg, order_size=4)
+        self.ticker.price(self.tuborg)
+
+        self.ticker.reset()
+
+        self.assertEqual(self.tuborg.purchase_price, self.ticker.price(self.tuborg))
+        self.assertTrue(
+            all(
+                price == self.tuborg.purchase_price
+                for _, price in self.ticker.price_history(self.tuborg)
+            )
+        )
@@ -65,3 +65,16 @@ class SociSessionTest(TestCase):
     def test__total_revenue__returns_correct_sum(self):
         expected_revenue = (30 * 100) + (30 * 200)
         self.assertEqual(expected_revenue, self.session.total_revenue)
+
+    def test__close__fills_summary_columns(self):
+        session = SociSessionFactory()
+        ProductOrderFactory.create_batch(3, session=session, cost=20)
+
+        session.close()
+        session.refresh_from_db()
+
+        self.assertIsNotNone(session.closed_at)
+        self.assertEqual(60, session.summary_revenue)
+        self.assertEqual(3, session.summary_product_order_count)
+        self.assertEqual(3, session.summary_customer_count)
+        self.assertEqual(60, session.total_revenue)
@@ -1,13 +1,19 @@
 from django.conf import settings
-from django.core.files.temp import NamedTemporaryFile
-from django.template.loader import render_to_string
-from weasyprint import CSS, HTML
-from weasyprint.text.fonts import FontConfiguration
+from django.core.mail import get_connection
+from django.core.files.base import ContentFile
 
 from common.models import FeatureFlag
+from common.pdf import render_pdf
 from common.util import send_email, check_feature_flag
-from economy.models import SociProduct
+from economy.ledger import get_ledger_page
+from economy.models import LedgerEntry
+from economy.product_orders import summarize_settled_orders
 from economy.schema import BankAccountActivity
+from economy.stripe_customers import (
+    forget_stripe_customer_id,
+    get_stripe_customer_id,
+    is_missing_stripe_customer_error,
+)
 
 
 def parse_deposit(deposit):
@@ -82,6 +88,35 @@ def parse_transaction_history(bank_account, slice=None):
     return activities
 
 
+# Purchases are shown as a positive cost, everything else as the change to the balance
+LEDGER_COST_TYPES = (LedgerEntry.Type.PRODUCT_ORDER, LedgerEntry.Type.EXTERNAL_CHARGE)
+
+
+def parse_ledger_entry(entry):
+    amount = entry.amount
+    if entry.type in LEDGER_COST_TYPES:
+        amount = -amount
+
+    return BankAccountActivity(
+        name=entry.name,
+        amount=amount,
+        timestamp=entry.timestamp,
+        quantity=entry.quantity,
+        balance=getattr(entry, "balance", None),
+        cursor=getattr(entry, "cursor", None),
+    )
+
+
+def get_bank_account_activity(bank_account, first, after=None):
+    """
+    Reads a page of the ledger of a SociBankAccount, newest first, in the generic format
+    of a BankAccountActivity. Continue with the cursor of the last activity as `after`.
+    """
+    first = max(1, min(first, settings.LEDGER_MAX_PAGE_SIZE))
+    entries = get_ledger_page(bank_account, first, after)
+    return [parse_ledger_entry(entry) for entry in entries]
+
+
 def send_soci_order_session_invitation_email(soci_session, invited_users):
     email_list = invited_users.values_list("email", flat=True)
 
@@ -106,44 +141,15 @@ def send_soci_order_session_invitation_email(soci_session, invited_users):
     )
 
 
-def create_food_order_pdf_file(order_session):
-    orders = order_session.orders.filter(product__type=SociProduct.Type.FOOD)
-
-    summary = []
-    for product in orders.values("product").distinct():
-        product_obj = SociProduct.objects.get(pk=product["product"])
-        order_count = orders.filter(product=product_obj).count()
-        summary.append(
-            {
-                "name": product_obj.name,
-                "count": order_count,
-            }
-        )
-
+def create_food_order_pdf_file(settled_orders):
     context = {
-        "orders": orders,
-        "summary": summary,
+        "orders": settled_orders,
+        "summary": summarize_settled_orders(settled_orders),
     }
-    html_content = render_to_string(
-        template_name="economy/food_orders.html", context=context
-    )
-
-    font_config = FontConfiguration()
-    css = CSS(
-        string="""
-        @import url('https://fonts.googleapis.com/css?family=Work+Sans:300,400,600,700&display=swap');
-    """,
-        font_config=font_config,
-    )
-
-    file = NamedTemporaryFile(delete=True)
-    HTML(string=html_content, base_url=settings.BASE_URL).write_pdf(
-        file, stylesheets=[css], font_config=font_config
-    )
-    return file
+    return ContentFile(render_pdf("economy/food_orders.html", context))
 
 
-def send_deposit_approved_email(deposit):
+def send_deposit_approved_email(deposit, connection=None):
     email_list = [deposit.account.user.email]
 
     content = f"""
@@ -168,9 +174,26 @@ def send_deposit_approved_email(deposit):
         subject="Innskudd godkjent",
         message=content,
         html_message=html_content,
+        connection=connection,
     )
 
 
+def send_deposit_approved_emails(deposits):
+    """
+    Notifies the owners of a batch of approved deposits. The emails are queued in the
+    outbox when it is enabled, and otherwise sent over a single connection to the mail
+    server instead of opening one per email.
+    """
+    if settings.EMAIL_OUTBOX_ENABLED:
+        for deposit in deposits:
+            send_deposit_approved_email(deposit)
+        return
+
+    with get_connection(fail_silently=True) as connection:
+        for deposit in deposits:
+            send_deposit_approved_email(deposit, connection=connection)
+
+
 def send_deposit_refunded_email(deposit):
     email_list = [deposit.account.user.email]
 
@@ -224,6 +247,23 @@ def send_external_charge_email(user, amount, bar_tab_customer):
     )
 
 
+def _create_customer_payment_intent(stripe, customer, amount):
+    # Stored on the bank account, so Stripe is only searched the first time
+    customer_id = get_stripe_customer_id(customer)
+
+    return stripe.PaymentIntent.create(
+        amount=amount,
+        currency="nok",
+        automatic_payment_methods={"enabled": True},
+        customer=customer_id,
+        payment_method_options={
+            "card": {
+                "request_three_d_secure": "any",
+            }
+        },
+    )
+
+
 def stripe_create_payment_intent(amount, customer=None, charge_saved_card=False):
     import stripe
     import math
@@ -246,31 +286,22 @@ def stripe_create_payment_intent(amount, customer=None, charge_saved_card=False)
     stripe.api_key = STRIPE_API_KEY
 
     if customer:
-        customer_id = stripe_search_customer(f"email:'{customer.email}'")
-
-        if not customer_id:
-            customer_id = create_new_stripe_customer(customer)
-
-        if charge_saved_card:
-            try:
-                data = stripe.PaymentMethod.list(customer=customer_id, type="card")
-                default_payment_method = data["data"][0]["id"]
-            except IndexError:
-                default_payment_method = None
-        else:
-            default_payment_method = None
-
-        intent = stripe.PaymentIntent.create(
-            amount=amount_including_fees_in_smallest_currency,
-            currency="nok",
-            automatic_payment_methods={"enabled": True},
-            customer=customer_id,
-            payment_method_options={
-                "card": {
-                    "request_three_d_secure": "any",
-                }
-            },
-        )
+        try:
+            intent = _create_customer_payment_intent(
+                stripe,
+                customer,
+                amount_including_fees_in_smallest_currency,
+            )
+        except stripe.error.InvalidRequestError as e:
+            if not is_missing_stripe_customer_error(e):
+                raise
+            # The stored customer was deleted in Stripe, so it is looked up again
+            forget_stripe_customer_id(customer.bank_account)
+            intent = _create_customer_payment_intent(
+                stripe,
+                customer,
+                amount_including_fees_in_smallest_currency,
+            )
     else:
         intent = stripe.PaymentIntent.create(
             amount=amount_including_fees_in_smallest_currency,
@@ -280,33 +311,6 @@ def stripe_create_payment_intent(amount, customer=None, charge_saved_card=False)
     return intent, amount_including_fees_in_nok
 
 
-def stripe_search_customer(query_string):
-    import stripe
-
-    res = stripe.Customer.search(query=query_string)
-    data = res["data"]
-
-    if len(data) == 0:
-        return None
-
-    if len(data) > 1:
-        raise Exception(
-            f"Multiple Stripe customers resolved for query string: {query_string}"
-        )
-
-    customer_data = data[0]
-    return customer_data["id"]
-
-
-def create_new_stripe_customer(customer):
-    import stripe
-
-    customer = stripe.Customer.create(
-        name=customer.get_full_name(), email=customer.email, phone=customer.phone
-    )
-    return customer.id
-
-
 def send_external_charge_webhook(url, payload):
     pass
 
@@ -7,11 +7,13 @@ from django.shortcuts import render
 from graphene_django_cud.util import disambiguate_id, disambiguate_ids
 
 from common.decorators import view_feature_flag_required
-from economy.models import SociProduct, Deposit, SociBankAccount, ExternalCharge
-from weasyprint import CSS, HTML
-
-from django.template.loader import render_to_string
-
+from common.pdf import render_pdf
+from economy.ledger import write_external_charge_entry
+from economy.models import SociProduct, SociBankAccount, ExternalCharge
+from economy.stripe_webhooks import (
+    process_received_stripe_event,
+    record_stripe_event,
+)
 from economy.utils import send_external_charge_email, send_external_charge_webhook
 from users.models import User
 from django.utils import timezone
@@ -22,15 +24,10 @@ import qrcode
 
 
 def generate_pdf_response_from_template(context, file_name, template_name):
-    html_content = render_to_string(template_name=template_name, context=context)
-    css = CSS(string="")
-
-    response = HttpResponse(content_type="application/pdf")
-    response["Content-Disposition"] = f"inline; filename={file_name}"
-
-    HTML(string=html_content, base_url=settings.BASE_URL).write_pdf(
-        response, stylesheets=[css]
+    response = HttpResponse(
+        render_pdf(template_name, context), content_type="application/pdf"
     )
+    response["Content-Disposition"] = f"inline; filename={file_name}"
     return response
 
 
@@ -61,67 +58,23 @@ def download_soci_session_list_pdf(request):
 
 
 def stripe_webhook(request):
+    """
+    Verifies, stores and processes the event. The event is acknowledged even when
+    processing fails, as it is stored and retried by the processstripeevents command.
+    """
     payload = request.body
-    sig_header = request.headers["STRIPE_SIGNATURE"]
+    sig_header = request.headers.get("STRIPE_SIGNATURE", "")
 
     try:
-        event = stripe.Webhook.construct_event(
+        stripe.Webhook.construct_event(
             payload, sig_header, settings.STRIPE_WEBHOOK_SECRET
         )
-    except ValueError as e:
-        # Invalid payload
-        raise e
-    except stripe.error.SignatureVerificationError as e:
-        # Invalid signature
-        raise e
-
-    if event["type"] == "payment_intent.succeeded":
-        payment_intent = event["data"]["object"]
-        intent_id = payment_intent["id"]
-        deposit = Deposit.objects.get(stripe_payment_id=intent_id)
-        if deposit.approved:
-            # Already approved. Do nothing
-            return JsonResponse(data={"success": True})
-
-        with transaction.atomic():
-            from economy.utils import send_deposit_approved_email
-
-            deposit.approved_at = timezone.now()
-            deposit.approved = True
-            deposit.save()
-            deposit.account.add_funds(deposit.resolved_amount)
-            if deposit.account.user.notify_on_deposit:
-                send_deposit_approved_email(deposit)
-
-    elif event["type"] == "charge.refunded":
-        event_object = event["data"]["object"]
-        payment_intent_id = event_object["payment_intent"]
-
-        deposit = Deposit.objects.get(stripe_payment_id=payment_intent_id)
-
-        if not deposit.approved:
-            # Already invalidated. Do nothing
-            return JsonResponse(data={"success": True})
-
-        amount_captured = event_object["amount_captured"]
-        amount_refunded = event_object["amount_refunded"]
-        amount = event_object["amount"]
-
-        calculated_fee = deposit.amount - deposit.resolved_amount
-
-        with transaction.atomic():
-            from economy.utils import send_deposit_refunded_email
-
-            deposit.approved = False
-            deposit.account.remove_funds(deposit.resolved_amount)
-            deposit.save()
-            if deposit.account.user.notify_on_deposit:
-                send_deposit_refunded_email(deposit)
-                # Could be confusing user flow if we don't delete the deposit
-                deposit.delete()
-    else:
-        raise Exception(f"Unhandled event type {event['type']}")
+    except (ValueError, stripe.error.SignatureVerificationError):
+        # Invalid payload or signature
+        return JsonResponse(data={"success": False}, status=status.HTTP_400_BAD_REQUEST)
 
+    webhook_event, _ = record_stripe_event(json.loads(payload))
+    process_received_stripe_event(webhook_event)
     return JsonResponse(data={"success": True})
 
 
@@ -171,14 +124,16 @@ def external_charge_view(request, bank_account_secret, *args, **kwargs):
 
         reference = form.cleaned_data["reference"]
 
-        account.remove_funds(amount)
-        account.regenerate_external_charge_secret()
-        ExternalCharge.objects.create(
-            bank_account=account,
-            amount=amount,
-            bar_tab_customer=bar_tab_customer,
-            reference=reference,
-        )
+        with transaction.atomic():
+            account.remove_funds(amount)
+            account.regenerate_external_charge_secret()
+            external_charge = ExternalCharge.objects.create(
+                bank_account=account,
+                amount=amount,
+                bar_tab_customer=bar_tab_customer,
+                reference=reference,
+            )
+            write_external_charge_entry(external_charge)
         # ToDo: add or create a baartab and add an entry
         if account.user.notify_on_deposit:  # change to external charge flag
             send_external_charge_email(account.user, amount, bar_tab_customer)
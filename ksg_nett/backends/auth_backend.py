@@ -1,3 +1,6 @@
+from users.permissions import get_user_type_permissions
+
+
 class UserTypeBackend:
     def authenticate(self, request, username=None, password=None):
         return None
@@ -10,7 +13,7 @@ class UserTypeBackend:
         if not hasattr(user_obj, "user_types"):
             return False
 
-        return perm in self.get_all_permissions(user_obj)
+        return perm in get_user_type_permissions(user_obj)
 
     def get_all_permissions(self, user_obj, obj=None):
         """
@@ -18,18 +21,7 @@ class UserTypeBackend:
         :param user_obj:
         :return:
         """
-        perms = set()
         if not hasattr(user_obj, "user_types"):
-            return perms
-
-        for type in user_obj.user_types.all():
-            perms = perms.union(
-                {
-                    "{}.{}".format(app_label, codename)
-                    for app_label, codename in type.permissions.values_list(
-                        "content_type__app_label", "codename"
-                    )
-                }
-            )
+            return set()
 
-        return perms
+        return set(get_user_type_permissions(user_obj))
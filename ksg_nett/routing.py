@@ -1,14 +1,17 @@
 from channels.auth import AuthMiddlewareStack
 from channels.routing import ProtocolTypeRouter, URLRouter
 
+import bar_tab.routing
 import chat.routing
+import economy.routing
 
 application = ProtocolTypeRouter({
     # (http->django views is added by default)
     'websocket': AuthMiddlewareStack(
         URLRouter(
             chat.routing.websocket_urlpatterns
+            + economy.routing.websocket_urlpatterns
+            + bar_tab.routing.websocket_urlpatterns
         )
     ),
 })
-
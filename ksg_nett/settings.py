@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/1.10/ref/settings/
 """
 import json
 import os
+import tempfile
 from datetime import timedelta
 import warnings
 from corsheaders.defaults import default_headers
@@ -217,6 +218,14 @@ MEDIA_URL = "http://localhost:8000/media/"
 APP_URL = "http://localhost:3012"
 BASE_URL = "http://localhost:8000"
 
+# Number of processes PDFs are rendered in. With 0 PDFs are rendered in the process
+# that asks for them
+PDF_RENDER_WORKERS = int(os.environ.get("PDF_RENDER_WORKERS", 2))
+
+# Seconds the customer summaries of a bar tab are cached. They are checked against the
+# orders of the bar tab on every read, so this only bounds how long unused ones are kept
+BAR_TAB_SUMMARY_CACHE_TIMEOUT = 60 * 60
+
 MAX_MEDIA_SIZE = 128 * (1024**2)
 
 # Given in percentage
@@ -263,20 +272,61 @@ SWAGGER_SETTINGS = {
 
 REDOC_SETTINGS = {"PATH_IN_MIDDLE": True, "REQUIRED_PROPS_FIRST": True}
 
+# EMAIL SETTINGS
+# ------------------------------
+# When enabled send_email queues emails in the outbox instead of sending them, and the
+# sendoutbox command sends them in batches
+EMAIL_OUTBOX_ENABLED = False
+EMAIL_OUTBOX_BATCH_SIZE = 50
+EMAIL_OUTBOX_MAX_ATTEMPTS = 5
+# Delay before the first retry of a failed email, doubled for every later attempt
+EMAIL_OUTBOX_RETRY_DELAY = timedelta(minutes=1)
+EMAIL_OUTBOX_MAX_RETRY_DELAY = timedelta(hours=1)
+# How long a worker has to send a batch before other workers may pick it up
+EMAIL_OUTBOX_LEASE = timedelta(minutes=5)
+# Personalized mass emails, like the invitations to admission interviews, are sent
+# over this many connections, at no more than MAIL_MERGE_RATE_LIMIT emails per second
+MAIL_MERGE_CONCURRENCY = 4
+MAIL_MERGE_RATE_LIMIT = None
+
+# JOB QUEUE SETTINGS
+# ------------------------------
+# Number of worker processes the runworkers command starts to run queued jobs
+JOB_WORKERS = 2
+JOB_MAX_ATTEMPTS = 3
+# Delay before the first retry of a failed job, doubled for every later attempt
+JOB_RETRY_DELAY = timedelta(seconds=30)
+JOB_MAX_RETRY_DELAY = timedelta(hours=1)
+# How long a worker has to finish a job before it is assumed lost and run again
+JOB_LEASE = timedelta(minutes=30)
+# Longest a worker waits before trying again after failing to reach the database. The
+# wait starts at the polling interval and doubles for every failure in a row
+JOB_WORKER_MAX_ERROR_DELAY = timedelta(minutes=1)
+
 # ECONOMY SETTINGS
 # ------------------------------
 SOCI_MASTER_ACCOUNT_CARD_ID = 0xBADCAFEBABE  # Real card ids are 10 digits, while this is 14, meaning no collisions
 DIRECT_CHARGE_SKU = "X-BELOP"
 WANTED_LIST_THRESHOLD = -2000
 OWES_MONEY_THRESHOLD = 0
+# Debt collection emails are sent over this many connections to the mail server, at
+# no more than DEBT_COLLECTION_EMAIL_RATE_LIMIT emails per second in total
+DEBT_COLLECTION_EMAIL_CONCURRENCY = 4
+DEBT_COLLECTION_EMAIL_RATE_LIMIT = 5
+# Times a debt collection email is tried before it is given up, so an address that
+# keeps bouncing does not hold the run open and keep later runs from starting
+DEBT_COLLECTION_MAX_ATTEMPTS = 3
 SOCI_GOLD = []
 STRIPE_SECRET_KEY = os.environ.get("STRIPE_SECRET_KEY", None)
 STRIPE_WEBHOOK_SECRET = os.environ.get("STRIPE_WEBHOOK_SECRET", None)
 STRIPE_FLAT_FEE = 2  # in NOK
 STRIPE_PERCENTAGE_FEE = 2.4
+# Failed webhook events are retried by processstripeevents until this many attempts
+STRIPE_WEBHOOK_MAX_ATTEMPTS = 5
 
 STOCK_MODE_PRICE_MULTIPLIER = 1.0  # multiplies with sales volume to get new prices
 STOCK_MODE_PRICE_WINDOW = timedelta(minutes=30)
+STOCK_MODE_TICKER_RESYNC_INTERVAL = timedelta(minutes=1)
 
 DEPOSIT_TIME_RESTRICTION_HOUR = os.environ.get("DEPOSIT_TIME_RESTRICTION_HOUR", 20)
 LANGUAGE_SESSION_KEY = "language"
@@ -289,9 +339,38 @@ BANK_TRANSFER_DEPOSIT_FEATURE_FLAG = "bank_transfer_deposit"
 DEPOSIT_TIME_RESTRICTIONS_FEATURE_FLAG = "deposit_time_restrictions"
 EXTERNAL_CHARGING_FEATURE_FLAG = "external_charging"
 X_APP_STOCK_MARKET_MODE = "x-app-stock-market-mode"
+# Seconds a process uses its cached feature flags before checking they are current,
+# which bounds how long a toggle takes to reach every worker
+FEATURE_FLAG_REFRESH_INTERVAL = 5
 
 EXTERNAL_CHARGE_MAX_AMOUNT = os.environ.get("EXTERNAL_CHARGE_MAX_AMOUNT", 300)
 
+# Offline X-App purchases synced through the bulk charge endpoint
+BULK_CHARGE_MAX_BASKETS = 1000
+BULK_CHARGE_CHUNK_SIZE = 250
+
+# Paging of the account ledger shown as transaction history
+LEDGER_PAGE_SIZE = 50
+LEDGER_MAX_PAGE_SIZE = 200
+LEDGER_LAST_TRANSACTIONS_COUNT = 10
+
+# Number of accounts whose balance is recomputed per set of aggregate queries
+BALANCE_RECONCILIATION_CHUNK_SIZE = 2000
+
+# Expenditure series longer than this many days read complete days from the daily
+# spend rollup, which is refreshed by the rollupdailyspend command
+EXPENDITURE_ROLLUP_MIN_DAYS = 62
+
+# Header of the bank statement CSV export columns read when matching pending deposits
+BANK_STATEMENT_CSV_COLUMNS = {
+    "date": "Dato",
+    "text": "Forklaring",
+    "amount": "Inn på konto",
+}
+BANK_STATEMENT_DATE_FORMATS = ["%d.%m.%Y", "%Y-%m-%d"]
+# How similar each part of a name has to be to count as a near-miss match, from 0 to 1
+BANK_STATEMENT_NAME_MATCH_CUTOFF = 0.8
+
 # Channels
 ASGI_APPLICATION = "ksg_nett.routing.application"
 # ASGI_APPLICATION = "ksg_nett.asgi.application"
@@ -308,6 +387,76 @@ REDIS = {
     "port": os.environ.get("REDIS_PORT", 6379),
 }
 CHAT_STATE_REDIS_DB = 1
+CARD_LOOKUP_CACHE_REDIS_DB = 2
+PERMISSION_CACHE_REDIS_DB = 3
+
+# Caches
+# The card lookup cache holds card uuid to account snapshots for the balance and
+# display paths of card taps, never for authentication. It is a bounded LRU in local
+# memory by default, set CARD_LOOKUP_CACHE_USE_REDIS to share it between workers.
+# Saving an account or user only clears the snapshot in the worker that saved it, so
+# with the local memory cache other workers can show an old name or Soci gold status
+# for up to CARD_LOOKUP_CACHE_TIMEOUT. Balances are always read from the database.
+CARD_LOOKUP_CACHE_ALIAS = "card_lookup"
+CARD_LOOKUP_CACHE_TIMEOUT = 5 * 60
+CARD_LOOKUP_CACHE_USE_REDIS = (
+    os.getenv("CARD_LOOKUP_CACHE_USE_REDIS", "False") == "True"
+)
+
+if CARD_LOOKUP_CACHE_USE_REDIS:
+    CARD_LOOKUP_CACHE = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": f"redis://{REDIS['host']}:{REDIS['port']}/{CARD_LOOKUP_CACHE_REDIS_DB}",
+        "TIMEOUT": CARD_LOOKUP_CACHE_TIMEOUT,
+    }
+else:
+    CARD_LOOKUP_CACHE = {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "card-lookup",
+        "TIMEOUT": CARD_LOOKUP_CACHE_TIMEOUT,
+        "OPTIONS": {"MAX_ENTRIES": 2000},
+    }
+
+# The permission cache holds the permissions users get through their user types, keyed
+# by the permissions_version stored on the user, so a change takes effect in every
+# worker at once. It is local to each worker by default, set PERMISSION_CACHE_USE_REDIS
+# to share it between workers.
+PERMISSION_CACHE_ALIAS = "permissions"
+PERMISSION_CACHE_TIMEOUT = 60
+PERMISSION_CACHE_USE_REDIS = os.getenv("PERMISSION_CACHE_USE_REDIS", "False") == "True"
+
+if PERMISSION_CACHE_USE_REDIS:
+    PERMISSION_CACHE = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": f"redis://{REDIS['host']}:{REDIS['port']}/{PERMISSION_CACHE_REDIS_DB}",
+        "TIMEOUT": PERMISSION_CACHE_TIMEOUT,
+    }
+else:
+    PERMISSION_CACHE = {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "permissions",
+        "TIMEOUT": PERMISSION_CACHE_TIMEOUT,
+        "OPTIONS": {"MAX_ENTRIES": 2000},
+    }
+
+# Rendered PDFs are cached on disk by a hash of their content, which is shared by the
+# workers on a host
+PDF_CACHE_ALIAS = "pdf"
+PDF_CACHE = {
+    "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+    "LOCATION": os.path.join(tempfile.gettempdir(), "ksg-nett-pdf-cache"),
+    "TIMEOUT": 7 * 24 * 60 * 60,
+    "OPTIONS": {"MAX_ENTRIES": 1000},
+}
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    CARD_LOOKUP_CACHE_ALIAS: CARD_LOOKUP_CACHE,
+    PDF_CACHE_ALIAS: PDF_CACHE,
+    PERMISSION_CACHE_ALIAS: PERMISSION_CACHE,
+}
 
 # Load local and production settings
 try:
@@ -11,6 +11,9 @@ GRAPHIQL = False
 EMAIL_HOST = "smtp.samfundet.no"
 EMAIL_USE_TLS = True
 EMAIL_PORT = 587
+# Only enable the outbox where the sendoutbox worker runs next to the web server,
+# see run_outbox.sh
+EMAIL_OUTBOX_ENABLED = os.getenv("EMAIL_OUTBOX_ENABLED", "False") == "True"
 
 
 sentry_sdk.init(
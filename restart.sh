@@ -1,3 +1,7 @@
 #!/bin/bash
 
 supervisorctl restart ksg
+# The outbox worker only runs where EMAIL_OUTBOX_ENABLED is set, see README.md
+if supervisorctl avail | grep -q "^ksg-outbox "; then
+  supervisorctl restart ksg-outbox
+fi
@@ -0,0 +1,3 @@
+#!/usr/bin/env sh
+echo "Starting outbox worker"
+exec /home/ubuntu/.local/share/pypoetry/venv/bin/poetry run python manage.py sendoutbox;
@@ -16,6 +16,7 @@ from users.models import (
     UserType,
     UserTypeLogEntry,
 )
+from users.permissions import invalidate_user_permissions
 
 
 class MyUserChangeForm(UserChangeForm):
@@ -129,6 +130,11 @@ class MyUserAdmin(UserAdmin):
     def full_name(obj):
         return obj.get_full_name()
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # The user type inline saves the through model, which sends no m2m_changed
+        invalidate_user_permissions([form.instance.pk])
+
 
 class UsersHaveMadeOutAdmin(admin.ModelAdmin):
     readonly_fields = ("created",)
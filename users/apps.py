@@ -6,3 +6,7 @@ from django.apps import AppConfig
 
 class UsersConfig(AppConfig):
     name = "users"
+
+    def ready(self):
+        # noinspection PyUnresolvedReferences
+        import users.signals
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 14:35
+
+from django.db import migrations, models
+import uuid
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("users", "0003_knighthood"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="permissions_version",
+            field=models.UUIDField(default=uuid.uuid4, editable=False),
+        ),
+    ]
@@ -3,6 +3,7 @@ from __future__ import unicode_literals
 
 from datetime import date
 import re
+import uuid
 from django.utils import timezone
 from django.contrib.auth.models import AbstractUser, Permission
 from django.conf import settings
@@ -12,6 +13,7 @@ from django.db.models import QuerySet
 from common.context_processors import internal_groups
 from common.util import get_semester_year_shorthand
 from users.managers import UsersHaveMadeOutManager
+from users.permissions import get_user_type_permissions
 from organization.models import InternalGroup
 
 
@@ -78,6 +80,9 @@ class User(AbstractUser):
     requires_migration_wizard = models.BooleanField(default=False)
     first_time_login = models.BooleanField(default=True)
     can_rewrite_about_me = models.BooleanField(default=True)
+    # Changed whenever the permissions the user has through user types change, see
+    # users.permissions
+    permissions_version = models.UUIDField(default=uuid.uuid4, editable=False)
 
     ical_token = models.CharField(
         max_length=128, unique=True, null=True, blank=True, default=None
@@ -101,14 +106,7 @@ class User(AbstractUser):
         return f"User(name={self.get_full_name()})"
 
     def get_all_permissions(self, obj=None) -> list:
-        all_permissions = []
-        for user_type in self.user_types.all():
-            for app_label, codename in user_type.permissions.values_list(
-                "content_type__app_label", "codename"
-            ):
-                all_permissions.append(*["{}.{}".format(app_label, codename)])
-
-        return all_permissions
+        return sorted(get_user_type_permissions(self))
 
     def get_start_ksg_display(self) -> str:
         """
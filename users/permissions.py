@@ -0,0 +1,64 @@
+import uuid
+from typing import FrozenSet, Iterable
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Permission
+from django.core.cache import caches
+from django.db import transaction
+
+PERMISSIONS_KEY_PREFIX = "permissions:user:"
+
+
+def _cache():
+    return caches[settings.PERMISSION_CACHE_ALIAS]
+
+
+def _load_user_type_permissions(user_id) -> FrozenSet[str]:
+    return frozenset(
+        f"{app_label}.{codename}"
+        for app_label, codename in Permission.objects.filter(usertype__users=user_id)
+        .values_list("content_type__app_label", "codename")
+        .distinct()
+    )
+
+
+def get_user_type_permissions(user) -> FrozenSet[str]:
+    """
+    Returns the permissions a user has through their user types, as "app.codename"
+    strings. The set is loaded with one query, kept on the user object for the rest of
+    the request and cached across requests under the user's permissions_version, which
+    is changed whenever their user types or the permissions of those types change. The
+    version is loaded with the user, so every worker sees a change at once.
+    """
+    if getattr(user, "pk", None) is None:
+        return frozenset()
+
+    if not hasattr(user, "_user_type_perm_cache"):
+        cache = _cache()
+        key = f"{PERMISSIONS_KEY_PREFIX}{user.pk}:{user.permissions_version}"
+        permissions = cache.get(key)
+        if permissions is None:
+            permissions = _load_user_type_permissions(user.pk)
+            cache.set(key, permissions)
+        user._user_type_perm_cache = permissions
+    return user._user_type_perm_cache
+
+
+def invalidate_user_permissions(user_ids: Iterable):
+    """
+    Makes the cached permissions of these users stale by giving them a new permissions
+    version once the transaction commits. Changing it any earlier would let a
+    concurrent request cache the old permissions under the new version.
+    """
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+
+    # A fresh random version, never a counter, so an id handed out again can not
+    # find the permissions cached for the user who had it before
+    transaction.on_commit(
+        lambda: get_user_model()
+        .objects.filter(pk__in=user_ids)
+        .update(permissions_version=uuid.uuid4())
+    )
@@ -21,7 +21,7 @@ from quotes.schema import QuoteNode
 from users.models import KnightHood, User, UserType, UserTypeLogEntry, Allergy
 from common.util import get_semester_year_shorthand
 from django.db.models.functions import Concat
-from economy.utils import parse_transaction_history
+from economy.utils import get_bank_account_activity
 from economy.schema import BankAccountActivity
 from economy.models import SociBankAccount
 from users.filters import UserFilter
@@ -91,7 +91,7 @@ class UserNode(DjangoObjectType):
     class Meta:
         model = User
         interfaces = (Node,)
-        exclude_fields = ("password",)
+        exclude_fields = ("password", "permissions_version")
 
     full_name = graphene.NonNull(graphene.String)
     initials = graphene.NonNull(graphene.String)
@@ -102,7 +102,9 @@ class UserNode(DjangoObjectType):
     balance = graphene.NonNull(graphene.Int)
     ksg_status = graphene.String()
     bank_account_activity = graphene.NonNull(
-        graphene.List(graphene.NonNull(BankAccountActivity))
+        graphene.List(graphene.NonNull(BankAccountActivity)),
+        first=graphene.Int(default_value=settings.LEDGER_PAGE_SIZE),
+        after=graphene.String(),
     )
     last_transactions = graphene.NonNull(
         graphene.List(graphene.NonNull(BankAccountActivity))
@@ -175,11 +177,13 @@ class UserNode(DjangoObjectType):
 
         return all_permissions
 
-    def resolve_bank_account_activity(self: User, info, **kwargs):
-        return parse_transaction_history(self.bank_account)
+    def resolve_bank_account_activity(self: User, info, first, after=None, **kwargs):
+        return get_bank_account_activity(self.bank_account, first, after)
 
     def resolve_last_transactions(self: User, info, **kwargs):
-        return parse_transaction_history(self.bank_account, 10)
+        return get_bank_account_activity(
+            self.bank_account, settings.LEDGER_LAST_TRANSACTIONS_COUNT
+        )
 
     def resolve_money_spent(self: User, info, **kwargs):
         return self.bank_account.money_spent
@@ -412,7 +416,7 @@ class DeleteUserMutation(DjangoDeleteMutation):
 class PatchUserMutation(DjangoPatchMutation):
     class Meta:
         model = User
-        exclude_fields = ("password", "about_me")
+        exclude_fields = ("password", "about_me", "permissions_version")
         permissions = ("users.change_user",)
 
     @staticmethod
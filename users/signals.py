@@ -0,0 +1,49 @@
+from django.db.models.signals import m2m_changed, pre_delete
+from django.dispatch import receiver
+
+from users.models import User, UserType
+from users.permissions import invalidate_user_permissions
+
+
+def _get_user_type_user_ids(user_type_ids):
+    return UserType.users.through.objects.filter(
+        usertype_id__in=user_type_ids
+    ).values_list("user_id", flat=True)
+
+
+@receiver(m2m_changed, sender=UserType.users.through)
+def invalidate_permissions_on_user_types_changed(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    if isinstance(instance, User):
+        if action in ["post_add", "post_remove", "post_clear"]:
+            invalidate_user_permissions([instance.pk])
+    elif action in ["post_add", "post_remove"]:
+        invalidate_user_permissions(pk_set)
+    elif action == "pre_clear":
+        invalidate_user_permissions(_get_user_type_user_ids([instance.pk]))
+
+
+@receiver(m2m_changed, sender=UserType.permissions.through)
+def invalidate_permissions_on_permissions_changed(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    if action not in ["post_add", "post_remove", "post_clear"]:
+        return
+
+    if isinstance(instance, UserType):
+        user_type_ids = [instance.pk]
+    else:
+        # Changed from the permission side, so pk_set holds user types. Clearing a
+        # permission of every user type is rare enough to just go by its users
+        user_type_ids = (
+            pk_set
+            if pk_set is not None
+            else UserType.objects.values_list("id", flat=True)
+        )
+    invalidate_user_permissions(_get_user_type_user_ids(user_type_ids))
+
+
+@receiver(pre_delete, sender=UserType)
+def invalidate_permissions_on_user_type_deleted(sender, instance, **kwargs):
+    invalidate_user_permissions(_get_user_type_user_ids([instance.pk]))
@@ -6,15 +6,26 @@ import re
 import shutil
 import tempfile
 
+from addict import Dict
 from django.conf import settings
+from django.contrib.auth.models import Permission
+from django.core.cache import caches
+from graphene.test import Client
+from graphql_relay import to_global_id
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.http import HttpResponse
 from django.test import TestCase
 from django.urls import reverse
 from django.utils import timezone
 
-from users.models import UsersHaveMadeOut, User
-from users.tests.factories import UserFactory, UsersHaveMadeOutFactory
+from ksg_nett.schema import schema
+from users.models import UsersHaveMadeOut, User, UserType
+from users.permissions import get_user_type_permissions
+from users.tests.factories import (
+    UserFactory,
+    UsersHaveMadeOutFactory,
+    UserWithPermissionsFactory,
+)
 from users.views import user_detail, klinekart
 
 from organization.consts import InternalGroupPositionMembershipType
@@ -129,3 +140,99 @@ class UsersHaveMadeOutManagerTest(TestCase):
         )
         self.assertEqual(made_outs.count(), 1)
         self.assertEqual(made_outs.first(), self.made_out_in_autumn_last_year)
+
+
+class TestUserTypePermissions(TestCase):
+    def setUp(self):
+        caches[settings.PERMISSION_CACHE_ALIAS].clear()
+        self.user = UserFactory.create()
+        self.change_user = Permission.objects.get(codename="change_user")
+        self.delete_user = Permission.objects.get(codename="delete_user")
+        self.user_type = UserType.objects.create(name="Styret")
+        self.user_type.permissions.add(self.change_user)
+        self.user_type.users.add(self.user)
+
+    def fresh_user(self):
+        return User.objects.get(pk=self.user.pk)
+
+    def test__get_user_type_permissions__one_query_then_cached(self):
+        user = self.fresh_user()
+        next_request_user = self.fresh_user()
+        with self.assertNumQueries(1):
+            self.assertEqual(get_user_type_permissions(user), {"users.change_user"})
+
+        # Memoized on the user object, and cached for the next request
+        with self.assertNumQueries(0):
+            get_user_type_permissions(user)
+            get_user_type_permissions(next_request_user)
+
+    def test__has_perm__sees_permissions_added_to_user_type(self):
+        self.assertFalse(self.fresh_user().has_perm("users.delete_user"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user_type.permissions.add(self.delete_user)
+
+        self.assertTrue(self.fresh_user().has_perm("users.delete_user"))
+
+    def test__permissions_version__changed_once_committed(self):
+        version = self.fresh_user().permissions_version
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.user_type.permissions.remove(self.change_user)
+            # A request seeing the old version before the commit caches the old set
+            # under the old version only
+            self.assertEqual(version, self.fresh_user().permissions_version)
+
+        self.assertEqual(1, len(callbacks))
+        self.assertNotEqual(version, self.fresh_user().permissions_version)
+
+    def test__has_perm__sees_user_type_deleted(self):
+        self.assertTrue(self.fresh_user().has_perm("users.change_user"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user_type.delete()
+
+        self.assertFalse(self.fresh_user().has_perm("users.change_user"))
+
+    def test__user_type_mutations__invalidate_cached_permissions(self):
+        other_type = UserType.objects.create(name="Sosialsjef")
+        other_type.permissions.add(self.delete_user)
+        request_user = UserWithPermissionsFactory.create(
+            permissions="users.change_usertype"
+        )
+        client = Client(schema)
+        variables = {
+            "userId": to_global_id("UserNode", self.user.id),
+            "userTypeId": to_global_id("UserTypeNode", other_type.id),
+        }
+        self.assertFalse(self.fresh_user().has_perm("users.delete_user"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            executed = client.execute(
+                """
+                mutation AddUserToUserType($userId: ID, $userTypeId: ID) {
+                    addUserToUserType(userId: $userId, userTypeId: $userTypeId) {
+                        user { id }
+                    }
+                }
+                """,
+                variables=variables,
+                context=Dict(user=request_user),
+            )
+        self.assertNotIn("errors", executed)
+        self.assertTrue(self.fresh_user().has_perm("users.delete_user"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            executed = client.execute(
+                """
+                mutation RemoveUserFromUserType($userId: ID, $userTypeId: ID) {
+                    removeUserFromUserType(userId: $userId, userTypeId: $userTypeId) {
+                        user { id }
+                    }
+                }
+                """,
+                variables=variables,
+                context=Dict(user=request_user),
+            )
+        self.assertNotIn("errors", executed)
+        self.assertFalse(self.fresh_user().has_perm("users.delete_user"))